@@ -196,6 +196,26 @@ SITE_NAME = os.getenv('SITE_NAME', 'Dangote Cement - Material Reception System')
 ENABLE_EMAIL_NOTIFICATIONS = os.getenv('ENABLE_EMAIL_NOTIFICATIONS', 'True').lower() in ('true', '1', 'yes')
 
 
+# ==================== IMPORTS BONS DE COMMANDE ====================
+
+# Imports exécutés en arrière-plan par `python manage.py run_import_worker`
+# (False : import synchrone dans la requête admin, pratique en développement)
+ORDERS_IMPORT_BACKGROUND = os.getenv('ORDERS_IMPORT_BACKGROUND', 'True').lower() in ('true', '1', 'yes')
+
+# Nombre de lignes du fichier validées par transaction (point de reprise après chaque lot)
+ORDERS_IMPORT_CHUNK_SIZE = int(os.getenv('ORDERS_IMPORT_CHUNK_SIZE', '2000'))
+
+# Imports PO chargés par COPY dans une table de staging sur PostgreSQL
+# (False, par défaut : écriture par l'ORM, comme sur SQLite)
+ORDERS_IMPORT_COPY = os.getenv('ORDERS_IMPORT_COPY', 'False').lower() in ('true', '1', 'yes')
+
+# Dossier de dépôt des extractions SAP, surveillé par `python manage.py watch_import_folder`
+ORDERS_IMPORT_WATCH_DIR = os.getenv('ORDERS_IMPORT_WATCH_DIR', str(BASE_DIR / 'imports' / 'incoming'))
+
+# Durée de cache (secondes) des PO proposés dans la recherche de la liste des bons de commande
+ORDERS_SUGGESTIONS_CACHE_SECONDS = int(os.getenv('ORDERS_SUGGESTIONS_CACHE_SECONDS', '300'))
+
+
 # ==================== SÉCURITÉ PRODUCTION ====================
 
 if DJANGO_ENV == 'production':
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SupplierEvaluation, BuyerEvaluation
+from .models import SupplierEvaluation, BuyerEvaluation, SupplierScore
 
 
 @admin.register(SupplierEvaluation)
@@ -86,3 +86,25 @@ class BuyerEvaluationAdmin(admin.ModelAdmin):
             'fields': ('evaluator', 'date_evaluation', 'date_modification')
         }),
     )
+
+
+@admin.register(SupplierScore)
+class SupplierScoreAdmin(admin.ModelAdmin):
+    list_display = [
+        'supplier',
+        'weighted_rating',
+        'avg_vendor_rating',
+        'avg_buyer_rating',
+        'vendor_count',
+        'buyer_count',
+        'updated_at',
+    ]
+    search_fields = ['supplier__nom_complet_organisation']
+    list_select_related = ['supplier']
+
+    # Table dérivée : tenue à jour par les évaluations et la commande rebuild_supplier_scores
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
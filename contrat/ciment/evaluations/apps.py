@@ -5,3 +5,6 @@ class EvaluationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'evaluations'
     verbose_name = 'Gestion des Évaluations'
+
+    def ready(self):
+        from . import signals  # noqa: F401
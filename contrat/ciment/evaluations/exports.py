@@ -0,0 +1,278 @@
+"""Exports xlsx du classement fournisseurs, écrits en flux (xlsxwriter).
+
+Le classeur est écrit par xlsxwriter en mode ``constant_memory`` : chaque ligne
+part sur disque dès que la suivante commence, la mémoire ne dépend pas du
+nombre de lignes. Formats et largeurs sont déclarés une fois par colonne
+(``Column``) au lieu d'être appliqués cellule par cellule, puis le fichier
+terminé est renvoyé par morceaux au client (``StreamingWorkbook.response``).
+
+Un onglet plein (limite Excel de 1 048 576 lignes) se poursuit sur un onglet
+« (2) », « (3) »... : l'export complet (tous les fournisseurs, toutes les
+évaluations) n'a pas de limite de taille.
+"""
+
+import tempfile
+from typing import Any, Dict, Iterable, List, NamedTuple, Sequence
+
+import xlsxwriter
+from django.db.models import Avg, F
+from django.http import FileResponse
+from django.utils import timezone
+
+from .models import BUYER_CRITERIA, VENDOR_CRITERIA, BuyerEvaluation, SupplierEvaluation, SupplierScore, SupplierYearScore
+from .ranking import ranked_suppliers
+from reports.streaming import EXPORT_CHUNK_SIZE
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Lignes par feuille Excel (en-tête compris)
+MAX_SHEET_ROWS = 1048576
+
+BORDER = {'border': 1, 'border_color': '#CCCCCC'}
+FORMATS: Dict[str, Dict[str, Any]] = {
+    'header': dict(BORDER, bold=True, bg_color='#DDE9FF', align='center', valign='vcenter'),
+    'label': dict(BORDER, bold=True),
+    'text': dict(BORDER),
+    'integer': dict(BORDER, num_format='0'),
+    'rating': dict(BORDER, num_format='0.00'),
+    'date': dict(BORDER, num_format='yyyy-mm-dd'),
+}
+
+
+class Column(NamedTuple):
+    header: str
+    width: float
+    format: str = 'text'
+
+
+class SheetTable:
+    """Tableau d'une feuille : en-tête, formats de colonnes, lignes écrites dans l'ordre."""
+
+    def __init__(
+        self, book: 'StreamingWorkbook', name: str, columns: Sequence[Column], preamble: Sequence[Sequence[Any]] = ()
+    ):
+        self.book = book
+        self.name = name
+        self.columns = list(columns)
+        self.sheets = 0
+        self._open_sheet(preamble)
+
+    def _open_sheet(self, preamble: Sequence[Sequence[Any]] = ()):
+        """Nouvelle feuille ; ``preamble`` : lignes libres écrites au-dessus de l'en-tête."""
+        self.sheets += 1
+        name = self.name if self.sheets == 1 else f'{self.name} ({self.sheets})'
+        self.worksheet = self.book.add_worksheet(name)
+        formats = self.book.formats
+        for index, column in enumerate(self.columns):
+            self.worksheet.set_column(index, index, column.width, formats[column.format])
+        for header_row, values in enumerate(preamble):
+            self.worksheet.write_row(header_row, 0, values)
+        header_row = len(preamble)
+        self.worksheet.write_row(header_row, 0, [column.header for column in self.columns], formats['header'])
+        self.worksheet.freeze_panes(header_row + 1, 0)
+        self.row = header_row + 1
+
+    @property
+    def last_row(self) -> int:
+        """Index de la dernière ligne écrite de la feuille courante."""
+        return self.row - 1
+
+    def append(self, values: Sequence[Any]) -> None:
+        if self.row >= MAX_SHEET_ROWS:
+            self._open_sheet()
+        formats = self.book.formats
+        for index, (value, column) in enumerate(zip(values, self.columns)):
+            if value is None or value == '':
+                continue
+            self.worksheet.write(self.row, index, value, formats[column.format])
+        self.row += 1
+
+    def extend(self, rows: Iterable[Sequence[Any]]) -> None:
+        for values in rows:
+            self.append(values)
+
+
+class StreamingWorkbook:
+    """Classeur xlsxwriter en ``constant_memory``, écrit dans un fichier temporaire."""
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(prefix='xlsx-export-')
+        self.workbook = xlsxwriter.Workbook(self.file, {
+            'constant_memory': True,
+            'in_memory': False,
+            'remove_timezone': True,
+            # Les textes saisis restent des textes (pas de formule « =... » ni de lien)
+            'strings_to_formulas': False,
+            'strings_to_urls': False,
+        })
+        self.formats = {name: self.workbook.add_format(properties) for name, properties in FORMATS.items()}
+
+    def add_worksheet(self, name: str):
+        return self.workbook.add_worksheet(name)
+
+    def add_table(self, name: str, columns: Sequence[Column], preamble: Sequence[Sequence[Any]] = ()) -> SheetTable:
+        return SheetTable(self, name, columns, preamble)
+
+    def add_chart(self, options: Dict[str, Any]):
+        return self.workbook.add_chart(options)
+
+    def response(self, filename: str) -> FileResponse:
+        """Termine le classeur et le renvoie par morceaux (le fichier temporaire est fermé ensuite)."""
+        self.workbook.close()
+        self.file.seek(0)
+        return FileResponse(self.file, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def _local_date(value):
+    return timezone.localtime(value).date() if value else None
+
+
+def _rating(value):
+    return float(value) if value is not None else None
+
+
+RANKING_COLUMNS = [Column('Rank', 8, 'integer'), Column('Supplier', 45), Column('Average', 12, 'rating'), Column('Evaluations', 14, 'integer')]
+
+VENDOR_EVALUATION_COLUMNS = [
+    Column('Date', 12, 'date'),
+    Column('Final', 10, 'rating'),
+    Column('Delivery', 10, 'integer'),
+    Column('Timeline', 10, 'integer'),
+    Column('Advising', 10, 'integer'),
+    Column('After Sales', 12, 'integer'),
+    Column('Relationship', 13, 'integer'),
+    Column('Evaluator', 30),
+    Column('Comments', 60),
+]
+
+YEARLY_COLUMNS = [
+    Column('Year', 8, 'integer'),
+    Column('Avg Final', 11, 'rating'),
+    Column('Delivery', 10, 'rating'),
+    Column('Timeline', 10, 'rating'),
+    Column('Advising', 10, 'rating'),
+    Column('After Sales', 12, 'rating'),
+    Column('Relationship', 13, 'rating'),
+    Column('#Evals', 9, 'integer'),
+]
+
+
+VENDOR_EVALUATION_FIELDS = ('date_evaluation', 'vendor_final_rating', *VENDOR_CRITERIA, 'evaluator__email', 'comments')
+BUYER_EVALUATION_FIELDS = ('date_evaluation', 'buyer_final_rating', *BUYER_CRITERIA, 'evaluator__email', 'comments')
+
+
+def _evaluation_values(evaluations, fields):
+    """Dicts des évaluations, lus par paquets (``iterator``) sans tout charger."""
+    return evaluations.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _vendor_evaluation_row(evaluation: Dict[str, Any]) -> List[Any]:
+    return [
+        _local_date(evaluation['date_evaluation']),
+        _rating(evaluation['vendor_final_rating']),
+        *(evaluation[criterion] for criterion in VENDOR_CRITERIA),
+        evaluation['evaluator__email'] or '',
+        (evaluation['comments'] or '').replace('\n', ' ').strip(),
+    ]
+
+
+def write_ranking_workbook(book: StreamingWorkbook, supplier=None, include_yearly=False, include_chart=False) -> None:
+    """Vue d'ensemble, Top 10 / Bottom 10 (moyenne vendor) et détail du fournisseur choisi."""
+    rated = SupplierScore.objects.filter(vendor_count__gt=0)
+    overall_avg = rated.aggregate(a=Avg('avg_vendor_rating'))['a'] or 0
+
+    overview = book.add_table('Overview', [Column('Metric', 40, 'label'), Column('Value', 14)])
+    overview.append(['Suppliers evaluated', rated.count()])
+    overview.append(['Global average (avg of supplier avgs)', round(float(overall_avg), 2)])
+
+    for name, descending in (('Top10', True), ('Bottom10', False)):
+        table = book.add_table(name, RANKING_COLUMNS)
+        for idx, s in enumerate(SupplierScore.objects.vendor_ranking(descending=descending)[:10], start=1):
+            table.append([idx, s['nom_complet_organisation'], _rating(s['avg_rating']), s['eval_count']])
+
+    # Supplier details : nom du fournisseur au-dessus de ses évaluations
+    name = supplier.nom_complet_organisation if supplier else '—'
+    table = book.add_table('Supplier', VENDOR_EVALUATION_COLUMNS, preamble=[['Supplier'], [name], []])
+    if supplier is not None:
+        evaluations = SupplierEvaluation.objects.filter(supplier=supplier).order_by('date_evaluation')
+        table.extend(_vendor_evaluation_row(e) for e in _evaluation_values(evaluations, VENDOR_EVALUATION_FIELDS))
+
+    if include_yearly and supplier is not None:
+        yearly = book.add_table('Yearly', YEARLY_COLUMNS)
+        for ys in SupplierYearScore.objects.filter(supplier=supplier, vendor_count__gt=0).order_by('year'):
+            stats = ys.vendor_stats()
+            yearly.append([
+                stats['year'],
+                stats['avg_final_rating'],
+                *(stats[f'avg_{criterion}'] for criterion in VENDOR_CRITERIA),
+                stats['num_evaluations'],
+            ])
+        if include_chart and yearly.last_row >= 1:
+            chart = book.add_chart({'type': 'line'})
+            chart.add_series({
+                'name': ['Yearly', 0, 1],
+                'categories': ['Yearly', 1, 0, yearly.last_row, 0],
+                'values': ['Yearly', 1, 1, yearly.last_row, 1],
+                'marker': {'type': 'circle'},
+            })
+            chart.set_title({'name': 'Average Final Rating by Year'})
+            chart.set_y_axis({'min': 0, 'max': 10})
+            yearly.worksheet.insert_chart('J2', chart)
+
+
+SUPPLIER_COLUMNS = [
+    Column('Rank', 8, 'integer'),
+    Column('Supplier', 45),
+    Column('Weighted', 11, 'rating'),
+    Column('Vendor Avg', 12, 'rating'),
+    Column('Buyer Avg', 11, 'rating'),
+    Column('Vendor Evals', 13, 'integer'),
+    Column('Buyer Evals', 12, 'integer'),
+]
+
+BUYER_EVALUATION_COLUMNS = [
+    Column('Date', 12, 'date'),
+    Column('Final', 10, 'rating'),
+    Column('Price Flexibility', 16, 'integer'),
+    Column('RFx Deadlines', 14, 'integer'),
+    Column('Advisory', 10, 'integer'),
+    Column('Relationship', 13, 'integer'),
+    Column('RFx Quality', 12, 'integer'),
+    Column('Credit Policy', 13, 'integer'),
+    Column('Evaluator', 30),
+    Column('Comments', 60),
+]
+
+
+def write_full_workbook(book: StreamingWorkbook) -> None:
+    """Tous les fournisseurs notés et toutes leurs évaluations (vendor et acheteur)."""
+    suppliers = book.add_table('Suppliers', SUPPLIER_COLUMNS)
+    suppliers.extend(
+        [
+            s['rank'], s['nom_complet_organisation'], _rating(s['weighted_rating']),
+            _rating(s['avg_vendor_rating']), _rating(s['avg_buyer_rating']),
+            s['vendor_eval_count'], s['buyer_eval_count'],
+        ]
+        for s in ranked_suppliers().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    supplier_column = Column('Supplier', 45)
+    for name, model, columns, fields, final_field, criteria in (
+        ('Vendor evaluations', SupplierEvaluation, VENDOR_EVALUATION_COLUMNS, VENDOR_EVALUATION_FIELDS,
+         'vendor_final_rating', VENDOR_CRITERIA),
+        ('Buyer evaluations', BuyerEvaluation, BUYER_EVALUATION_COLUMNS, BUYER_EVALUATION_FIELDS,
+         'buyer_final_rating', BUYER_CRITERIA),
+    ):
+        table = book.add_table(name, [supplier_column] + columns)
+        evaluations = model.objects.annotate(
+            supplier_name=F('supplier__nom_complet_organisation')
+        ).order_by('supplier_name', 'supplier_id', 'date_evaluation', 'pk')
+        for e in _evaluation_values(evaluations, ('supplier_name',) + fields):
+            table.append([
+                e['supplier_name'],
+                _local_date(e['date_evaluation']),
+                _rating(e[final_field]),
+                *(e[criterion] for criterion in criteria),
+                e['evaluator__email'] or '',
+                (e['comments'] or '').replace('\n', ' ').strip(),
+            ])
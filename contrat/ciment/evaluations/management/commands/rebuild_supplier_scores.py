@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from evaluations.ranking import rebuild_supplier_scores
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les notes fournisseurs globales et annuelles (sommes par critère, moyennes, "
+        "note pondérée) à partir de toutes les évaluations ; le rang est calculé à la lecture"
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_supplier_scores()
+        self.stdout.write(self.style.SUCCESS(f"{count} fournisseurs notés"))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:45
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluations', '0002_initial'),
+        ('suppliers', '0003_banque_alter_supplier_banque_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierScore',
+            fields=[
+                ('supplier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='suppliers.supplier', verbose_name='Fournisseur')),
+                ('vendor_count', models.PositiveIntegerField(default=0, verbose_name='Évaluations vendor')),
+                ('delivery_compliance_sum', models.PositiveIntegerField(default=0)),
+                ('delivery_timeline_sum', models.PositiveIntegerField(default=0)),
+                ('advising_capability_sum', models.PositiveIntegerField(default=0)),
+                ('after_sales_qos_sum', models.PositiveIntegerField(default=0)),
+                ('vendor_relationship_sum', models.PositiveIntegerField(default=0)),
+                ('vendor_final_sum', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('buyer_count', models.PositiveIntegerField(default=0, verbose_name='Évaluations acheteur')),
+                ('price_flexibility_sum', models.PositiveIntegerField(default=0)),
+                ('rfx_deadline_compliance_sum', models.PositiveIntegerField(default=0)),
+                ('advisory_capability_sum', models.PositiveIntegerField(default=0)),
+                ('relationship_quality_sum', models.PositiveIntegerField(default=0)),
+                ('rfx_response_quality_sum', models.PositiveIntegerField(default=0)),
+                ('credit_policy_sum', models.PositiveIntegerField(default=0)),
+                ('buyer_final_sum', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('avg_vendor_rating', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5, verbose_name='Moyenne vendor')),
+                ('avg_buyer_rating', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5, verbose_name='Moyenne acheteur')),
+                ('weighted_rating', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5, verbose_name='Note globale pondérée')),
+                ('rank', models.PositiveIntegerField(default=0, verbose_name='Rang')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Mis à jour le')),
+            ],
+            options={
+                'verbose_name': 'Note fournisseur',
+                'verbose_name_plural': 'Notes fournisseurs',
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['rank'], name='evaluations_score_rank_idx'), models.Index(fields=['-avg_vendor_rating'], name='evaluations_score_vendor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluations', '0004_supplieryearscore'),
+        ('suppliers', '0003_banque_alter_supplier_banque_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='supplierscore',
+            options={'ordering': ['-weighted_rating', 'supplier__nom_complet_organisation'], 'verbose_name': 'Note fournisseur', 'verbose_name_plural': 'Notes fournisseurs'},
+        ),
+        migrations.RemoveIndex(
+            model_name='supplierscore',
+            name='evaluations_score_rank_idx',
+        ),
+        migrations.RemoveField(
+            model_name='supplierscore',
+            name='rank',
+        ),
+        migrations.AddIndex(
+            model_name='supplierscore',
+            index=models.Index(fields=['-weighted_rating'], name='evaluations_score_weight_idx'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Remplit SupplierScore et SupplierYearScore à partir des évaluations
+# existantes : sans cela, classements, exports et notes des fournisseurs
+# restent à zéro après le déploiement jusqu'au premier
+# `rebuild_supplier_scores`. Mêmes règles que evaluations.ranking, avec les
+# modèles historiques.
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractYear
+
+VENDOR_CRITERIA = (
+    'delivery_compliance',
+    'delivery_timeline',
+    'advising_capability',
+    'after_sales_qos',
+    'vendor_relationship',
+)
+BUYER_CRITERIA = (
+    'price_flexibility',
+    'rfx_deadline_compliance',
+    'advisory_capability',
+    'relationship_quality',
+    'rfx_response_quality',
+    'credit_policy',
+)
+VENDOR_SUMS = dict({f'{criterion}_sum': criterion for criterion in VENDOR_CRITERIA}, vendor_final_sum='vendor_final_rating')
+BUYER_SUMS = dict({f'{criterion}_sum': criterion for criterion in BUYER_CRITERIA}, buyer_final_sum='buyer_final_rating')
+
+BATCH_SIZE = 1000
+
+
+def _totals(model, sums, by_year):
+    rows = model.objects.order_by()
+    keys = ['supplier']
+    if by_year:
+        rows = rows.annotate(year=ExtractYear('date_evaluation'))
+        keys.append('year')
+    rows = rows.values(*keys).annotate(count=Count('pk'), **{name: Sum(field) for name, field in sums.items()})
+    return {tuple(row.pop(key) for key in keys): row for row in rows}
+
+
+def _average(total, count):
+    return Decimal(total) / count if count else Decimal('0')
+
+
+def _fill(totals, vendor, buyer):
+    for sums, count_field in ((vendor, 'vendor_count'), (buyer, 'buyer_count')):
+        if sums is None:
+            continue
+        sums = dict(sums)
+        setattr(totals, count_field, sums.pop('count'))
+        for name, total in sums.items():
+            setattr(totals, name, total or 0)
+    vendor_avg = _average(totals.vendor_final_sum, totals.vendor_count)
+    buyer_avg = _average(totals.buyer_final_sum, totals.buyer_count)
+    totals.avg_vendor_rating = vendor_avg.quantize(Decimal('0.01'))
+    totals.avg_buyer_rating = buyer_avg.quantize(Decimal('0.01'))
+    # 60 % vendor + 40 % acheteur
+    if vendor_avg or buyer_avg:
+        totals.weighted_rating = (vendor_avg * Decimal('0.60') + buyer_avg * Decimal('0.40')).quantize(Decimal('0.01'))
+    return totals
+
+
+def backfill_supplier_scores(apps, schema_editor):
+    SupplierEvaluation = apps.get_model('evaluations', 'SupplierEvaluation')
+    BuyerEvaluation = apps.get_model('evaluations', 'BuyerEvaluation')
+    SupplierScore = apps.get_model('evaluations', 'SupplierScore')
+    SupplierYearScore = apps.get_model('evaluations', 'SupplierYearScore')
+
+    for model, by_year in ((SupplierScore, False), (SupplierYearScore, True)):
+        vendor = _totals(SupplierEvaluation, VENDOR_SUMS, by_year)
+        buyer = _totals(BuyerEvaluation, BUYER_SUMS, by_year)
+        scores = []
+        for key in sorted(vendor.keys() | buyer.keys()):
+            fields = {'supplier_id': key[0]}
+            if by_year:
+                fields['year'] = key[1]
+            scores.append(_fill(model(**fields), vendor.get(key), buyer.get(key)))
+        model.objects.all().delete()
+        model.objects.bulk_create(scores, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluations', '0005_supplierscore_rank_at_read_time'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_supplier_scores, migrations.RunPython.noop),
+    ]
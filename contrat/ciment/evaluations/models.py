@@ -1,7 +1,25 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.db.models import F
 from decimal import Decimal
 
+# Critères notés de 0 à 10 (la note finale est leur moyenne)
+VENDOR_CRITERIA = (
+    'delivery_compliance',
+    'delivery_timeline',
+    'advising_capability',
+    'after_sales_qos',
+    'vendor_relationship',
+)
+BUYER_CRITERIA = (
+    'price_flexibility',
+    'rfx_deadline_compliance',
+    'advisory_capability',
+    'relationship_quality',
+    'rfx_response_quality',
+    'credit_policy',
+)
+
 
 class SupplierEvaluation(models.Model):
     """
@@ -160,7 +178,9 @@ class SupplierEvaluation(models.Model):
             self.vendor_relationship
         ]
         self.vendor_final_rating = Decimal(str(sum(scores) / len(scores))) if scores else Decimal('0.00')
-        super().save(*args, **kwargs)
+        # La note du fournisseur (SupplierScore) est mise à jour dans la même transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def get_criteria_description(self, criteria_name, score):
         """Retourne la description du critère pour une note donnée"""
@@ -368,7 +388,9 @@ class BuyerEvaluation(models.Model):
             self.credit_policy
         ]
         self.buyer_final_rating = Decimal(str(sum(scores) / len(scores))) if scores else Decimal('0.00')
-        super().save(*args, **kwargs)
+        # La note du fournisseur (SupplierScore) est mise à jour dans la même transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def get_criteria_description(self, criteria_name, score):
         """Retourne la description du critère pour une note donnée"""
@@ -398,3 +420,145 @@ class BuyerEvaluation(models.Model):
             return {'class': 'warning', 'label': 'Moyen'}
         else:
             return {'class': 'danger', 'label': 'Faible'}
+
+
+class SupplierScoreQuerySet(models.QuerySet):
+    def vendor_ranking(self, descending=True):
+        """Fournisseurs ayant des évaluations vendor, triés sur leur moyenne vendor."""
+        order = '-avg_vendor_rating' if descending else 'avg_vendor_rating'
+        return self.filter(vendor_count__gt=0).order_by(order, 'supplier__nom_complet_organisation').values(
+            nom_complet_organisation=F('supplier__nom_complet_organisation'),
+            avg_rating=F('avg_vendor_rating'),
+            eval_count=F('vendor_count'),
+        )
+
+
+class EvaluationTotals(models.Model):
+    """
+    Sommes et nombres d'évaluations d'un fournisseur, moyennes et note pondérée,
+    tenus à jour à chaque enregistrement ou suppression d'évaluation (voir
+    evaluations.ranking et evaluations.signals).
+
+    Les sommes par critère permettent de retrouver toutes les moyennes ; tous
+    les critères étant obligatoires, un seul compteur par type d'évaluation
+    suffit.
+    """
+    # Évaluations vendor
+    vendor_count = models.PositiveIntegerField(default=0, verbose_name="Évaluations vendor")
+    delivery_compliance_sum = models.PositiveIntegerField(default=0)
+    delivery_timeline_sum = models.PositiveIntegerField(default=0)
+    advising_capability_sum = models.PositiveIntegerField(default=0)
+    after_sales_qos_sum = models.PositiveIntegerField(default=0)
+    vendor_relationship_sum = models.PositiveIntegerField(default=0)
+    vendor_final_sum = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    # Évaluations acheteur
+    buyer_count = models.PositiveIntegerField(default=0, verbose_name="Évaluations acheteur")
+    price_flexibility_sum = models.PositiveIntegerField(default=0)
+    rfx_deadline_compliance_sum = models.PositiveIntegerField(default=0)
+    advisory_capability_sum = models.PositiveIntegerField(default=0)
+    relationship_quality_sum = models.PositiveIntegerField(default=0)
+    rfx_response_quality_sum = models.PositiveIntegerField(default=0)
+    credit_policy_sum = models.PositiveIntegerField(default=0)
+    buyer_final_sum = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    # Notes globales
+    avg_vendor_rating = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'), verbose_name="Moyenne vendor")
+    avg_buyer_rating = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'), verbose_name="Moyenne acheteur")
+    weighted_rating = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'), verbose_name="Note globale pondérée")
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Mis à jour le")
+
+    class Meta:
+        abstract = True
+
+    @property
+    def total_count(self):
+        return self.vendor_count + self.buyer_count
+
+    def _averages(self, criteria, count):
+        return {
+            criterion: (Decimal(getattr(self, f'{criterion}_sum')) / count if count else Decimal('0'))
+            for criterion in criteria
+        }
+
+    def vendor_final_average(self):
+        """Moyenne vendor non arrondie (``avg_vendor_rating`` est arrondie au centième)"""
+        return Decimal(self.vendor_final_sum) / self.vendor_count if self.vendor_count else Decimal('0.00')
+
+    def buyer_final_average(self):
+        """Moyenne acheteur non arrondie"""
+        return Decimal(self.buyer_final_sum) / self.buyer_count if self.buyer_count else Decimal('0.00')
+
+    def vendor_averages(self):
+        """Moyenne de chaque critère vendor"""
+        return self._averages(VENDOR_CRITERIA, self.vendor_count)
+
+    def buyer_averages(self):
+        """Moyenne de chaque critère acheteur"""
+        return self._averages(BUYER_CRITERIA, self.buyer_count)
+
+
+class SupplierScore(EvaluationTotals):
+    """
+    Notes pré-calculées d'un fournisseur, toutes années confondues (le rang est
+    calculé à la lecture, voir evaluations.ranking).
+    """
+    supplier = models.OneToOneField(
+        'suppliers.Supplier',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name="Fournisseur"
+    )
+
+    objects = SupplierScoreQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Note fournisseur"
+        verbose_name_plural = "Notes fournisseurs"
+        ordering = ['-weighted_rating', 'supplier__nom_complet_organisation']
+        indexes = [
+            models.Index(fields=['-weighted_rating'], name='evaluations_score_weight_idx'),
+            models.Index(fields=['-avg_vendor_rating'], name='evaluations_score_vendor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.supplier} - {self.weighted_rating}/10"
+
+
+class SupplierYearScore(EvaluationTotals):
+    """
+    Notes pré-calculées d'un fournisseur pour une année d'évaluation
+    (graphiques et export annuels du classement).
+    """
+    supplier = models.ForeignKey(
+        'suppliers.Supplier',
+        on_delete=models.CASCADE,
+        related_name='year_scores',
+        verbose_name="Fournisseur"
+    )
+    year = models.PositiveSmallIntegerField(verbose_name="Année")
+
+    class Meta:
+        verbose_name = "Note fournisseur annuelle"
+        verbose_name_plural = "Notes fournisseurs annuelles"
+        ordering = ['supplier', 'year']
+        constraints = [
+            models.UniqueConstraint(fields=['supplier', 'year'], name='evaluations_year_score_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.supplier} {self.year} - {self.weighted_rating}/10"
+
+    def vendor_stats(self):
+        """Moyennes vendor de l'année (mêmes clés que l'ancien agrégat par année)"""
+        stats = {f'avg_{criterion}': float(value) for criterion, value in self.vendor_averages().items()}
+        stats.update(year=self.year, avg_final_rating=float(self.avg_vendor_rating), num_evaluations=self.vendor_count)
+        return stats
+
+    def buyer_stats(self):
+        """Moyennes acheteur de l'année"""
+        stats = {f'avg_{criterion}': float(value) for criterion, value in self.buyer_averages().items()}
+        stats.update(year=self.year, avg_final_rating=float(self.avg_buyer_rating), num_evaluations=self.buyer_count)
+        return stats
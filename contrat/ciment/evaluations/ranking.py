@@ -0,0 +1,163 @@
+"""Classement des fournisseurs évalués (note globale pondérée).
+
+Les notes de chaque fournisseur sont pré-calculées dans ``SupplierScore`` :
+sommes et nombres d'évaluations par critère, moyennes et note pondérée (60 %
+vendor, 40 % acheteur). ``SupplierYearScore`` porte les mêmes valeurs par
+année d'évaluation, pour les graphiques et l'export annuels.
+
+- ``refresh_supplier_scores`` recalcule les seuls fournisseurs touchés par une
+  évaluation enregistrée ou supprimée (voir ``evaluations.signals``)
+- ``rebuild_supplier_scores`` recalcule les deux tables (commande
+  ``rebuild_supplier_scores``)
+
+Le rang n'est pas stocké : il est calculé à la lecture (``ranked_suppliers``,
+fonction de fenêtre sur l'index de la note pondérée, ``supplier_rank``). Une
+écriture d'évaluation ne touche ainsi que les notes de son fournisseur.
+
+Les classements, exports et e-mails lisent ces valeurs au lieu de
+ré-agréger les évaluations.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import ExtractYear, RowNumber
+
+from .models import (
+    BUYER_CRITERIA, VENDOR_CRITERIA, BuyerEvaluation, SupplierEvaluation, SupplierScore, SupplierYearScore,
+)
+
+VENDOR_WEIGHT = Decimal('0.60')
+BUYER_WEIGHT = Decimal('0.40')
+
+# Champ de SupplierScore -> champ sommé sur les évaluations
+VENDOR_SUMS = dict({f'{criterion}_sum': criterion for criterion in VENDOR_CRITERIA}, vendor_final_sum='vendor_final_rating')
+BUYER_SUMS = dict({f'{criterion}_sum': criterion for criterion in BUYER_CRITERIA}, buyer_final_sum='buyer_final_rating')
+
+SCORE_BATCH_SIZE = 1000
+
+# Ordre du classement : note pondérée décroissante, puis nom (puis id, pour les homonymes)
+RANKING_ORDER = (
+    F('weighted_rating').desc(), F('supplier__nom_complet_organisation').asc(), F('supplier_id').asc(),
+)
+
+# Colonnes renvoyées par ranked_suppliers (dicts utilisés par les vues et exports)
+RANKING_FIELDS = (
+    'id', 'nom_complet_organisation', 'avg_vendor_rating', 'avg_buyer_rating', 'weighted_rating',
+    'vendor_eval_count', 'buyer_eval_count', 'total_eval_count', 'rank',
+)
+
+
+def weighted_rating(vendor_avg, buyer_avg):
+    """Note globale : 60 % vendor + 40 % acheteur, arrondie au centième."""
+    if not vendor_avg and not buyer_avg:
+        return Decimal('0.00')
+    return (vendor_avg * VENDOR_WEIGHT + buyer_avg * BUYER_WEIGHT).quantize(Decimal('0.01'))
+
+
+def _totals(model, sums, supplier_ids=None, by_year=False):
+    """Nombre d'évaluations et sommes par critère, par fournisseur (et par année)."""
+    rows = model.objects.order_by()
+    if supplier_ids is not None:
+        rows = rows.filter(supplier_id__in=supplier_ids)
+    keys = ['supplier']
+    if by_year:
+        rows = rows.annotate(year=ExtractYear('date_evaluation'))
+        keys.append('year')
+    rows = rows.values(*keys).annotate(count=Count('pk'), **{name: Sum(field) for name, field in sums.items()})
+    return {tuple(row.pop(key) for key in keys): row for row in rows}
+
+
+def _average(total, count):
+    return Decimal(total) / count if count else Decimal('0')
+
+
+def _fill(totals, vendor, buyer):
+    """Renseigne les sommes, moyennes et note pondérée de ``totals`` (EvaluationTotals)."""
+    for sums, count_field in ((vendor, 'vendor_count'), (buyer, 'buyer_count')):
+        if sums is None:
+            continue
+        sums = dict(sums)
+        setattr(totals, count_field, sums.pop('count'))
+        for name, total in sums.items():
+            setattr(totals, name, total or 0)
+    vendor_avg = _average(totals.vendor_final_sum, totals.vendor_count)
+    buyer_avg = _average(totals.buyer_final_sum, totals.buyer_count)
+    totals.avg_vendor_rating = vendor_avg.quantize(Decimal('0.01'))
+    totals.avg_buyer_rating = buyer_avg.quantize(Decimal('0.01'))
+    totals.weighted_rating = weighted_rating(vendor_avg, buyer_avg)
+    return totals
+
+
+def _scores(supplier_ids=None):
+    """``SupplierScore`` (non enregistrés) des fournisseurs ayant au moins une évaluation."""
+    vendor = _totals(SupplierEvaluation, VENDOR_SUMS, supplier_ids)
+    buyer = _totals(BuyerEvaluation, BUYER_SUMS, supplier_ids)
+    for key in sorted(vendor.keys() | buyer.keys()):
+        yield _fill(SupplierScore(supplier_id=key[0]), vendor.get(key), buyer.get(key))
+
+
+def _year_scores(supplier_ids=None):
+    """``SupplierYearScore`` (non enregistrés) par fournisseur et année d'évaluation."""
+    vendor = _totals(SupplierEvaluation, VENDOR_SUMS, supplier_ids, by_year=True)
+    buyer = _totals(BuyerEvaluation, BUYER_SUMS, supplier_ids, by_year=True)
+    for supplier_id, year in sorted(vendor.keys() | buyer.keys()):
+        key = (supplier_id, year)
+        yield _fill(SupplierYearScore(supplier_id=supplier_id, year=year), vendor.get(key), buyer.get(key))
+
+
+def refresh_supplier_scores(supplier_ids):
+    """Recalcule les notes des fournisseurs donnés ; retourne le nombre de notes écrites."""
+    supplier_ids = {supplier_id for supplier_id in supplier_ids if supplier_id is not None}
+    if not supplier_ids:
+        return 0
+    with transaction.atomic():
+        scores = list(_scores(supplier_ids))
+        SupplierScore.objects.filter(supplier_id__in=supplier_ids).delete()
+        SupplierScore.objects.bulk_create(scores)
+        # Toutes les années du fournisseur : la date d'une évaluation ne change pas,
+        # mais une évaluation peut changer de fournisseur
+        year_scores = list(_year_scores(supplier_ids))
+        SupplierYearScore.objects.filter(supplier_id__in=supplier_ids).delete()
+        SupplierYearScore.objects.bulk_create(year_scores)
+    return len(scores)
+
+
+def rebuild_supplier_scores():
+    """Recalcule les notes globales et annuelles ; retourne le nombre de fournisseurs notés."""
+    with transaction.atomic():
+        SupplierScore.objects.all().delete()
+        scores = list(_scores())
+        SupplierScore.objects.bulk_create(scores, batch_size=SCORE_BATCH_SIZE)
+        SupplierYearScore.objects.all().delete()
+        SupplierYearScore.objects.bulk_create(_year_scores(), batch_size=SCORE_BATCH_SIZE)
+    return len(scores)
+
+
+def ranked_suppliers():
+    """Fournisseurs notés, du premier au dernier rang (dicts ``RANKING_FIELDS``)."""
+    return SupplierScore.objects.annotate(
+        rank=Window(RowNumber(), order_by=RANKING_ORDER),
+    ).order_by(*RANKING_ORDER).values(
+        'avg_vendor_rating',
+        'avg_buyer_rating',
+        'weighted_rating',
+        'rank',
+        id=F('supplier_id'),
+        nom_complet_organisation=F('supplier__nom_complet_organisation'),
+        vendor_eval_count=F('vendor_count'),
+        buyer_eval_count=F('buyer_count'),
+        total_eval_count=F('vendor_count') + F('buyer_count'),
+    )
+
+
+def supplier_rank(score):
+    """Rang d'une note enregistrée (même ordre que ``ranked_suppliers``), sans numéroter tout le classement."""
+    name = score.supplier.nom_complet_organisation
+    ahead = SupplierScore.objects.filter(
+        Q(weighted_rating__gt=score.weighted_rating)
+        | Q(weighted_rating=score.weighted_rating, supplier__nom_complet_organisation__lt=name)
+        | Q(weighted_rating=score.weighted_rating, supplier__nom_complet_organisation=name, supplier_id__lt=score.supplier_id)
+    )
+    return ahead.count() + 1
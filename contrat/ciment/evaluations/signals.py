@@ -0,0 +1,44 @@
+"""Mise à jour de ``SupplierScore`` à chaque enregistrement ou suppression d'évaluation.
+
+Les récepteurs s'exécutent dans la transaction de l'écriture (voir
+``SupplierEvaluation.save`` et la suppression en cascade de Django) : une
+évaluation et la note de son fournisseur sont validées ensemble.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import BuyerEvaluation, SupplierEvaluation
+from .ranking import refresh_supplier_scores
+from suppliers.models import Supplier
+
+EVALUATION_MODELS = (SupplierEvaluation, BuyerEvaluation)
+
+
+def _deleting_supplier(origin):
+    # Suppression d'un fournisseur : sa note part avec lui (CASCADE)
+    return isinstance(origin, Supplier) or getattr(origin, 'model', None) is Supplier
+
+
+@receiver(pre_save, sender=SupplierEvaluation)
+@receiver(pre_save, sender=BuyerEvaluation)
+def remember_previous_supplier(sender, instance, **kwargs):
+    """Fournisseur avant modification : une évaluation déplacée change deux notes."""
+    instance._previous_supplier_id = None
+    if instance.pk is not None:
+        instance._previous_supplier_id = (
+            sender.objects.filter(pk=instance.pk).values_list('supplier_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=SupplierEvaluation)
+@receiver(post_save, sender=BuyerEvaluation)
+def update_score_after_save(sender, instance, **kwargs):
+    refresh_supplier_scores({instance.supplier_id, getattr(instance, '_previous_supplier_id', None)})
+
+
+@receiver(post_delete, sender=SupplierEvaluation)
+@receiver(post_delete, sender=BuyerEvaluation)
+def update_score_after_delete(sender, instance, origin=None, **kwargs):
+    if not _deleting_supplier(origin):
+        refresh_supplier_scores({instance.supplier_id})
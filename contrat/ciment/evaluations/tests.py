@@ -0,0 +1,360 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count
+from django.db.models.functions import ExtractYear
+from django.test import TestCase
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from . import exports
+from .exports import XLSX_CONTENT_TYPE
+from .models import (
+    BUYER_CRITERIA, VENDOR_CRITERIA, BuyerEvaluation, SupplierEvaluation, SupplierScore, SupplierYearScore,
+)
+from .ranking import ranked_suppliers, weighted_rating
+from orders.services import AUTO_SUPPLIER_DEFAULTS
+from suppliers.models import Supplier
+from suppliers.services import SupplierResolver
+
+
+def make_suppliers(*names):
+    """Fournisseurs créés avec les valeurs par défaut de l'import PO, par nom."""
+    resolver = SupplierResolver(defaults=AUTO_SUPPLIER_DEFAULTS)
+    resolver.preload(names)
+    return {name: Supplier.objects.get(pk=resolver.get(name)) for name in names}
+
+
+def evaluated_on(year):
+    """Date d'évaluation imposée (``date_evaluation`` est renseignée à la création)."""
+    return mock.patch("django.utils.timezone.now", return_value=datetime(year, 6, 15, 10, tzinfo=dt_timezone.utc))
+
+
+def vendor_evaluation(supplier, rating, relationship=None, **fields):
+    """Évaluation vendor : tous les critères à ``rating`` (sauf la relation, si donnée)."""
+    return SupplierEvaluation.objects.create(
+        supplier=supplier,
+        delivery_compliance=rating,
+        delivery_timeline=rating,
+        advising_capability=rating,
+        after_sales_qos=rating,
+        vendor_relationship=rating if relationship is None else relationship,
+        **fields,
+    )
+
+
+def buyer_evaluation(supplier, rating, credit_policy=None, **fields):
+    """Évaluation acheteur : tous les critères à ``rating`` (sauf la politique de crédit, si donnée)."""
+    return BuyerEvaluation.objects.create(
+        supplier=supplier,
+        price_flexibility=rating,
+        rfx_deadline_compliance=rating,
+        advisory_capability=rating,
+        relationship_quality=rating,
+        rfx_response_quality=rating,
+        credit_policy=rating if credit_policy is None else credit_policy,
+        **fields,
+    )
+
+
+def direct_weighted_rating(supplier):
+    """Note pondérée recalculée sur les évaluations (60 % vendor, 40 % acheteur)."""
+    vendor = supplier.evaluations.aggregate(avg=Avg("vendor_final_rating"))["avg"] or Decimal("0")
+    buyer = supplier.buyer_evaluations.aggregate(avg=Avg("buyer_final_rating"))["avg"] or Decimal("0")
+    if not vendor and not buyer:
+        return Decimal("0.00")
+    return (Decimal(str(vendor)) * Decimal("0.60") + Decimal(str(buyer)) * Decimal("0.40")).quantize(Decimal("0.01"))
+
+
+class RankingTest(TestCase):
+    def setUp(self):
+        self.suppliers = make_suppliers("Gamma", "Beta", "Alpha", "Delta")
+        alpha, beta, gamma, delta = (self.suppliers[name] for name in ("Alpha", "Beta", "Gamma", "Delta"))
+        vendor_evaluation(gamma, 8)
+        vendor_evaluation(gamma, 7, relationship=9)
+        buyer_evaluation(gamma, 6, credit_policy=3)
+        # Alpha et Beta à égalité : départagés par le nom
+        vendor_evaluation(beta, 9)
+        vendor_evaluation(alpha, 9)
+        buyer_evaluation(delta, 10)
+
+    def test_ranked_suppliers_apply_weighting_and_tie_break(self):
+        ranking = list(ranked_suppliers())
+
+        self.assertEqual([row["nom_complet_organisation"] for row in ranking], ["Gamma", "Alpha", "Beta", "Delta"])
+        self.assertEqual([row["rank"] for row in ranking], [1, 2, 3, 4])
+        for row in ranking:
+            supplier = self.suppliers[row["nom_complet_organisation"]]
+            self.assertEqual(row["weighted_rating"], direct_weighted_rating(supplier))
+            self.assertEqual(row["total_eval_count"], supplier.evaluations.count() + supplier.buyer_evaluations.count())
+        self.assertEqual(ranking[1]["weighted_rating"], Decimal("5.40"))
+        self.assertEqual(ranking[3]["weighted_rating"], Decimal("4.00"))
+        self.assertEqual(weighted_rating(Decimal("0"), Decimal("0")), Decimal("0.00"))
+
+    def test_rank_follows_rating_changes(self):
+        evaluation = buyer_evaluation(self.suppliers["Beta"], 10)
+        self.assertEqual([row["nom_complet_organisation"] for row in ranked_suppliers()][:2], ["Beta", "Gamma"])
+
+        evaluation.delete()
+        self.assertEqual(
+            [(row["nom_complet_organisation"], row["rank"]) for row in ranked_suppliers()],
+            [("Gamma", 1), ("Alpha", 2), ("Beta", 3), ("Delta", 4)],
+        )
+
+    def test_ranking_overview_renders(self):
+        self.client.force_login(get_user_model().objects.create_user("buyer@example.com", "secret", is_active=True))
+
+        response = self.client.get(reverse("evaluations:ranking_overview"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_suppliers"], 4)
+        self.assertEqual([row["rank"] for row in response.context["top10"]], [1, 2, 3, 4])
+        self.assertEqual(response.context["bottom10"][0]["nom_complet_organisation"], "Delta")
+        self.assertIsNone(response.context["selected_supplier_data"])
+
+
+class SupplierScoreTest(TestCase):
+    def setUp(self):
+        self.suppliers = make_suppliers("Cimaf", "Lafarge", "Sococim")
+        self.cimaf = self.suppliers["Cimaf"]
+
+    def score(self, supplier):
+        return SupplierScore.objects.filter(supplier=supplier).first()
+
+    def assertScoreMatchesEvaluations(self, supplier):
+        """Compare la note pré-calculée à un ``Avg`` direct sur les évaluations."""
+        score = self.score(supplier)
+        vendor = supplier.evaluations.aggregate(
+            count=Count("pk"), final=Avg("vendor_final_rating"), **{name: Avg(name) for name in VENDOR_CRITERIA}
+        )
+        buyer = supplier.buyer_evaluations.aggregate(
+            count=Count("pk"), final=Avg("buyer_final_rating"), **{name: Avg(name) for name in BUYER_CRITERIA}
+        )
+        if not vendor["count"] and not buyer["count"]:
+            self.assertIsNone(score)
+            return
+        self.assertEqual((score.vendor_count, score.buyer_count), (vendor["count"], buyer["count"]))
+        for averages, expected in ((score.vendor_averages(), vendor), (score.buyer_averages(), buyer)):
+            for criterion, value in averages.items():
+                self.assertAlmostEqual(float(value), float(expected[criterion] or 0), places=6)
+        self.assertAlmostEqual(float(score.vendor_final_average()), float(vendor["final"] or 0), places=6)
+        self.assertAlmostEqual(float(score.buyer_final_average()), float(buyer["final"] or 0), places=6)
+        self.assertEqual(score.weighted_rating, direct_weighted_rating(supplier))
+
+    def test_scores_match_direct_averages(self):
+        vendor_evaluation(self.cimaf, 8, relationship=9)
+        vendor_evaluation(self.cimaf, 7)
+        vendor_evaluation(self.cimaf, 6)
+        buyer_evaluation(self.cimaf, 6, credit_policy=3)
+        buyer_evaluation(self.cimaf, 9)
+
+        self.assertScoreMatchesEvaluations(self.cimaf)
+        score = self.score(self.cimaf)
+        # 60 % de 21.2 / 3 + 40 % de 14.5 / 2
+        self.assertEqual(score.avg_vendor_rating, Decimal("7.07"))
+        self.assertEqual(score.avg_buyer_rating, Decimal("7.25"))
+        self.assertEqual(score.weighted_rating, Decimal("7.14"))
+        # Les moyennes exposées par le fournisseur ne sont pas arrondies
+        supplier = Supplier.objects.get(pk=self.cimaf.pk)
+        self.assertAlmostEqual(float(supplier.get_vendor_avg_rating()), 21.2 / 3, places=6)
+        self.assertEqual(supplier.get_buyer_avg_rating(), Decimal("7.25"))
+        self.assertEqual(supplier.get_weighted_rating(), Decimal("7.14"))
+
+    def test_save_updates_score(self):
+        evaluation = vendor_evaluation(self.cimaf, 4)
+        self.assertEqual(self.score(self.cimaf).avg_vendor_rating, Decimal("4.00"))
+
+        evaluation.delivery_compliance = 9
+        evaluation.save()
+
+        self.assertEqual(self.score(self.cimaf).avg_vendor_rating, Decimal("5.00"))
+        self.assertScoreMatchesEvaluations(self.cimaf)
+
+    def test_moving_an_evaluation_updates_both_suppliers(self):
+        lafarge = self.suppliers["Lafarge"]
+        vendor_evaluation(self.cimaf, 8)
+        moved = buyer_evaluation(self.cimaf, 5)
+        buyer_evaluation(lafarge, 9)
+
+        moved.supplier = lafarge
+        moved.save()
+
+        self.assertEqual(self.score(self.cimaf).buyer_count, 0)
+        self.assertEqual(self.score(lafarge).buyer_count, 2)
+        self.assertScoreMatchesEvaluations(self.cimaf)
+        self.assertScoreMatchesEvaluations(lafarge)
+
+    def test_delete_updates_score(self):
+        kept = vendor_evaluation(self.cimaf, 8)
+        removed = vendor_evaluation(self.cimaf, 2)
+
+        removed.delete()
+        self.assertEqual(self.score(self.cimaf).avg_vendor_rating, Decimal("8.00"))
+
+        kept.delete()
+        self.assertIsNone(self.score(self.cimaf))
+        self.assertFalse(SupplierYearScore.objects.filter(supplier=self.cimaf).exists())
+
+    def test_supplier_cascade_delete(self):
+        lafarge, sococim = self.suppliers["Lafarge"], self.suppliers["Sococim"]
+        vendor_evaluation(self.cimaf, 9)
+        buyer_evaluation(self.cimaf, 9)
+        vendor_evaluation(lafarge, 7)
+        vendor_evaluation(sococim, 5)
+
+        self.cimaf.delete()
+
+        self.assertFalse(SupplierEvaluation.objects.filter(supplier_id=self.cimaf.pk).exists())
+        self.assertFalse(SupplierScore.objects.filter(supplier_id=self.cimaf.pk).exists())
+        self.assertFalse(SupplierYearScore.objects.filter(supplier_id=self.cimaf.pk).exists())
+        # Le rang étant calculé à la lecture, les suivants remontent sans recalcul
+        self.assertEqual(
+            [(row["nom_complet_organisation"], row["rank"]) for row in ranked_suppliers()],
+            [("Lafarge", 1), ("Sococim", 2)],
+        )
+        self.assertScoreMatchesEvaluations(lafarge)
+
+
+class SupplierYearScoreTest(TestCase):
+    def setUp(self):
+        self.suppliers = make_suppliers("Cimaf", "Lafarge")
+        self.cimaf = self.suppliers["Cimaf"]
+        with evaluated_on(2023):
+            vendor_evaluation(self.cimaf, 8, relationship=3)
+            vendor_evaluation(self.cimaf, 6)
+            buyer_evaluation(self.cimaf, 7)
+        with evaluated_on(2024):
+            vendor_evaluation(self.cimaf, 9)
+            vendor_evaluation(self.suppliers["Lafarge"], 4)
+        with evaluated_on(2025):
+            buyer_evaluation(self.cimaf, 5, credit_policy=2)
+
+    def direct_yearly_averages(self, related, field):
+        rows = related.annotate(year=ExtractYear("date_evaluation")).values("year").annotate(avg=Avg(field))
+        return {row["year"]: row["avg"] for row in rows}
+
+    def test_year_scores_match_direct_averages(self):
+        year_scores = {ys.year: ys for ys in SupplierYearScore.objects.filter(supplier=self.cimaf)}
+        vendor = self.direct_yearly_averages(self.cimaf.evaluations, "vendor_final_rating")
+        buyer = self.direct_yearly_averages(self.cimaf.buyer_evaluations, "buyer_final_rating")
+
+        self.assertEqual(sorted(year_scores), [2023, 2024, 2025])
+        for year, ys in year_scores.items():
+            self.assertAlmostEqual(float(ys.vendor_final_average()), float(vendor.get(year) or 0), places=6)
+            self.assertAlmostEqual(float(ys.buyer_final_average()), float(buyer.get(year) or 0), places=6)
+            expected = weighted_rating(Decimal(str(vendor.get(year) or 0)), Decimal(str(buyer.get(year) or 0)))
+            self.assertEqual(ys.weighted_rating, expected)
+        # 2023 : 60 % de (7.0 + 6.0) / 2 + 40 % de 7.0
+        self.assertEqual(year_scores[2023].weighted_rating, Decimal("6.70"))
+        self.assertEqual(year_scores[2025].weighted_rating, Decimal("1.80"))
+        self.assertEqual(year_scores[2023].vendor_stats()["avg_vendor_relationship"], 4.5)
+
+    def test_year_scores_follow_deletes(self):
+        self.cimaf.evaluations.filter(date_evaluation__year=2024).get().delete()
+
+        self.assertEqual(
+            list(SupplierYearScore.objects.filter(supplier=self.cimaf).values_list("year", flat=True)), [2023, 2025],
+        )
+
+    def test_drilldown_renders(self):
+        self.client.force_login(get_user_model().objects.create_user("buyer@example.com", "secret", is_active=True))
+
+        response = self.client.get(reverse("evaluations:ranking_overview"), {"supplier": self.cimaf.pk})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.context["selected_supplier_data"]
+        self.assertEqual((data["name"], data["rank"]), ("Cimaf", 1))
+        self.assertEqual((data["vendor_eval_count"], data["buyer_eval_count"]), (3, 2))
+        self.assertEqual([stats["year"] for stats in response.context["yearly_stats_list"]], [2023, 2024])
+        self.assertEqual([stats["year"] for stats in response.context["yearly_buyer_stats_list"]], [2023, 2025])
+        self.assertEqual(
+            [(row["year"], row["weighted_avg"]) for row in response.context["yearly_weighted_json"]],
+            [(2023, 6.7), (2024, 5.4), (2025, 1.8)],
+        )
+        self.assertContains(response, "Cimaf")
+
+    def test_drilldown_without_evaluations(self):
+        self.client.force_login(get_user_model().objects.create_user("buyer@example.com", "secret", is_active=True))
+        idle = make_suppliers("Sans évaluation")["Sans évaluation"]
+
+        response = self.client.get(reverse("evaluations:ranking_overview"), {"supplier": idle.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context["selected_supplier_data"]["rank"])
+        self.assertEqual(response.context["yearly_weighted_json"], [])
+
+
+class RankingExportTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("buyer@example.com", "secret", is_active=True)
+        self.client.force_login(self.user)
+        self.suppliers = make_suppliers("Cimaf", "Lafarge", "Sococim")
+        self.cimaf = self.suppliers["Cimaf"]
+        with evaluated_on(2023):
+            vendor_evaluation(self.cimaf, 6, evaluator=self.user, comments="Retards\nrépétés")
+        with evaluated_on(2024):
+            vendor_evaluation(self.cimaf, 8, evaluator=self.user)
+            vendor_evaluation(self.suppliers["Lafarge"], 9)
+            buyer_evaluation(self.suppliers["Sococim"], 5, comments="=SUM(A1:A2)")
+
+    def load(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], XLSX_CONTENT_TYPE)
+        return load_workbook(BytesIO(b"".join(response.streaming_content)))
+
+    def rows(self, worksheet):
+        return [list(row) for row in worksheet.iter_rows(values_only=True)]
+
+    def test_ranking_workbook_with_supplier_details(self):
+        workbook = self.load(self.client.get(
+            reverse("evaluations:export_ranking_xlsx"), {"supplier": self.cimaf.pk, "yearly": "1", "chart": "1"},
+        ))
+
+        self.assertEqual(workbook.sheetnames, ["Overview", "Top10", "Bottom10", "Supplier", "Yearly"])
+        self.assertEqual(self.rows(workbook["Overview"])[1], ["Suppliers evaluated", 2])
+        self.assertEqual(
+            [row[:4] for row in self.rows(workbook["Top10"])[1:]], [[1, "Lafarge", 9, 1], [2, "Cimaf", 7, 2]],
+        )
+        supplier_rows = self.rows(workbook["Supplier"])
+        self.assertEqual(supplier_rows[1][0], "Cimaf")
+        self.assertEqual(supplier_rows[3][0], "Date")
+        self.assertEqual([row[1] for row in supplier_rows[4:]], [6, 8])
+        self.assertEqual(supplier_rows[4][7:], ["buyer@example.com", "Retards répétés"])
+        self.assertEqual([row[:2] for row in self.rows(workbook["Yearly"])[1:]], [[2023, 6], [2024, 8]])
+
+    def test_ranking_workbook_without_supplier(self):
+        workbook = self.load(self.client.get(reverse("evaluations:export_ranking_xlsx"), {"supplier": "None"}))
+
+        self.assertEqual(workbook.sheetnames, ["Overview", "Top10", "Bottom10", "Supplier"])
+        self.assertEqual(self.rows(workbook["Supplier"])[1][0], "—")
+
+    def test_full_workbook(self):
+        workbook = self.load(self.client.get(reverse("evaluations:export_ranking_full_xlsx")))
+
+        self.assertEqual(workbook.sheetnames, ["Suppliers", "Vendor evaluations", "Buyer evaluations"])
+        self.assertEqual(
+            [row[:3] for row in self.rows(workbook["Suppliers"])[1:]],
+            [[1, "Lafarge", 5.4], [2, "Cimaf", 4.2], [3, "Sococim", 2]],
+        )
+        self.assertEqual([row[0] for row in self.rows(workbook["Vendor evaluations"])[1:]], ["Cimaf", "Cimaf", "Lafarge"])
+        # Un commentaire commençant par « = » reste un texte
+        self.assertEqual(self.rows(workbook["Buyer evaluations"])[1][-1], "=SUM(A1:A2)")
+
+    def test_full_workbook_continues_on_new_sheets(self):
+        # En-tête + 1 ligne par feuille : 3 évaluations vendor sur 3 onglets
+        with mock.patch.object(exports, "MAX_SHEET_ROWS", 2):
+            workbook = self.load(self.client.get(reverse("evaluations:export_ranking_full_xlsx")))
+
+        self.assertEqual(workbook.sheetnames, [
+            "Suppliers", "Suppliers (2)", "Suppliers (3)",
+            "Vendor evaluations", "Vendor evaluations (2)", "Vendor evaluations (3)", "Buyer evaluations",
+        ])
+        names = []
+        for sheet in ("Vendor evaluations", "Vendor evaluations (2)", "Vendor evaluations (3)"):
+            rows = self.rows(workbook[sheet])
+            self.assertEqual(rows[0][:3], ["Supplier", "Date", "Final"])
+            names.extend(row[0] for row in rows[1:])
+        self.assertEqual(names, ["Cimaf", "Cimaf", "Lafarge"])
@@ -25,6 +25,7 @@ urlpatterns = [
     # Rankings (avec notes pondérées)
     path('ranking/', views.ranking_overview, name='ranking_overview'),
     path('ranking/export.xlsx', views.export_ranking_xlsx, name='export_ranking_xlsx'),
+    path('ranking/export/full.xlsx', views.export_ranking_full_xlsx, name='export_ranking_full_xlsx'),
     path('ranking/export/top.csv', views.export_ranking_top_csv, name='export_ranking_top_csv'),
     path('ranking/export/bottom.csv', views.export_ranking_bottom_csv, name='export_ranking_bottom_csv'),
     path('ranking/export/supplier.csv', views.export_supplier_ranking_csv, name='export_supplier_ranking_csv'),
@@ -1,12 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Avg, Count, Min, Max
-from django.db.models.functions import ExtractYear
-from django.http import HttpResponse
+from django.db.models import Q, Avg
 
-from .models import SupplierEvaluation, BuyerEvaluation
+from .models import SupplierEvaluation, BuyerEvaluation, SupplierScore, SupplierYearScore
+from .exports import StreamingWorkbook, write_full_workbook, write_ranking_workbook
+from .ranking import RANKING_FIELDS, ranked_suppliers, supplier_rank
 from .forms import SupplierEvaluationForm, BuyerEvaluationForm
+from reports.streaming import EXPORT_CHUNK_SIZE, streaming_csv_response
 from suppliers.models import Supplier
 
 
@@ -159,38 +160,14 @@ def supplier_evaluations(request, supplier_id):
 @login_required
 def ranking_overview(request):
     """Supplier Ranking overview + supplier drilldown (legacy-like workflow)"""
-    # Annoter avec les moyennes vendor et buyer
-    suppliers_qs = Supplier.objects.annotate(
-        avg_vendor_rating=Avg('evaluations__vendor_final_rating'),
-        avg_buyer_rating=Avg('buyer_evaluations__buyer_final_rating'),
-        vendor_eval_count=Count('evaluations', distinct=True),
-        buyer_eval_count=Count('buyer_evaluations', distinct=True)
-    ).filter(Q(vendor_eval_count__gt=0) | Q(buyer_eval_count__gt=0))
+    # Moyennes et note pondérée (60/40) pré-calculées (SupplierScore), rang calculé à la lecture
+    suppliers_with_weighted = []
+    for s in ranked_suppliers().values(*RANKING_FIELDS):
+        s['weighted_rating'] = float(s['weighted_rating'])
+        suppliers_with_weighted.append(s)
 
-    total_suppliers = suppliers_qs.count()
+    total_suppliers = len(suppliers_with_weighted)
 
-    # Calculer les notes pondérées pour chaque fournisseur
-    suppliers_with_weighted = []
-    for supplier in suppliers_qs:
-        weighted_rating = supplier.get_weighted_rating()
-        suppliers_with_weighted.append({
-            'id': supplier.id,
-            'nom_complet_organisation': supplier.nom_complet_organisation,
-            'avg_vendor_rating': supplier.avg_vendor_rating or 0,
-            'avg_buyer_rating': supplier.avg_buyer_rating or 0,
-            'weighted_rating': float(weighted_rating),
-            'vendor_eval_count': supplier.vendor_eval_count,
-            'buyer_eval_count': supplier.buyer_eval_count,
-            'total_eval_count': supplier.vendor_eval_count + supplier.buyer_eval_count,
-        })
-    
-    # Trier par note pondérée
-    suppliers_with_weighted.sort(key=lambda x: x['weighted_rating'], reverse=True)
-    
-    # Ajouter les rangs
-    for idx, s in enumerate(suppliers_with_weighted, start=1):
-        s['rank'] = idx
-    
     # Top 10 et Bottom 10
     top10 = suppliers_with_weighted[:10]
     bottom10 = list(reversed(suppliers_with_weighted[-10:]))
@@ -207,124 +184,61 @@ def ranking_overview(request):
     yearly_buyer_stats_list = []
     yearly_buyer_stats_json = []
     yearly_weighted_json = []
-    chart_eval_labels = []
-    chart_eval_values = []
-    chart_eval_mavg = []
-    evals_for_table = []
 
     if selected_supplier_id:
         selected_supplier = get_object_or_404(Supplier, pk=selected_supplier_id)
         
-        # Évaluations vendor
-        vendor_evals = SupplierEvaluation.objects.filter(supplier=selected_supplier)
-        vendor_agg = vendor_evals.aggregate(
-            avg_final=Avg('vendor_final_rating'),
-            num=Count('id'),
-            avg_delivery_compliance=Avg('delivery_compliance'),
-            avg_delivery_timeline=Avg('delivery_timeline'),
-            avg_advising_capability=Avg('advising_capability'),
-            avg_after_sales_qos=Avg('after_sales_qos'),
-            avg_vendor_relationship=Avg('vendor_relationship'),
-        )
-        
-        # Évaluations acheteur
-        buyer_evals = BuyerEvaluation.objects.filter(supplier=selected_supplier)
-        buyer_agg = buyer_evals.aggregate(
-            avg_final=Avg('buyer_final_rating'),
-            num=Count('id'),
-            avg_price_flexibility=Avg('price_flexibility'),
-            avg_rfx_deadline_compliance=Avg('rfx_deadline_compliance'),
-            avg_advisory_capability=Avg('advisory_capability'),
-            avg_relationship_quality=Avg('relationship_quality'),
-            avg_rfx_response_quality=Avg('rfx_response_quality'),
-            avg_credit_policy=Avg('credit_policy'),
-        )
-
-        # Rang du fournisseur
-        rank_map = {s['id']: s['rank'] for s in suppliers_with_weighted}
-        selected_rank = rank_map.get(selected_supplier.id)
+        # Notes, compteurs et moyennes par critère pré-calculés (SupplierScore)
+        score = SupplierScore.objects.filter(supplier=selected_supplier).select_related('supplier').first() or SupplierScore()
+        vendor_avg = score.vendor_averages()
+        buyer_avg = score.buyer_averages()
+        selected_rank = supplier_rank(score) if score.pk else None
 
         selected_supplier_data = {
             'id': selected_supplier.id,
             'name': selected_supplier.nom_complet_organisation,
             # Notes globales
-            'weighted_rating': float(selected_supplier.get_weighted_rating()),
-            'avg_vendor_rating': float(selected_supplier.get_vendor_avg_rating()),
-            'avg_buyer_rating': float(selected_supplier.get_buyer_avg_rating()),
+            'weighted_rating': float(score.weighted_rating),
+            'avg_vendor_rating': float(score.avg_vendor_rating),
+            'avg_buyer_rating': float(score.avg_buyer_rating),
             # Compteurs
-            'vendor_eval_count': vendor_agg['num'] or 0,
-            'buyer_eval_count': buyer_agg['num'] or 0,
-            'total_eval_count': (vendor_agg['num'] or 0) + (buyer_agg['num'] or 0),
+            'vendor_eval_count': score.vendor_count,
+            'buyer_eval_count': score.buyer_count,
+            'total_eval_count': score.total_count,
             # Critères vendor
-            'avg_delivery_compliance': (vendor_agg['avg_delivery_compliance'] or 0),
-            'avg_delivery_timeline': (vendor_agg['avg_delivery_timeline'] or 0),
-            'avg_advising_capability': (vendor_agg['avg_advising_capability'] or 0),
-            'avg_after_sales_qos': (vendor_agg['avg_after_sales_qos'] or 0),
-            'avg_vendor_relationship': (vendor_agg['avg_vendor_relationship'] or 0),
+            'avg_delivery_compliance': vendor_avg['delivery_compliance'],
+            'avg_delivery_timeline': vendor_avg['delivery_timeline'],
+            'avg_advising_capability': vendor_avg['advising_capability'],
+            'avg_after_sales_qos': vendor_avg['after_sales_qos'],
+            'avg_vendor_relationship': vendor_avg['vendor_relationship'],
             # Critères buyer
-            'avg_price_flexibility': (buyer_agg['avg_price_flexibility'] or 0),
-            'avg_rfx_deadline_compliance': (buyer_agg['avg_rfx_deadline_compliance'] or 0),
-            'avg_buyer_advisory_capability': (buyer_agg['avg_advisory_capability'] or 0),
-            'avg_relationship_quality': (buyer_agg['avg_relationship_quality'] or 0),
-            'avg_rfx_response_quality': (buyer_agg['avg_rfx_response_quality'] or 0),
-            'avg_credit_policy': (buyer_agg['avg_credit_policy'] or 0),
+            'avg_price_flexibility': buyer_avg['price_flexibility'],
+            'avg_rfx_deadline_compliance': buyer_avg['rfx_deadline_compliance'],
+            'avg_buyer_advisory_capability': buyer_avg['advisory_capability'],
+            'avg_relationship_quality': buyer_avg['relationship_quality'],
+            'avg_rfx_response_quality': buyer_avg['rfx_response_quality'],
+            'avg_credit_policy': buyer_avg['credit_policy'],
             # Rang
             'rank': selected_rank,
         }
 
-        # Yearly breakdown (vendor evaluations)
-        yearly_qs = vendor_evals.annotate(year=ExtractYear('date_evaluation')).values('year').annotate(
-            avg_delivery_compliance=Avg('delivery_compliance'),
-            avg_delivery_timeline=Avg('delivery_timeline'),
-            avg_advising_capability=Avg('advising_capability'),
-            avg_after_sales_qos=Avg('after_sales_qos'),
-            avg_vendor_relationship=Avg('vendor_relationship'),
-            avg_final_rating=Avg('vendor_final_rating'),
-            num_evaluations=Count('id'),
-        ).order_by('year')
-
-        yearly_stats_list = list(yearly_qs)
+        # Répartition par année, pré-calculée (SupplierYearScore) : une ligne par année
+        year_scores = list(SupplierYearScore.objects.filter(supplier=selected_supplier).order_by('year'))
+        yearly_stats_list = [ys.vendor_stats() for ys in year_scores if ys.vendor_count]
         yearly_stats_json = yearly_stats_list  # serializable dicts
-
-        # Yearly breakdown (buyer evaluations)
-        buyer_yearly_qs = buyer_evals.annotate(year=ExtractYear('date_evaluation')).values('year').annotate(
-            avg_price_flexibility=Avg('price_flexibility'),
-            avg_rfx_deadline_compliance=Avg('rfx_deadline_compliance'),
-            avg_advisory_capability=Avg('advisory_capability'),
-            avg_relationship_quality=Avg('relationship_quality'),
-            avg_rfx_response_quality=Avg('rfx_response_quality'),
-            avg_credit_policy=Avg('credit_policy'),
-            avg_final_rating=Avg('buyer_final_rating'),
-            num_evaluations=Count('id'),
-        ).order_by('year')
-
-        yearly_buyer_stats_list = list(buyer_yearly_qs)
+        yearly_buyer_stats_list = [ys.buyer_stats() for ys in year_scores if ys.buyer_count]
         yearly_buyer_stats_json = yearly_buyer_stats_list
 
-        # Build weighted yearly averages (union of years in vendor and buyer)
-        vendor_year_map = {int(y['year']): y for y in yearly_stats_list}
-        buyer_year_map = {int(y['year']): y for y in yearly_buyer_stats_list}
-        all_years = sorted(set(vendor_year_map.keys()) | set(buyer_year_map.keys()))
-        yearly_weighted_json = []
-        for y in all_years:
-            v_avg = float(vendor_year_map.get(y, {}).get('avg_final_rating') or 0)
-            b_avg = float(buyer_year_map.get(y, {}).get('avg_final_rating') or 0)
-            # If one side missing for a year, weight the available part accordingly
-            weighted = (v_avg * 0.60) + (b_avg * 0.40)
-            yearly_weighted_json.append({'year': y, 'weighted_avg': round(weighted, 2), 'vendor_avg': v_avg, 'buyer_avg': b_avg})
-
-        # Per-evaluation time series (ordered by date asc) - vendor evaluations
-        evals_ordered = list(vendor_evals.order_by('date_evaluation'))
-        running_sum = 0.0
-        for idx, e in enumerate(evals_ordered, start=1):
-            chart_eval_labels.append(e.date_evaluation.strftime('%d/%m/%Y') if e.date_evaluation else f'#{idx}')
-            v = float(e.vendor_final_rating)
-            chart_eval_values.append(v)
-            running_sum += v
-            chart_eval_mavg.append(round(running_sum / idx, 2))
-
-        # Table data (latest first) - vendor evaluations
-        evals_for_table = vendor_evals.select_related('evaluator').order_by('-date_evaluation')
+        # Weighted yearly averages (60/40, years with vendor or buyer evaluations)
+        yearly_weighted_json = [
+            {
+                'year': ys.year,
+                'weighted_avg': float(ys.weighted_rating),
+                'vendor_avg': float(ys.avg_vendor_rating),
+                'buyer_avg': float(ys.avg_buyer_rating),
+            }
+            for ys in year_scores
+        ]
 
     context = {
         'total_suppliers': total_suppliers,
@@ -337,10 +251,6 @@ def ranking_overview(request):
         'yearly_buyer_stats_list': yearly_buyer_stats_list,
         'yearly_buyer_stats_json': yearly_buyer_stats_json,
         'yearly_weighted_json': yearly_weighted_json,
-        'chart_eval_labels': chart_eval_labels,
-        'chart_eval_values': chart_eval_values,
-        'chart_eval_mavg': chart_eval_mavg,
-        'evals_for_table': evals_for_table,
         'top10': top10,
         'bottom10': bottom10,
     }
@@ -351,196 +261,48 @@ def ranking_overview(request):
 @login_required
 def export_ranking_top_csv(request):
     """Export Top 10 best suppliers by average rating as CSV"""
-    suppliers_qs = Supplier.objects.annotate(
-        avg_rating=Avg('evaluations__vendor_final_rating'),
-        eval_count=Count('evaluations')
-    ).filter(eval_count__gt=0).order_by('-avg_rating', 'nom_complet_organisation')[:10]
-
-    resp = HttpResponse(content_type='text/csv')
-    resp['Content-Disposition'] = 'attachment; filename="ranking_top10.csv"'
-    import csv
-    w = csv.writer(resp)
-    w.writerow(['Rank', 'Supplier', 'Average', '#Evaluations'])
-    for idx, s in enumerate(suppliers_qs, start=1):
-        w.writerow([idx, s.nom_complet_organisation, f"{(s.avg_rating or 0):.2f}", s.eval_count])
-    return resp
+    return _ranking_csv_response(request, 'ranking_top10.csv', descending=True)
 
 
 @login_required
 def export_ranking_xlsx(request):
     """Export an XLSX workbook containing Top10, Bottom10, overview and optional selected supplier details."""
-    try:
-        import openpyxl
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-        from openpyxl.chart import LineChart, Reference
-    except ImportError:
-        return HttpResponse("openpyxl is required for XLSX export. Please install it: pip install openpyxl", status=500)
-
-    # Prepare data
-    suppliers_qs = Supplier.objects.annotate(
-        avg_rating=Avg('evaluations__vendor_final_rating'),
-        eval_count=Count('evaluations')
-    ).filter(eval_count__gt=0)
-
-    top10 = list(suppliers_qs.order_by('-avg_rating', 'nom_complet_organisation').values('nom_complet_organisation', 'avg_rating', 'eval_count')[:10])
-    bottom10 = list(suppliers_qs.order_by('avg_rating', 'nom_complet_organisation').values('nom_complet_organisation', 'avg_rating', 'eval_count')[:10])
-
-    supplier_id = request.GET.get('supplier')
+    supplier_id = request.GET.get('supplier') or ''
     include_yearly = request.GET.get('yearly') in ['1', 'true', 'on', 'True']
     include_chart = request.GET.get('chart') in ['1', 'true', 'on', 'True']
-    supplier = None
-    supplier_evals = []
-    if supplier_id:
-        supplier = get_object_or_404(Supplier, pk=supplier_id)
-        supplier_evals = list(
-            SupplierEvaluation.objects.filter(supplier=supplier)
-            .select_related('evaluator')
-            .order_by('date_evaluation')
-            .values('date_evaluation','vendor_final_rating','delivery_compliance','delivery_timeline','advising_capability','after_sales_qos','vendor_relationship','evaluator__email','comments')
-        )
+    # Le lien de la page de classement envoie « supplier=None » sans fournisseur choisi
+    supplier = get_object_or_404(Supplier, pk=supplier_id) if supplier_id.isdigit() else None
 
-    # Build workbook
-    wb = openpyxl.Workbook()
-    ws_over = wb.active
-    ws_over.title = 'Overview'
-    ws_top = wb.create_sheet(title='Top10')
-    ws_bottom = wb.create_sheet(title='Bottom10')
-    ws_supplier = wb.create_sheet(title='Supplier')
-    ws_yearly = wb.create_sheet(title='Yearly') if include_yearly else None
-
-    header_fill = PatternFill(start_color='FFDDE9FF', end_color='FFDDE9FF', fill_type='solid')  # light blue
-    bold = Font(bold=True)
-    thin = Side(border_style='thin', color='FFCCCCCC')
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-    center = Alignment(horizontal='center', vertical='center')
-
-    # Overview
-    ws_over.append(['Metric','Value'])
-    ws_over['A1'].font = bold; ws_over['B1'].font = bold
-    ws_over['A1'].fill = header_fill; ws_over['B1'].fill = header_fill
-    total_suppliers = suppliers_qs.count()
-    overall_avg = suppliers_qs.aggregate(a=Avg('avg_rating'))['a'] or 0
-    ws_over.append(['Suppliers evaluated', total_suppliers])
-    ws_over.append(['Global average (avg of supplier avgs)', round(overall_avg,2)])
-    for row in ws_over.iter_rows(min_row=1, max_row=ws_over.max_row, min_col=1, max_col=2):
-        for cell in row:
-            cell.border = border
-
-    # Top10
-    ws_top.append(['Rank','Supplier','Average','Evaluations'])
-    for cell in ws_top[1]:
-        cell.font = bold; cell.fill = header_fill; cell.alignment = center; cell.border = border
-    for idx, s in enumerate(top10, start=1):
-        ws_top.append([idx, s['nom_complet_organisation'], float(s['avg_rating'] or 0), int(s['eval_count'] or 0)])
-    for row in ws_top.iter_rows(min_row=2, max_row=ws_top.max_row, min_col=1, max_col=4):
-        for cell in row: cell.border = border
-
-    # Bottom10
-    ws_bottom.append(['Rank','Supplier','Average','Evaluations'])
-    for cell in ws_bottom[1]:
-        cell.font = bold; cell.fill = header_fill; cell.alignment = center; cell.border = border
-    for idx, s in enumerate(bottom10, start=1):
-        ws_bottom.append([idx, s['nom_complet_organisation'], float(s['avg_rating'] or 0), int(s['eval_count'] or 0)])
-    for row in ws_bottom.iter_rows(min_row=2, max_row=ws_bottom.max_row, min_col=1, max_col=4):
-        for cell in row: cell.border = border
-
-    # Supplier details
-    ws_supplier.append(['Supplier'])
-    ws_supplier.append([supplier.nom_complet_organisation if supplier else '—'])
-    ws_supplier.append([])
-    ws_supplier.append(['Date','Final','Delivery','Timeline','Advising','After Sales','Relationship','Evaluator','Comments'])
-    for cell in ws_supplier[4]:
-        cell.font = bold; cell.fill = header_fill; cell.border = border
-    for e in supplier_evals:
-        ws_supplier.append([
-            e['date_evaluation'].strftime('%Y-%m-%d') if e['date_evaluation'] else '',
-            float(e['vendor_final_rating'] or 0),
-            e['delivery_compliance'],
-            e['delivery_timeline'],
-            e['advising_capability'],
-            e['after_sales_qos'],
-            e['vendor_relationship'],
-            e.get('evaluator__email') or '',
-            (e.get('comments') or '').replace('\n',' ').strip(),
-        ])
-    for row in ws_supplier.iter_rows(min_row=4, max_row=ws_supplier.max_row, min_col=1, max_col=9):
-        for cell in row: cell.border = border
-
-    # Yearly sheet for selected supplier
-    if include_yearly and supplier:
-        from django.db.models.functions import ExtractYear
-        yearly_qs = SupplierEvaluation.objects.filter(supplier=supplier).annotate(year=ExtractYear('date_evaluation')).values('year').annotate(
-            avg_delivery_compliance=Avg('delivery_compliance'),
-            avg_delivery_timeline=Avg('delivery_timeline'),
-            avg_advising_capability=Avg('advising_capability'),
-            avg_after_sales_qos=Avg('after_sales_qos'),
-            avg_vendor_relationship=Avg('vendor_relationship'),
-            avg_final_rating=Avg('vendor_final_rating'),
-            num_evaluations=Count('id'),
-        ).order_by('year')
-        ws_yearly.append(['Year','Avg Final','Delivery','Timeline','Advising','After Sales','Relationship','#Evals'])
-        for cell in ws_yearly[1]:
-            cell.font = bold; cell.fill = header_fill; cell.alignment = center; cell.border = border
-        for y in yearly_qs:
-            ws_yearly.append([
-                y['year'],
-                float(y['avg_final_rating'] or 0),
-                float(y['avg_delivery_compliance'] or 0),
-                float(y['avg_delivery_timeline'] or 0),
-                float(y['avg_advising_capability'] or 0),
-                float(y['avg_after_sales_qos'] or 0),
-                float(y['avg_vendor_relationship'] or 0),
-                int(y['num_evaluations'] or 0),
-            ])
-        for row in ws_yearly.iter_rows(min_row=2, max_row=ws_yearly.max_row, min_col=1, max_col=8):
-            for cell in row: cell.border = border
-
-        if include_chart and ws_yearly.max_row >= 2:
-            # Create a line chart for Avg Final by Year
-            chart = LineChart()
-            chart.title = "Average Final Rating by Year"
-            data = Reference(ws_yearly, min_col=2, min_row=1, max_col=2, max_row=ws_yearly.max_row)
-            cats = Reference(ws_yearly, min_col=1, min_row=2, max_row=ws_yearly.max_row)
-            chart.add_data(data, titles_from_data=True)
-            chart.set_categories(cats)
-            chart.y_axis.scaling.min = 0
-            chart.y_axis.scaling.max = 10
-            ws_yearly.add_chart(chart, "J2")
-
-    # Autosize columns
-    for ws in [ws_over, ws_top, ws_bottom, ws_supplier]:
-        for col in ws.columns:
-            maxlen = 10
-            for cell in col:
-                try:
-                    maxlen = max(maxlen, len(str(cell.value)))
-                except Exception:
-                    pass
-            ws.column_dimensions[col[0].column_letter].width = min(maxlen + 2, 60)
-
-    # Response
-    resp = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = 'attachment; filename="supplier_ranking.xlsx"'
-    wb.save(resp)
-    return resp
+    book = StreamingWorkbook()
+    write_ranking_workbook(book, supplier, include_yearly=include_yearly, include_chart=include_chart)
+    return book.response('supplier_ranking.xlsx')
+
+
+@login_required
+def export_ranking_full_xlsx(request):
+    """Export an XLSX workbook with every rated supplier and all their vendor and buyer evaluations."""
+    book = StreamingWorkbook()
+    write_full_workbook(book)
+    return book.response('supplier_ranking_full.xlsx')
 
 
 @login_required
 def export_ranking_bottom_csv(request):
     """Export Top 10 worst suppliers by average rating as CSV"""
-    suppliers_qs = Supplier.objects.annotate(
-        avg_rating=Avg('evaluations__vendor_final_rating'),
-        eval_count=Count('evaluations')
-    ).filter(eval_count__gt=0).order_by('avg_rating', 'nom_complet_organisation')[:10]
+    return _ranking_csv_response(request, 'ranking_bottom10.csv', descending=False)
+
 
-    resp = HttpResponse(content_type='text/csv')
-    resp['Content-Disposition'] = 'attachment; filename="ranking_bottom10.csv"'
-    import csv
-    w = csv.writer(resp)
-    w.writerow(['Rank', 'Supplier', 'Average', '#Evaluations'])
-    for idx, s in enumerate(suppliers_qs, start=1):
-        w.writerow([idx, s.nom_complet_organisation, f"{(s.avg_rating or 0):.2f}", s.eval_count])
-    return resp
+def _ranking_csv_response(request, filename, descending):
+    suppliers_qs = SupplierScore.objects.vendor_ranking(descending=descending)[:10]
+    return streaming_csv_response(
+        request,
+        filename,
+        ['Rank', 'Supplier', 'Average', '#Evaluations'],
+        (
+            [idx, s['nom_complet_organisation'], f"{(s['avg_rating'] or 0):.2f}", s['eval_count']]
+            for idx, s in enumerate(suppliers_qs.iterator(), start=1)
+        ),
+    )
 
 
 @login_required
@@ -548,27 +310,35 @@ def export_supplier_ranking_csv(request):
     """Export selected supplier evaluations detail as CSV"""
     supplier_id = request.GET.get('supplier')
     supplier = get_object_or_404(Supplier, pk=supplier_id)
-    evals = SupplierEvaluation.objects.filter(supplier=supplier).select_related('evaluator').order_by('date_evaluation')
+    evals = SupplierEvaluation.objects.filter(supplier=supplier).order_by('date_evaluation').values_list(
+        'date_evaluation',
+        'vendor_final_rating',
+        'delivery_compliance',
+        'delivery_timeline',
+        'advising_capability',
+        'after_sales_qos',
+        'vendor_relationship',
+        'evaluator__email',
+        'comments',
+    )
 
-    resp = HttpResponse(content_type='text/csv')
     safe_name = supplier.nom_complet_organisation.replace(' ', '_')
-    resp['Content-Disposition'] = f'attachment; filename="supplier_ranking_{safe_name}.csv"'
-    import csv
-    w = csv.writer(resp)
-    w.writerow(['Date', 'Final Rating', 'Delivery Compliance', 'Timeline', 'Advising', 'After Sales', 'Relationship', 'Evaluator', 'Comments'])
-    for e in evals:
-        w.writerow([
-            e.date_evaluation.strftime('%Y-%m-%d') if e.date_evaluation else '',
-            f"{e.vendor_final_rating}",
-            e.delivery_compliance,
-            e.delivery_timeline,
-            e.advising_capability,
-            e.after_sales_qos,
-            e.vendor_relationship,
-            getattr(e.evaluator, 'email', '') or '',
-            (e.comments or '').replace('\n', ' ').strip(),
-        ])
-    return resp
+    return streaming_csv_response(
+        request,
+        f'supplier_ranking_{safe_name}.csv',
+        ['Date', 'Final Rating', 'Delivery Compliance', 'Timeline', 'Advising', 'After Sales', 'Relationship', 'Evaluator', 'Comments'],
+        (
+            [
+                date_evaluation.strftime('%Y-%m-%d') if date_evaluation else '',
+                f"{final_rating}",
+                *criteria,
+                evaluator_email or '',
+                (comments or '').replace('\n', ' ').strip(),
+            ]
+            for date_evaluation, final_rating, *criteria, evaluator_email, comments
+            in evals.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        ),
+    )
 
 
 # ============================================
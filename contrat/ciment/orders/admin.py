@@ -1,13 +1,25 @@
+import os
+import tempfile
+
+from django.conf import settings
 from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path
 
-from .models import ImportedFile, PurchaseOrder, PurchaseOrderLine
-from .services import import_purchase_orders_from_excel
+from .jobs import enqueue_import, run_import
+from .models import ImportedFile, PurchaseOrder, PurchaseOrderLine, PurchaseOrderLineSnapshot, SpendRollup
+from .readers import file_extension
+from .validation import validate_import_file, write_validation_report
 
 
 @admin.register(PurchaseOrder)
 class PurchaseOrderAdmin(admin.ModelAdmin):
     list_display = (
         "number",
+        "currency",
         "get_total_amount",
         "get_received_amount",
         "get_remaining_amount",
@@ -15,6 +27,7 @@ class PurchaseOrderAdmin(admin.ModelAdmin):
         "created_at",
     )
     search_fields = ("number",)
+    list_filter = ("is_multi_currency",)
     ordering = ("number",)
 
 
@@ -34,22 +47,133 @@ class PurchaseOrderLineAdmin(admin.ModelAdmin):
     list_filter = ("purchasing_document",)
 
 
+@admin.register(PurchaseOrderLineSnapshot)
+class PurchaseOrderLineSnapshotAdmin(admin.ModelAdmin):
+    list_display = (
+        "business_id",
+        "recorded_at",
+        "received_quantity",
+        "still_to_be_delivered_qty",
+        "received_delta",
+        "supplier",
+        "imported_file",
+    )
+    search_fields = ("business_id", "purchase_order__number")
+    date_hierarchy = "recorded_at"
+    list_select_related = ("supplier", "imported_file")
+    raw_id_fields = ("purchase_order", "supplier", "imported_file")
+
+    # Historique en ajout seul, alimenté par l'import
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SpendRollup)
+class SpendRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        "supplier",
+        "purchasing_group",
+        "material",
+        "currency",
+        "lines_count",
+        "ordered_amount",
+        "received_amount",
+        "remaining_amount",
+        "updated_at",
+    )
+    list_filter = ("currency",)
+    search_fields = ("supplier__nom_complet_organisation", "purchasing_group", "material")
+    list_select_related = ("supplier",)
+
+    # Table dérivée : recalculée par l'import et la commande rebuild_spend_rollups
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ImportedFile)
 class ImportedFileAdmin(admin.ModelAdmin):
-    list_display = ("file", "user", "extension", "rows_count", "imported_at")
-    readonly_fields = ("user", "extension", "rows_count", "imported_at")
+    list_display = ("file", "user", "extension", "status", "rows_count", "errors_count", "imported_at")
+    list_filter = ("status",)
+    readonly_fields = (
+        "user",
+        "extension",
+        "status",
+        "rows_count",
+        "errors_count",
+        "pos_created",
+        "rows_committed",
+        "started_at",
+        "finished_at",
+        "error_message",
+        "content_hash",
+        "duplicate_of",
+        "imported_at",
+    )
     date_hierarchy = "imported_at"
+    change_form_template = "admin/orders/importedfile/change_form.html"
+    change_list_template = "admin/orders/importedfile/change_list.html"
+    actions = ["requeue_imports", "resume_imports"]
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<int:pk>/progress/",
+                self.admin_site.admin_view(self.progress_view),
+                name="orders_importedfile_progress",
+            ),
+            path(
+                "validate/",
+                self.admin_site.admin_view(self.validate_view),
+                name="orders_importedfile_validate",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def progress_view(self, request, pk):
+        imported_file = get_object_or_404(ImportedFile, pk=pk)
+        return JsonResponse(imported_file.progress_data())
+
+    def validate_view(self, request):
+        """Validation à blanc : renvoie le rapport xlsx sans rien écrire en base."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Valider un fichier d'import",
+        )
+        uploaded = request.FILES.get("file") if request.method == "POST" else None
+        if uploaded is None:
+            return TemplateResponse(request, "admin/orders/importedfile/validate.html", context)
 
-    def save_model(self, request, obj, form, change):
-        # Sauvegarde initiale pour disposer du fichier sur le disque/storage
-        is_new = obj.pk is None
+        try:
+            report = validate_import_file(uploaded, extension=file_extension(uploaded))
+        except Exception as exc:
+            context["error"] = f"Fichier illisible : {exc}"
+            return TemplateResponse(request, "admin/orders/importedfile/validate.html", context)
 
+        output = tempfile.TemporaryFile()
+        write_validation_report(report, output)
+        output.seek(0)
+        name = os.path.splitext(os.path.basename(uploaded.name))[0]
+        return FileResponse(output, as_attachment=True, filename=f"validation-{name}.xlsx")
+
+    def save_model(self, request, obj, form, change):
         # Récupérer automatiquement l'utilisateur qui importe
         if not obj.user:
             obj.user = request.user if request.user.is_authenticated else None
+
+        # Sauvegarde initiale pour disposer du fichier sur le disque/storage
+        file_changed = not change or "file" in form.changed_data
         super().save_model(request, obj, form, change)
 
-        if not obj.file:
+        if not obj.file or not file_changed:
             return
 
         # Détecter l'extension simple (sans le point)
@@ -57,29 +181,57 @@ class ImportedFileAdmin(admin.ModelAdmin):
 
         _, ext = splitext(obj.file.name)
         obj.extension = ext.lstrip(".").lower()
+        obj.save(update_fields=["extension"])
+
+        # L'import est exécuté par le worker (commande run_import_worker)
+        if getattr(settings, "ORDERS_IMPORT_BACKGROUND", True):
+            enqueue_import(obj)
+            messages.info(request, "Import mis en file d'attente. Suivez l'avancement sur la fiche du fichier.")
+            return
 
-        # Lancer l'import depuis le fichier
+        # Mode synchrone (développement sans worker) : nouveau fichier, pas de reprise
+        obj.rows_committed = 0
         try:
-            summary = import_purchase_orders_from_excel(obj.file, imported_file=obj)
-            obj.save(update_fields=["extension", "rows_count"])
+            summary = run_import(obj)
+        except Exception as exc:
+            messages.error(request, f"Erreur lors de l'import du fichier: {exc}")
+            return
+
+        if summary.get("duplicate_of"):
+            messages.info(request, f"Fichier identique à l'import #{summary['duplicate_of']} : import ignoré.")
+            return
 
-            messages.success(
+        messages.success(
+            request,
+            (
+                "Import terminé: "
+                f"{summary.get('lines_processed', 0)} lignes, "
+                f"{summary.get('pos_created', 0)} PO créés, "
+                f"{summary.get('pos_updated', 0)} PO mis à jour."
+            ),
+        )
+
+        errors = summary.get("errors") or []
+        if errors:
+            # Afficher un seul message warning global, les détails restent sur la fiche
+            messages.warning(
                 request,
-                (
-                    "Import terminé: "
-                    f"{summary.get('lines_processed', 0)} lignes, "
-                    f"{summary.get('pos_created', 0)} PO créés, "
-                    f"{summary.get('pos_updated', 0)} PO mis à jour."
-                ),
+                f"Certaines lignes ont été ignorées ({len(errors)}). Voir la fiche du fichier pour le détail.",
             )
 
-            errors = summary.get("errors") or []
-            if errors:
-                # Afficher un seul message warning global, les détails restent dans les logs
-                messages.warning(
-                    request,
-                    f"Certaines lignes ont été ignorées ({len(errors)}). Voir les logs pour le détail.",
-                )
-        except Exception as exc:
-            messages.error(request, f"Erreur lors de l'import du fichier: {exc}")
-
+    @admin.action(description="Relancer l'import des fichiers sélectionnés")
+    def requeue_imports(self, request, queryset):
+        count = 0
+        for imported_file in queryset.exclude(status=ImportedFile.STATUS_RUNNING):
+            enqueue_import(imported_file)
+            count += 1
+        messages.info(request, f"{count} fichier(s) remis en file d'attente.")
+
+    @admin.action(description="Reprendre les imports interrompus (après le dernier lot validé)")
+    def resume_imports(self, request, queryset):
+        count = 0
+        # Un import "en cours" dont le worker a été arrêté peut aussi être repris
+        for imported_file in queryset.filter(status__in=[ImportedFile.STATUS_FAILED, ImportedFile.STATUS_RUNNING]):
+            enqueue_import(imported_file, resume=True)
+            count += 1
+        messages.info(request, f"{count} import(s) repris.")
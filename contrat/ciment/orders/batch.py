@@ -0,0 +1,292 @@
+"""Import groupé de plusieurs extractions PO (chargement de fin de mois).
+
+- Les sources (fichiers, dossiers, archives zip) sont dépliées en fichiers ;
+  chaque feuille de chaque fichier est lue et nettoyée dans un pool de
+  processus (``parse_sheet`` n'accède pas à la base)
+- Les lignes sont dédoublonnées sur ``business_id`` entre toutes les
+  sources : le fichier modifié le plus récemment l'emporte
+- Les lignes retenues sont écrites en une seule passe fusionnée, par lots
+  (voir ``write_with_savepoints``), puis un ``ImportedFile`` par fichier
+  source reçoit son propre résumé
+
+Toutes les lignes nettoyées sont gardées en mémoire le temps de la fusion.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import django
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .jobs import MAX_REPORTED_ERRORS, compute_content_hash, find_identical_import, register_local_file
+from .models import ImportedFile
+from .readers import EXTENSION_FORMATS, iter_import_chunks, list_sheets
+from .rollups import collect_spend_keys, refresh_touched_spend_rollups
+from .services import (
+    AUTO_SUPPLIER_DEFAULTS,
+    IMPORT_BATCH_SIZE,
+    LINE_DECIMAL_FIELDS,
+    LINE_TEXT_FIELDS,
+    assign_suppliers,
+    clean_line_records,
+    make_import_writer,
+    refresh_purchase_order_amounts,
+    resolve_columns,
+    write_with_savepoints,
+)
+from suppliers.services import SupplierResolver
+
+logger = logging.getLogger(__name__)
+
+
+def _extension(path: str) -> str:
+    return os.path.splitext(path)[1].lstrip(".").lower()
+
+
+class BatchSource:
+    """Fichier à importer : chemin local, nom d'origine et date de modification."""
+
+    def __init__(self, path: str, name: str, mtime: float):
+        self.path = path
+        self.name = name
+        self.mtime = mtime
+        self.imported_file: Optional[ImportedFile] = None
+        self.sheets = 0
+        self.errors: List[str] = []
+        self.lines = 0
+        self.superseded = 0
+        self.failed = False
+
+
+def collect_sources(paths: Iterable[str], workdir: str) -> List[BatchSource]:
+    """Déplie fichiers, dossiers et archives zip en fichiers importables.
+
+    Les membres d'une archive sont extraits dans ``workdir`` avec la date de
+    modification enregistrée dans l'archive.
+    """
+    sources: List[BatchSource] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, files in sorted(os.walk(path)):
+                sources.extend(collect_sources((os.path.join(root, name) for name in sorted(files)), workdir))
+            continue
+
+        ext = _extension(path)
+        if ext == "zip":
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    name = os.path.basename(info.filename)
+                    if info.is_dir() or _extension(name) not in EXTENSION_FORMATS:
+                        continue
+                    target = os.path.join(workdir, f"{len(sources)}-{name}")
+                    with archive.open(info) as member, open(target, "wb") as handle:
+                        # Copie par blocs : la mémoire ne dépend pas de la taille du membre
+                        shutil.copyfileobj(member, handle)
+                    sources.append(BatchSource(target, name, time.mktime(info.date_time + (0, 0, -1))))
+        elif ext in EXTENSION_FORMATS:
+            sources.append(BatchSource(path, os.path.basename(path), os.path.getmtime(path)))
+    return sources
+
+
+def parse_sheet(path: str, sheet: int, batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """Lit et nettoie une feuille (exécuté dans un processus du pool, sans accès à la base)."""
+    errors: List[str] = []
+    mappings = []
+
+    def select_columns(headers):
+        mappings.append(resolve_columns(headers))
+        return list(mappings[0].columns.values())
+
+    records: List[Dict[str, Any]] = []
+    with open(path, "rb") as handle:
+        for chunk in iter_import_chunks(handle, chunk_size=batch_size, select_columns=select_columns, sheet=sheet):
+            records.extend(clean_line_records(mappings[0].extract(chunk), errors))
+
+    line_fields: Tuple[str, ...] = tuple(LINE_DECIMAL_FIELDS)
+    if mappings:
+        # Les champs texte absents de la feuille ne doivent pas écraser l'existant
+        line_fields = tuple(f for f in LINE_TEXT_FIELDS if f in mappings[0]) + line_fields
+    return {"records": records, "errors": errors, "line_fields": line_fields}
+
+
+def register_source(source: BatchSource, user=None) -> None:
+    """Crée l'``ImportedFile`` de la source (copie du fichier dans le stockage)."""
+    imported_file = register_local_file(source.path, name=source.name, user=user, status=ImportedFile.STATUS_RUNNING)
+    imported_file.started_at = timezone.now()
+    imported_file.content_hash = compute_content_hash(imported_file.file)
+    imported_file.save(update_fields=["started_at", "content_hash"])
+    source.imported_file = imported_file
+
+
+def import_batch(
+    paths: Iterable[str],
+    workers: Optional[int] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    user=None,
+) -> Dict[str, Any]:
+    """Importe un ensemble de fichiers PO en une écriture fusionnée.
+
+    ``workers`` : nombre de processus de lecture (défaut : un par cœur ; 0 lit
+    les fichiers dans le processus courant). Retourne un résumé global et,
+    dans ``files``, un résumé par fichier source (également enregistré sur son
+    ``ImportedFile``).
+    """
+    with tempfile.TemporaryDirectory(prefix="po-batch-") as workdir:
+        sources = collect_sources(paths, workdir)
+        for source in sources:
+            register_source(source, user=user)
+
+        # Un fichier identique à un import réussi n'est pas relu
+        pending: List[BatchSource] = []
+        for source in sources:
+            original = find_identical_import(source.imported_file)
+            if original is None:
+                pending.append(source)
+                continue
+            ImportedFile.objects.filter(pk=source.imported_file.pk).update(
+                status=ImportedFile.STATUS_DONE,
+                finished_at=timezone.now(),
+                duplicate_of=original,
+                error_message=f"Fichier identique à l'import #{original.pk} : aucune ligne réécrite.",
+            )
+
+        parsed = _parse_sources(pending, workers, batch_size)
+
+    # Fusion : le fichier le plus récent l'emporte pour un même business_id
+    merged: Dict[str, Tuple[Dict[str, Any], BatchSource, Tuple[str, ...]]] = {}
+    for index, source in sorted(enumerate(pending), key=lambda item: (item[1].mtime, item[0])):
+        for result in parsed.get(index, []):
+            for record in result["records"]:
+                previous = merged.get(record["business_id"])
+                # Doublon dans un même fichier : la dernière ligne l'emporte, comme à l'import simple
+                if previous is not None and previous[1] is not source:
+                    previous[1].superseded += 1
+                merged[record["business_id"]] = (record, source, result["line_fields"])
+
+    # Une écriture par ensemble de colonnes présentes (voir line_fields) et par
+    # source, pour rattacher l'historique des lignes au bon ImportedFile
+    groups: Dict[Tuple[Tuple[str, ...], BatchSource], List[Dict[str, Any]]] = {}
+    for record, source, line_fields in merged.values():
+        groups.setdefault((line_fields, source), []).append(record)
+    del merged
+
+    suppliers = SupplierResolver(defaults=AUTO_SUPPLIER_DEFAULTS)
+    write_errors: List[str] = []
+    writers: Dict[Tuple[str, ...], Any] = {}
+    for (line_fields, source), items in groups.items():
+        if line_fields not in writers:
+            writers[line_fields] = make_import_writer(line_fields, batch_size)
+        writer = writers[line_fields]
+        writer.imported_file_id = source.imported_file.pk
+        for start in range(0, len(items), batch_size):
+            records = items[start:start + batch_size]
+            rejected: List[Dict[str, Any]] = []
+            with transaction.atomic():
+                assign_suppliers(records, suppliers)
+                spend_keys = collect_spend_keys(record["purchasing_document"] for record in records)
+                write_with_savepoints(writer, records, write_errors, rejected)
+                refresh_purchase_order_amounts(writer.affected_po_ids, batch_size=batch_size)
+                refresh_touched_spend_rollups(spend_keys, writer.affected_po_ids)
+                writer.affected_po_ids.clear()
+            source.lines += len(records) - len(rejected)
+            for record in rejected:
+                source.errors.append(f"Ligne refusée par la base ({record['business_id']})")
+    pos_created = sum(writer.pos_created for writer in writers.values())
+
+    files = [_finish_source(source) for source in sources]
+    return {
+        "files": files,
+        "lines_processed": sum(source.lines for source in pending),
+        "pos_created": pos_created,
+        "errors": sum(len(source.errors) for source in pending),
+        "write_errors": write_errors,
+    }
+
+
+def _parse_sources(
+    sources: List[BatchSource], workers: Optional[int], batch_size: int
+) -> Dict[int, List[Dict[str, Any]]]:
+    """Lit toutes les feuilles dans un pool de processus ; résultats par source, dans l'ordre des feuilles."""
+    units: List[Tuple[int, int]] = []
+    for index, source in enumerate(sources):
+        try:
+            with open(source.path, "rb") as handle:
+                source.sheets = len(list_sheets(handle))
+        except Exception as exc:
+            source.failed = True
+            source.errors.append(f"Fichier illisible : {exc}")
+            continue
+        units.extend((index, sheet) for sheet in range(source.sheets))
+
+    results: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+    def collect(index: int, sheet: int, read) -> None:
+        source = sources[index]
+        try:
+            results[(index, sheet)] = read()
+        except Exception as exc:
+            logger.exception("Échec de lecture de %s (feuille %s)", source.name, sheet + 1)
+            source.failed = True
+            source.errors.append(f"Feuille {sheet + 1} illisible : {exc}")
+
+    if workers == 0:
+        for index, sheet in units:
+            collect(index, sheet, lambda: parse_sheet(sources[index].path, sheet, batch_size))
+    elif units:
+        # Les processus du pool ne doivent pas hériter des connexions ouvertes
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            futures = {
+                pool.submit(parse_sheet, sources[index].path, sheet, batch_size): (index, sheet)
+                for index, sheet in units
+            }
+            for future in as_completed(futures):
+                collect(*futures[future], future.result)
+
+    parsed: Dict[int, List[Dict[str, Any]]] = {}
+    for index, sheet in units:
+        source = sources[index]
+        if source.failed or (index, sheet) not in results:
+            continue
+        result = results[(index, sheet)]
+        source.errors.extend(result["errors"])
+        parsed.setdefault(index, []).append(result)
+    return parsed
+
+
+def _finish_source(source: BatchSource) -> Dict[str, Any]:
+    """Enregistre le résumé d'une source sur son ``ImportedFile``."""
+    imported_file = source.imported_file
+    imported_file.refresh_from_db(fields=["status", "duplicate_of"])
+    summary = {
+        "file": source.name,
+        "imported_file": imported_file.pk,
+        "sheets": source.sheets,
+        "lines_processed": source.lines,
+        "superseded": source.superseded,
+        "errors": len(source.errors),
+        "duplicate_of": imported_file.duplicate_of_id,
+    }
+    if imported_file.duplicate_of_id is not None:
+        summary["status"] = ImportedFile.STATUS_DONE
+        return summary
+
+    messages = list(source.errors[:MAX_REPORTED_ERRORS])
+    if source.superseded:
+        messages.insert(0, f"{source.superseded} ligne(s) remplacée(s) par un fichier plus récent du lot.")
+    summary["status"] = ImportedFile.STATUS_FAILED if source.failed else ImportedFile.STATUS_DONE
+    ImportedFile.objects.filter(pk=imported_file.pk).update(
+        status=summary["status"],
+        finished_at=timezone.now(),
+        rows_count=source.lines,
+        errors_count=len(source.errors),
+        error_message="\n".join(messages),
+    )
+    return summary
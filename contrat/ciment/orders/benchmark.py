@@ -0,0 +1,187 @@
+"""Banc d'essai de l'import des PO.
+
+- ``write_synthetic_export`` génère un export SAP réaliste (xlsx ou csv) :
+  en-têtes « sales » (espaces, casse, colonnes en trop), cellules vides,
+  PO répétés sur plusieurs lignes et nombreux fournisseurs
+- ``run_import_benchmark`` importe ce fichier via
+  ``import_purchase_orders_from_excel`` et mesure débit, nombre de requêtes
+  SQL, pic de mémoire (RSS) et temps par phase
+
+Le rapport est un dict sérialisable en JSON pour comparer les exécutions.
+"""
+
+import csv
+import platform
+import random
+import sys
+import time
+from contextlib import contextmanager
+from os.path import splitext
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.db import connection
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .services import import_purchase_orders_from_excel
+
+try:
+    import resource
+except ImportError:  # Windows : pas de mesure du pic RSS
+    resource = None
+
+# Préfixe des numéros de PO et des fournisseurs générés (nettoyage ciblé)
+BENCHMARK_PREFIX = "BENCH"
+
+# En-têtes volontairement irréguliers, tels qu'on les reçoit des exports SAP
+SYNTHETIC_HEADERS = [
+    " Purchasing Document ",
+    "ITEM",
+    "Material",
+    "Short Text",
+    "Order Quantity",
+    "Order Unit",
+    "Net price",
+    "Currency ",
+    "Net Order Value",
+    "Received Quantity",
+    "Still to be delivered (qty)",
+    "Name of Supplier",
+    "Purchasing Group",
+    "Document Date",
+    "Created By",
+    "Release indicator",
+    "Plant",
+    "",
+]
+
+MATERIALS = ["Ciment CPJ 45", "Gypse", "Clinker", "Sacs kraft", "Pièces broyeur", "Gasoil", "Calcaire"]
+UNITS = ["T", "EA", "L", "KG"]
+CURRENCIES = ["XOF", "XOF", "XOF", "EUR", "USD"]
+
+
+def synthetic_rows(
+    rows: int,
+    suppliers: int = 500,
+    lines_per_po: int = 5,
+    null_ratio: float = 0.05,
+    seed: int = 0,
+) -> Iterator[List[Any]]:
+    """Génère les lignes d'un export PO synthétique (déterministe pour un ``seed``)."""
+    rng = random.Random(seed)
+    for index in range(rows):
+        po_number = f"{BENCHMARK_PREFIX}{index // lines_per_po:08d}"
+        item = (index % lines_per_po + 1) * 10
+        quantity = rng.randint(1, 500)
+        price = round(rng.uniform(100, 250000), 2)
+        received = rng.randint(0, quantity)
+        supplier = f"{BENCHMARK_PREFIX} Fournisseur {(index // lines_per_po) % suppliers:05d}"
+
+        row: List[Any] = [
+            po_number,
+            item,
+            f"MAT-{rng.randint(1, 5000):05d}",
+            rng.choice(MATERIALS),
+            quantity,
+            rng.choice(UNITS),
+            price,
+            rng.choice(CURRENCIES),
+            round(quantity * price, 2),
+            received,
+            quantity - received,
+            supplier,
+            f"P{rng.randint(1, 40):02d}",
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            f"USER{rng.randint(1, 30):02d}",
+            rng.choice(["R", "", "X"]),
+            "CI01",
+            None,
+        ]
+        # Cellules vides réparties sur les colonnes non clés
+        for column in range(2, len(row) - 1):
+            if rng.random() < null_ratio:
+                row[column] = None
+        # Quelques lignes sans clé, ignorées par l'import
+        if rng.random() < null_ratio / 10:
+            row[1] = None
+        yield row
+
+
+def write_synthetic_export(path: str, rows: int, **options) -> str:
+    """Écrit un export synthétique de ``rows`` lignes ; le format suit l'extension (xlsx ou csv)."""
+    ext = splitext(path)[1].lstrip(".").lower()
+    data = synthetic_rows(rows, **options)
+
+    if ext == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(SYNTHETIC_HEADERS)
+            for row in data:
+                writer.writerow(["" if value is None else value for value in row])
+        return path
+
+    # Mode write_only : le classeur est écrit en flux, sans tout garder en mémoire
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Export")
+    sheet.append(SYNTHETIC_HEADERS)
+    for row in data:
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du processus, en Mo (None si non mesurable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+@contextmanager
+def count_queries() -> Iterator[Dict[str, int]]:
+    """Compte les requêtes SQL exécutées, sans les conserver en mémoire."""
+    counter = {"queries": 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter["queries"] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def run_import_benchmark(path: str, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Importe le fichier ``path`` et retourne les mesures de l'exécution."""
+    options = {} if batch_size is None else {"batch_size": batch_size}
+    rss_before = peak_rss_mb()
+
+    with open(path, "rb") as handle, count_queries() as counter:
+        start = time.perf_counter()
+        summary = import_purchase_orders_from_excel(handle, **options)
+        elapsed = time.perf_counter() - start
+
+    rows = summary["lines_processed"]
+    return {
+        "rows": rows,
+        "errors": len(summary["errors"]),
+        "pos_created": summary["pos_created"],
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed else None,
+        "queries": counter["queries"],
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_before_mb": rss_before,
+        "timings": summary["timings"],
+    }
+
+
+def benchmark_environment() -> Dict[str, Any]:
+    """Contexte d'exécution enregistré avec les résultats."""
+    return {
+        "date": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": connection.vendor,
+    }
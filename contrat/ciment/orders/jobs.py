@@ -0,0 +1,194 @@
+"""Exécution en arrière-plan des imports de fichiers PO.
+
+Les fichiers déposés dans l'admin sont mis en file d'attente (statut
+``queued``) ; la commande ``run_import_worker`` les traite un par un, sans
+broker externe : la base de données sert de file.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ImportedFile
+from .services import IMPORT_BATCH_SIZE, import_purchase_orders_from_excel
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximum d'erreurs de lignes conservées dans error_message
+MAX_REPORTED_ERRORS = 20
+
+
+def compute_content_hash(file) -> str:
+    """Empreinte SHA-256 du contenu d'un fichier, lu par blocs."""
+    digest = hashlib.sha256()
+    file.open("rb")
+    try:
+        for block in file.chunks():
+            digest.update(block)
+    finally:
+        file.seek(0)
+    return digest.hexdigest()
+
+
+def find_identical_import(imported_file: ImportedFile) -> Optional[ImportedFile]:
+    """Fichier au contenu identique déjà importé avec succès, s'il existe."""
+    return (
+        ImportedFile.objects.filter(
+            content_hash=imported_file.content_hash,
+            status=ImportedFile.STATUS_DONE,
+            duplicate_of__isnull=True,
+        )
+        .exclude(pk=imported_file.pk)
+        .order_by("-imported_at")
+        .first()
+    )
+
+
+def register_local_file(
+    path: str,
+    name: Optional[str] = None,
+    user=None,
+    status: str = ImportedFile.STATUS_QUEUED,
+) -> ImportedFile:
+    """Crée un ``ImportedFile`` à partir d'un fichier local (copié dans le stockage)."""
+    name = name or os.path.basename(path)
+    imported_file = ImportedFile(
+        user=user,
+        extension=os.path.splitext(name)[1].lstrip(".").lower(),
+        status=status,
+    )
+    with open(path, "rb") as handle:
+        imported_file.file.save(name, File(handle), save=False)
+    imported_file.save()
+    return imported_file
+
+
+def enqueue_import(imported_file: ImportedFile, resume: bool = False) -> None:
+    """Remet un fichier en file d'attente.
+
+    Par défaut l'import repart du début (compteurs réinitialisés). Avec
+    ``resume``, il reprend après le dernier lot validé (``rows_committed``).
+    """
+    imported_file.status = ImportedFile.STATUS_QUEUED
+    if not resume:
+        imported_file.rows_count = 0
+        imported_file.errors_count = 0
+        imported_file.pos_created = 0
+        imported_file.rows_committed = 0
+    imported_file.started_at = None
+    imported_file.finished_at = None
+    imported_file.error_message = ""
+    imported_file.save(
+        update_fields=[
+            "status",
+            "rows_count",
+            "errors_count",
+            "pos_created",
+            "rows_committed",
+            "started_at",
+            "finished_at",
+            "error_message",
+        ]
+    )
+
+
+def claim_next_import() -> Optional[ImportedFile]:
+    """Réserve le plus ancien fichier en attente et le passe en ``running``.
+
+    ``skip_locked`` permet à plusieurs workers de tourner en parallèle sans
+    traiter deux fois le même fichier (sur les bases qui le supportent).
+    """
+    with transaction.atomic():
+        imported_file = (
+            ImportedFile.objects.select_for_update(skip_locked=True)
+            .filter(status=ImportedFile.STATUS_QUEUED)
+            .order_by("imported_at", "pk")
+            .first()
+        )
+        if imported_file is None:
+            return None
+        imported_file.status = ImportedFile.STATUS_RUNNING
+        imported_file.save(update_fields=["status"])
+    return imported_file
+
+
+def run_import(imported_file: ImportedFile) -> Dict[str, Any]:
+    """Exécute l'import d'un fichier et enregistre son issue.
+
+    Un fichier identique (même empreinte) à un import déjà réussi n'est pas
+    retraité : il est marqué terminé et relié au fichier d'origine.
+
+    L'import reprend après ``rows_committed`` (0 pour un nouvel import) ; les
+    lots sont validés par ``ORDERS_IMPORT_CHUNK_SIZE`` lignes.
+    """
+    pk = imported_file.pk
+    imported_file.status = ImportedFile.STATUS_RUNNING
+    imported_file.started_at = timezone.now()
+    imported_file.finished_at = None
+    imported_file.duplicate_of = None
+    imported_file.content_hash = compute_content_hash(imported_file.file)
+    imported_file.save(update_fields=["status", "started_at", "finished_at", "duplicate_of", "content_hash"])
+
+    original = find_identical_import(imported_file)
+    if original is not None:
+        ImportedFile.objects.filter(pk=pk).update(
+            status=ImportedFile.STATUS_DONE,
+            finished_at=timezone.now(),
+            duplicate_of=original,
+            error_message=f"Fichier identique à l'import #{original.pk} : aucune ligne réécrite.",
+        )
+        return {
+            "lines_processed": 0,
+            "pos_created": 0,
+            "pos_updated": 0,
+            "errors": [],
+            "duplicate_of": original.pk,
+        }
+
+    # Les compteurs et le point de reprise sont enregistrés avec chaque lot
+    try:
+        summary = import_purchase_orders_from_excel(
+            imported_file.file,
+            imported_file=imported_file,
+            batch_size=getattr(settings, "ORDERS_IMPORT_CHUNK_SIZE", IMPORT_BATCH_SIZE),
+            start_row=imported_file.rows_committed,
+        )
+    except Exception as exc:
+        logger.exception("Échec de l'import du fichier %s", imported_file.file.name)
+        ImportedFile.objects.filter(pk=pk).update(
+            status=ImportedFile.STATUS_FAILED,
+            finished_at=timezone.now(),
+            error_message=str(exc),
+        )
+        raise
+
+    errors = summary.get("errors") or []
+    ImportedFile.objects.filter(pk=pk).update(
+        status=ImportedFile.STATUS_DONE,
+        finished_at=timezone.now(),
+        rows_count=summary.get("lines_processed", 0),
+        errors_count=summary.get("errors_count", len(errors)),
+        pos_created=summary.get("pos_created", 0),
+        error_message="\n".join(errors[:MAX_REPORTED_ERRORS]),
+    )
+    return summary
+
+
+def run_next_import() -> Optional[ImportedFile]:
+    """Traite le prochain fichier en attente. Retourne le fichier traité ou None."""
+    imported_file = claim_next_import()
+    if imported_file is None:
+        return None
+    try:
+        run_import(imported_file)
+    except Exception:
+        # L'échec est enregistré sur le fichier ; le worker continue
+        pass
+    imported_file.refresh_from_db()
+    return imported_file
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import PurchaseOrder
+
+
+class Command(BaseCommand):
+    help = "Renseigne la devise dénormalisée (currency, is_multi_currency) des PO existants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Nombre de PO mis à jour par requête",
+        )
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Ne traiter que les PO sans devise renseignée",
+        )
+
+    def handle(self, *args, **options):
+        queryset = PurchaseOrder.objects.all()
+        if options["missing_only"]:
+            queryset = queryset.filter(currency__isnull=True)
+
+        updated = 0
+        for batch in queryset.in_pk_batches(options["batch_size"]):
+            updated += batch.refresh_currency()
+
+        self.stdout.write(self.style.SUCCESS(f"Devise renseignée pour {updated} PO"))
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.benchmark import (
+    BENCHMARK_PREFIX,
+    benchmark_environment,
+    run_import_benchmark,
+    write_synthetic_export,
+)
+from orders.models import PurchaseOrder
+from suppliers.models import Supplier
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les performances de l'import PO sur un export SAP synthétique "
+        "(débit, requêtes SQL, pic RSS, temps par phase). À lancer sur une base locale."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000, help="Nombre de lignes générées")
+        parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx", help="Format du fichier généré")
+        parser.add_argument("--suppliers", type=int, default=500, help="Nombre de fournisseurs distincts")
+        parser.add_argument("--lines-per-po", type=int, default=5, help="Nombre de lignes par PO")
+        parser.add_argument("--null-ratio", type=float, default=0.05, help="Proportion de cellules vides")
+        parser.add_argument("--seed", type=int, default=0, help="Graine du générateur")
+        parser.add_argument("--batch-size", type=int, default=None, help="Taille des lots d'import")
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=2,
+            help="Nombre d'imports successifs du même fichier (le 1er crée, les suivants réimportent)",
+        )
+        parser.add_argument("--file", default=None, help="Importer ce fichier au lieu d'en générer un")
+        parser.add_argument("--output", default=None, help="Fichier JSON de résultats")
+        parser.add_argument("--baseline", default=None, help="Résultats JSON précédents à comparer")
+        parser.add_argument(
+            "--keep-data",
+            action="store_true",
+            help="Conserver les PO et fournisseurs générés (supprimés par défaut)",
+        )
+
+    def handle(self, *args, **options):
+        generated = options["file"] is None
+        if generated:
+            fd, path = tempfile.mkstemp(suffix=f".{options['format']}", prefix="po-benchmark-")
+            os.close(fd)
+            self.stdout.write(f"Génération de {options['rows']} lignes ({options['format']})...")
+            write_synthetic_export(
+                path,
+                options["rows"],
+                suppliers=options["suppliers"],
+                lines_per_po=options["lines_per_po"],
+                null_ratio=options["null_ratio"],
+                seed=options["seed"],
+            )
+        else:
+            path = options["file"]
+            if not os.path.exists(path):
+                raise CommandError(f"Fichier introuvable : {path}")
+
+        results = {
+            "environment": benchmark_environment(),
+            "parameters": {
+                key: options[key]
+                for key in ("rows", "format", "suppliers", "lines_per_po", "null_ratio", "seed", "batch_size", "file")
+            },
+            "file_size_bytes": os.path.getsize(path),
+            "runs": [],
+        }
+
+        try:
+            for run in range(1, options["runs"] + 1):
+                measures = run_import_benchmark(path, batch_size=options["batch_size"])
+                results["runs"].append(measures)
+                self.stdout.write(self._format_run(run, measures))
+        finally:
+            if generated:
+                os.remove(path)
+            if generated and not options["keep_data"]:
+                self._cleanup()
+
+        if options["baseline"]:
+            self._compare(results, options["baseline"])
+
+        output = options["output"] or f"po-import-benchmark-{results['environment']['date'][:19].replace(':', '')}.json"
+        with open(output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Résultats enregistrés dans {output}"))
+
+    def _format_run(self, run, measures):
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in measures["timings"].items())
+        return (
+            f"Import #{run}: {measures['rows']} lignes en {measures['seconds']:.2f}s "
+            f"({measures['rows_per_second']} lignes/s), {measures['queries']} requêtes, "
+            f"pic RSS {measures['peak_rss_mb']} Mo [{phases}]"
+        )
+
+    def _compare(self, results, baseline_path):
+        with open(baseline_path, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        for run, (current, previous) in enumerate(zip(results["runs"], baseline.get("runs", [])), start=1):
+            if not previous.get("rows_per_second"):
+                continue
+            ratio = current["rows_per_second"] / previous["rows_per_second"]
+            self.stdout.write(
+                f"Import #{run}: {ratio:.2f}x le débit de référence, "
+                f"requêtes {previous['queries']} -> {current['queries']}"
+            )
+
+    def _cleanup(self):
+        # Les lignes sont supprimées en cascade avec leur PO
+        PurchaseOrder.objects.filter(number__startswith=BENCHMARK_PREFIX).delete()
+        Supplier.objects.filter(nom_complet_organisation__startswith=BENCHMARK_PREFIX).delete()
@@ -0,0 +1,63 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.batch import import_batch
+from orders.models import ImportedFile
+from orders.services import IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe en une fois plusieurs extractions PO (fichiers, dossiers ou archives zip, "
+        "toutes les feuilles) : lecture en parallèle, dédoublonnage des lignes (le fichier "
+        "le plus récent l'emporte) et un ImportedFile par fichier"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Fichiers, dossiers ou archives zip à importer")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Nombre de processus de lecture (défaut : un par cœur, 0 : sans pool)",
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Taille des lots d'écriture")
+        parser.add_argument("--user", default=None, help="Nom de l'utilisateur à associer aux imports")
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            if not os.path.exists(path):
+                raise CommandError(f"Chemin introuvable : {path}")
+
+        user = None
+        if options["user"]:
+            User = get_user_model()
+            try:
+                user = User.objects.get(**{User.USERNAME_FIELD: options["user"]})
+            except User.DoesNotExist:
+                raise CommandError(f"Utilisateur introuvable : {options['user']}")
+
+        summary = import_batch(
+            options["paths"],
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            user=user,
+        )
+
+        for file_summary in summary["files"]:
+            line = (
+                f"{file_summary['file']}: {file_summary['lines_processed']} lignes, "
+                f"{file_summary['sheets']} feuille(s), {file_summary['superseded']} remplacées, "
+                f"{file_summary['errors']} erreurs"
+            )
+            if file_summary["duplicate_of"]:
+                line = f"{file_summary['file']}: identique à l'import #{file_summary['duplicate_of']}, ignoré"
+            style = self.style.ERROR if file_summary["status"] == ImportedFile.STATUS_FAILED else self.style.SUCCESS
+            self.stdout.write(style(line))
+
+        self.stdout.write(
+            f"Total : {len(summary['files'])} fichier(s), {summary['lines_processed']} lignes, "
+            f"{summary['pos_created']} PO créés, {summary['errors']} erreurs"
+        )
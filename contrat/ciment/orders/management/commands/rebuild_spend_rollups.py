@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.rollups import rebuild_spend_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit la table des cumuls de dépenses (fournisseur, groupe d'achat, article, devise) "
+        "à partir de toutes les lignes de PO"
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_spend_rollups()
+        self.stdout.write(self.style.SUCCESS(f"{count} cumuls de dépenses recalculés"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import PurchaseOrder
+
+
+class Command(BaseCommand):
+    help = "Recalcule en SQL les montants en cache (total, reçu, restant, avancement, devise) de tous les PO"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Nombre de PO mis à jour par requête",
+        )
+
+    def handle(self, *args, **options):
+        updated = 0
+        # Parcours par plages de clés : chaque UPDATE reste court et ne verrouille qu'un lot
+        for batch in PurchaseOrder.objects.all().in_pk_batches(options["batch_size"]):
+            updated += batch.refresh_amounts()
+
+        self.stdout.write(self.style.SUCCESS(f"Montants recalculés pour {updated} PO"))
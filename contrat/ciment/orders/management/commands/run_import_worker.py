@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.jobs import run_next_import
+from orders.models import ImportedFile
+
+
+class Command(BaseCommand):
+    help = "Traite en arrière-plan les fichiers PO en attente d'import (file d'attente en base)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Traiter les fichiers en attente puis s'arrêter",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5.0,
+            help="Délai (secondes) entre deux vérifications de la file",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker d'import démarré")
+        try:
+            while True:
+                imported_file = run_next_import()
+                if imported_file is None:
+                    if options["once"]:
+                        break
+                    time.sleep(options["sleep"])
+                    continue
+
+                if imported_file.status == ImportedFile.STATUS_DONE:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"{imported_file.file.name}: {imported_file.rows_count} lignes "
+                            f"en {imported_file.get_duration():.1f}s"
+                        )
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.ERROR(f"{imported_file.file.name}: {imported_file.error_message}")
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write("Worker d'import arrêté")
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.watcher import DropFolderWatcher
+
+
+class Command(BaseCommand):
+    help = (
+        "Surveille un dossier de dépôt et importe automatiquement les extractions PO "
+        "(fichiers rangés ensuite dans done/ ou failed/)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--directory",
+            default=None,
+            help="Dossier surveillé (défaut : ORDERS_IMPORT_WATCH_DIR)",
+        )
+        parser.add_argument("--workers", type=int, default=2, help="Nombre d'imports simultanés")
+        parser.add_argument("--interval", type=float, default=2.0, help="Délai (secondes) entre deux passages")
+        parser.add_argument(
+            "--settle",
+            type=float,
+            default=2.0,
+            help="Délai (secondes) sans modification avant de considérer un fichier complet",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["directory"] or getattr(settings, "ORDERS_IMPORT_WATCH_DIR", None)
+        if not directory:
+            raise CommandError("Aucun dossier à surveiller : utilisez --directory ou ORDERS_IMPORT_WATCH_DIR")
+
+        watcher = DropFolderWatcher(
+            str(directory),
+            workers=options["workers"],
+            settle_seconds=options["settle"],
+        )
+        self.stdout.write(f"Surveillance de {directory} (toutes les {options['interval']}s)")
+        try:
+            watcher.run(interval=options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Surveillance arrêtée")
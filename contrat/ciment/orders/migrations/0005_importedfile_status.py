@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_purchaseorder_created_by_purchaseorder_document_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importedfile',
+            name='error_message',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Erreur'),
+        ),
+        migrations.AddField(
+            model_name='importedfile',
+            name='errors_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Lignes ignorées'),
+        ),
+        migrations.AddField(
+            model_name='importedfile',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name="Fin de l'import"),
+        ),
+        migrations.AddField(
+            model_name='importedfile',
+            name='pos_created',
+            field=models.IntegerField(default=0, editable=False, verbose_name='PO créés'),
+        ),
+        migrations.AddField(
+            model_name='importedfile',
+            name='started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name="Début de l'import"),
+        ),
+        # Les fichiers déjà présents ont été importés de façon synchrone : 'done'
+        migrations.AddField(
+            model_name='importedfile',
+            name='status',
+            field=models.CharField(choices=[('queued', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], db_index=True, default='done', editable=False, max_length=10, verbose_name='Statut'),
+        ),
+        migrations.AlterField(
+            model_name='importedfile',
+            name='status',
+            field=models.CharField(choices=[('queued', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], db_index=True, default='queued', editable=False, max_length=10, verbose_name='Statut'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_importedfile_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importedfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64, verbose_name='Empreinte du contenu'),
+        ),
+        migrations.AddField(
+            model_name='importedfile',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='orders.importedfile', verbose_name='Identique à'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorderline',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, verbose_name="Empreinte d'import"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_import_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='currency',
+            field=models.CharField(blank=True, max_length=10, null=True, verbose_name='Devise'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='is_multi_currency',
+            field=models.BooleanField(default=False, verbose_name='Multi-devises'),
+        ),
+    ]
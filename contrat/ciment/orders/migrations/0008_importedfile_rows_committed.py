@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_purchaseorder_currency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importedfile',
+            name='rows_committed',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Lignes du fichier validées'),
+        ),
+    ]
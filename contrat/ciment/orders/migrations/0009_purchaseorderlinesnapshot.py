@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_importedfile_rows_committed'),
+        ('suppliers', '0003_banque_alter_supplier_banque_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseOrderLineSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_id', models.CharField(max_length=255, verbose_name='ID métier (PO + Item)')),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('received_quantity', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True, verbose_name='Received Quantity')),
+                ('still_to_be_delivered_qty', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True, verbose_name='Still to be delivered (qty)')),
+                ('received_delta', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=20, verbose_name="Quantité reçue depuis l'entrée précédente")),
+                ('imported_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='line_snapshots', to='orders.importedfile', verbose_name='Fichier importé')),
+                ('purchase_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='line_snapshots', to='orders.purchaseorder', verbose_name='Bon de commande')),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='po_line_snapshots', to='suppliers.supplier', verbose_name='Fournisseur')),
+            ],
+            options={
+                'verbose_name': 'Historique de ligne de PO',
+                'verbose_name_plural': 'Historique des lignes de PO',
+                'ordering': ['business_id', 'recorded_at'],
+                'indexes': [models.Index(fields=['business_id', 'recorded_at'], name='orders_snap_line_idx'), models.Index(fields=['purchase_order', 'recorded_at'], name='orders_snap_po_idx'), models.Index(fields=['supplier', 'recorded_at'], name='orders_snap_supplier_idx')],
+            },
+        ),
+    ]
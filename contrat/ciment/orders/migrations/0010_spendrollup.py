@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:31
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_purchaseorderlinesnapshot'),
+        ('suppliers', '0003_banque_alter_supplier_banque_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purchasing_group', models.CharField(blank=True, max_length=50, null=True, verbose_name='Purchasing Group')),
+                ('material', models.CharField(blank=True, max_length=100, null=True, verbose_name='Material')),
+                ('currency', models.CharField(blank=True, max_length=10, null=True, verbose_name='Currency')),
+                ('lines_count', models.IntegerField(default=0, verbose_name='Nombre de lignes')),
+                ('ordered_amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=20, verbose_name='Montant commandé')),
+                ('received_amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=20, verbose_name='Montant reçu')),
+                ('remaining_amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=20, verbose_name='Montant restant')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='spend_rollups', to='suppliers.supplier', verbose_name='Fournisseur')),
+            ],
+            options={
+                'verbose_name': 'Cumul de dépenses',
+                'verbose_name_plural': 'Cumuls de dépenses',
+                'ordering': ['supplier', 'purchasing_group', 'material', 'currency'],
+                'indexes': [models.Index(fields=['supplier', 'currency'], name='orders_spend_supplier_idx'), models.Index(fields=['purchasing_group', 'currency'], name='orders_spend_group_idx'), models.Index(fields=['material', 'currency'], name='orders_spend_material_idx')],
+            },
+        ),
+    ]
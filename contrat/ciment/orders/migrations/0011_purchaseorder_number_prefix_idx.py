@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_spendrollup'),
+        ('suppliers', '0003_banque_alter_supplier_banque_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['number'], name='orders_po_number_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
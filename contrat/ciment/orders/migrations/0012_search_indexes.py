@@ -0,0 +1,86 @@
+# Index de recherche plein texte (PostgreSQL uniquement, voir orders/search.py)
+#
+# Migration non atomique : les index GIN sont construits avec CREATE INDEX
+# CONCURRENTLY, sans bloquer les écritures sur orders_purchaseorderline.
+#
+# L'extension pg_trgm demande en général les droits superutilisateur ou
+# propriétaire de la base. Si elle n'est pas déjà créée et que le rôle de
+# l'application ne peut pas la créer, seuls les index tsvector sont construits
+# (la recherche n'utilise alors pas la similarité trigramme). Pour les ajouter
+# ensuite : ``CREATE EXTENSION pg_trgm;`` par un administrateur, puis
+# ``python manage.py migrate orders 0011`` et ``python manage.py migrate orders``.
+
+import logging
+
+from django.db import DatabaseError, migrations
+
+logger = logging.getLogger(__name__)
+
+LINE_DOCUMENT = (
+    "(COALESCE(business_id, '') || ' ' || COALESCE(material, '')"
+    " || ' ' || COALESCE(short_text, ''))"
+)
+
+TRIGRAM_SQL = [
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_line_search_trgm_idx ON orders_purchaseorderline "
+    f"USING gin ({LINE_DOCUMENT} gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_supplier_name_trgm_idx ON suppliers_supplier "
+    "USING gin (nom_complet_organisation gin_trgm_ops)",
+]
+
+TSVECTOR_SQL = [
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_line_search_tsv_idx ON orders_purchaseorderline "
+    f"USING gin (to_tsvector('simple', {LINE_DOCUMENT}))",
+]
+
+DROP_SQL = [
+    "DROP INDEX CONCURRENTLY IF EXISTS orders_supplier_name_trgm_idx",
+    "DROP INDEX CONCURRENTLY IF EXISTS orders_line_search_tsv_idx",
+    "DROP INDEX CONCURRENTLY IF EXISTS orders_line_search_trgm_idx",
+]
+
+
+def ensure_trigram(connection):
+    """True si pg_trgm est disponible (déjà créée, ou créée si le rôle en a le droit)."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+        if cursor.fetchone()[0]:
+            return True
+        try:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError as exc:
+            logger.warning("pg_trgm non créée (%s) : index trigramme de recherche ignorés", exc)
+            return False
+    return True
+
+
+def create_search_indexes(apps, schema_editor):
+    # Les autres bases (SQLite en développement) utilisent la recherche sans index
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    statements = TSVECTOR_SQL
+    if ensure_trigram(schema_editor.connection):
+        statements = TRIGRAM_SQL + TSVECTOR_SQL
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('orders', '0011_purchaseorder_number_prefix_idx'),
+        ('suppliers', '0003_banque_alter_supplier_banque_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,63 @@
+# Table de staging des imports par COPY (PostgreSQL uniquement, voir orders/staging.py)
+#
+# Créée ici plutôt qu'au premier import : des imports concurrents ne se
+# disputent pas sa création, et les transactions des lots ne prennent pas de
+# verrous DDL. Les colonnes doivent correspondre à STAGING_COLUMNS.
+
+from django.db import migrations
+
+STAGING_TABLE = "orders_purchaseorderline_staging"
+
+TEXT_FIELDS = (
+    "business_id",
+    "purchasing_document",
+    "item",
+    "fingerprint",
+    "release_indicator",
+    "document_date",
+    "purchasing_group",
+    "release_date",
+    "created_by",
+    "material",
+    "short_text",
+    "order_unit",
+    "currency",
+)
+DECIMAL_FIELDS = (
+    "net_order_value",
+    "order_quantity",
+    "net_price",
+    "received_quantity",
+    "still_to_be_delivered_qty",
+)
+
+
+def create_staging_table(apps, schema_editor):
+    # Les autres bases (SQLite en développement) importent par l'ORM
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    text_columns = ", ".join(f"{field} text" for field in TEXT_FIELDS)
+    decimal_columns = ", ".join(f"{field} numeric(20, 2)" for field in DECIMAL_FIELDS)
+    schema_editor.execute(
+        f"CREATE UNLOGGED TABLE IF NOT EXISTS {STAGING_TABLE} ("
+        f"session_key varchar(32) NOT NULL, position integer NOT NULL, supplier_id bigint, "
+        f"{text_columns}, {decimal_columns})"
+    )
+    schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {STAGING_TABLE}_session ON {STAGING_TABLE} (session_key)")
+
+
+def drop_staging_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_staging_table, drop_staging_table),
+    ]
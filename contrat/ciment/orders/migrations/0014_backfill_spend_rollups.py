@@ -0,0 +1,60 @@
+# Remplit SpendRollup à partir des lignes existantes : sans cela, la table
+# reste vide après le déploiement jusqu'au premier `rebuild_spend_rollups`.
+# Mêmes règles que orders.rollups.rebuild_spend_rollups, avec les modèles historiques.
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+BATCH_SIZE = 1000
+
+
+def _sum(expression):
+    return Coalesce(Sum(expression, output_field=AMOUNT_FIELD), Value(Decimal("0")), output_field=AMOUNT_FIELD)
+
+
+def backfill_spend_rollups(apps, schema_editor):
+    PurchaseOrderLine = apps.get_model("orders", "PurchaseOrderLine")
+    SpendRollup = apps.get_model("orders", "SpendRollup")
+
+    rows = (
+        PurchaseOrderLine.objects.order_by()
+        .values("purchase_order__supplier", "purchase_order__purchasing_group", "material", "currency")
+        .annotate(
+            lines_count=Count("pk"),
+            ordered_amount=_sum(F("net_order_value")),
+            received_amount=_sum(F("received_quantity") * F("net_price")),
+            remaining_amount=_sum(F("still_to_be_delivered_qty") * F("net_price")),
+        )
+    )
+    SpendRollup.objects.all().delete()
+    batch = []
+    for row in rows.iterator():
+        batch.append(SpendRollup(
+            supplier_id=row["purchase_order__supplier"],
+            purchasing_group=row["purchase_order__purchasing_group"],
+            material=row["material"],
+            currency=row["currency"],
+            lines_count=row["lines_count"],
+            ordered_amount=row["ordered_amount"],
+            received_amount=row["received_amount"],
+            remaining_amount=row["remaining_amount"],
+        ))
+        if len(batch) >= BATCH_SIZE:
+            SpendRollup.objects.bulk_create(batch)
+            batch = []
+    SpendRollup.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_purchaseorderline_staging'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_spend_rollups, migrations.RunPython.noop),
+    ]
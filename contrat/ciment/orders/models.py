@@ -2,11 +2,132 @@ from decimal import Decimal
 
 from django.conf import settings
 from django.db import models
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Round, TruncWeek
+from django.db.models.lookups import GreaterThan
 from django.utils import timezone
 
 from suppliers.models import Supplier
 
 
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+
+
+def _line_sum(expression):
+    """Sous-requête : somme d'une expression sur les lignes du PO courant (0 si aucune)."""
+    from_lines = (
+        PurchaseOrderLine.objects.filter(purchase_order=OuterRef("pk"))
+        .order_by()
+        .values("purchase_order")
+        .annotate(amount=Sum(expression, output_field=AMOUNT_FIELD))
+        .values("amount")
+    )
+    return Coalesce(Subquery(from_lines, output_field=AMOUNT_FIELD), Value(Decimal("0")), output_field=AMOUNT_FIELD)
+
+
+def _currency_values():
+    """Expressions de mise à jour de la devise dénormalisée du PO courant.
+
+    La devise est celle de la première ligne (ordre purchasing_document, item)
+    renseignée ; ``is_multi_currency`` signale un PO dont les lignes mélangent
+    plusieurs devises.
+    """
+    with_currency = (
+        PurchaseOrderLine.objects.filter(purchase_order=OuterRef("pk"))
+        .exclude(currency__isnull=True)
+        .exclude(currency__exact="")
+    )
+    first_currency = with_currency.order_by("purchasing_document", "item").values("currency")[:1]
+    currencies_count = (
+        with_currency.order_by()
+        .values("purchase_order")
+        .annotate(count=Count("currency", distinct=True))
+        .values("count")
+    )
+    return {
+        "currency": Subquery(first_currency, output_field=models.CharField()),
+        "is_multi_currency": Case(
+            When(GreaterThan(Coalesce(Subquery(currencies_count), Value(0)), Value(1)), then=Value(True)),
+            default=Value(False),
+            output_field=models.BooleanField(),
+        ),
+    }
+
+
+def _progress_rate(total, received):
+    return Case(
+        When(
+            GreaterThan(total, Value(Decimal("0"))),
+            # 100.0 (flottant) : évite la division entière de SQLite, arrondi à 2 décimales ensuite
+            then=Round(ExpressionWrapper(received * Value(100.0) / total, output_field=FloatField()), 2),
+        ),
+        default=Value(Decimal("0")),
+        output_field=DecimalField(max_digits=5, decimal_places=2),
+    )
+
+
+def _amount_values():
+    """Expressions des montants du PO courant calculés depuis ses lignes.
+
+    Mêmes règles que ``PurchaseOrder._compute_amounts`` : une ligne sans
+    quantité ou sans prix ne compte pas dans les montants reçu / restant.
+    """
+    total = _line_sum(F("net_order_value"))
+    received = _line_sum(F("received_quantity") * F("net_price"))
+    return {
+        "_total_amount": total,
+        "_received_amount": received,
+        "_remaining_amount": _line_sum(F("still_to_be_delivered_qty") * F("net_price")),
+        "_progress_rate": _progress_rate(total, received),
+    }
+
+
+class PurchaseOrderQuerySet(models.QuerySet):
+    def refresh_amounts(self):
+        """Recalcule les montants et la devise en cache des PO du queryset en un seul UPDATE."""
+        return self.update(updated_at=timezone.now(), **_amount_values(), **_currency_values())
+
+    def with_amounts(self):
+        """Annote ``total_amount``, ``received_amount``, ``remaining_amount`` et ``progress_rate``.
+
+        Valeurs en cache du PO, sinon calculées depuis ses lignes dans la même
+        requête : l'affichage d'une liste ne déclenche aucune requête par PO
+        (contrairement aux ``get_*`` sur un PO jamais recalculé).
+        """
+        annotations = {}
+        for field, expression in _amount_values().items():
+            annotations[field.lstrip("_")] = Coalesce(F(field), expression, output_field=expression.output_field)
+        return self.annotate(**annotations)
+
+    def refresh_currency(self):
+        """Recalcule uniquement la devise dénormalisée des PO du queryset (un UPDATE)."""
+        return self.update(**_currency_values())
+
+    def in_pk_batches(self, batch_size):
+        """Découpe le queryset en sous-querysets par plages de clés primaires."""
+        last_pk = 0
+        while True:
+            pks = list(
+                self.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                return
+            yield self.filter(pk__gte=pks[0], pk__lte=pks[-1])
+            last_pk = pks[-1]
+
+
 class PurchaseOrder(models.Model):
     number = models.CharField(
         max_length=100,
@@ -55,6 +176,18 @@ class PurchaseOrder(models.Model):
         verbose_name="Created By",
     )
 
+    # Devise dénormalisée depuis les lignes (voir PurchaseOrderQuerySet.refresh_amounts)
+    currency = models.CharField(
+        max_length=10,
+        null=True,
+        blank=True,
+        verbose_name="Devise",
+    )
+    is_multi_currency = models.BooleanField(
+        default=False,
+        verbose_name="Multi-devises",
+    )
+
     _total_amount = models.DecimalField(
         max_digits=20,
         decimal_places=2,
@@ -92,10 +225,16 @@ class PurchaseOrder(models.Model):
         auto_now=True,
     )
 
+    objects = PurchaseOrderQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Bon de commande"
         verbose_name_plural = "Bons de commande"
         ordering = ["number"]
+        indexes = [
+            # Recherche par préfixe (LIKE 'xxx%') sur PostgreSQL, quelle que soit la collation
+            models.Index(fields=["number"], name="orders_po_number_prefix_idx", opclasses=["varchar_pattern_ops"]),
+        ]
 
     def __str__(self):
         return str(self.number)
@@ -104,11 +243,14 @@ class PurchaseOrder(models.Model):
         total_amount = Decimal("0")
         received_amount = Decimal("0")
         remaining_amount = Decimal("0")
+        currencies = []
 
         for line in self.lines.all():
             total_amount += line.get_line_total_amount()
             received_amount += line.get_line_received_amount()
             remaining_amount += line.get_line_remaining_amount()
+            if line.currency and line.currency not in currencies:
+                currencies.append(line.currency)
 
         if total_amount > 0:
             progress_rate = (received_amount / total_amount) * Decimal("100")
@@ -119,6 +261,8 @@ class PurchaseOrder(models.Model):
         self._received_amount = received_amount
         self._remaining_amount = remaining_amount
         self._progress_rate = progress_rate
+        self.currency = currencies[0] if currencies else None
+        self.is_multi_currency = len(currencies) > 1
 
     def update_amounts(self, save=True):
         self._compute_amounts()
@@ -129,6 +273,8 @@ class PurchaseOrder(models.Model):
                     "_received_amount",
                     "_remaining_amount",
                     "_progress_rate",
+                    "currency",
+                    "is_multi_currency",
                     "updated_at",
                 ]
             )
@@ -156,17 +302,10 @@ class PurchaseOrder(models.Model):
     def get_currency(self):
         """Retourne la devise du bon de commande.
 
-        On prend la devise de la première ligne non nulle/non vide.
-        La requête est filtrée côté base, donc même avec beaucoup de lignes,
-        on ne charge qu'un seul enregistrement.
+        C'est la devise de la première ligne non nulle/non vide, dénormalisée
+        sur le PO à l'import et à chaque modification de ligne : aucune requête.
         """
-        first_line = (
-            self.lines.exclude(currency__isnull=True)
-            .exclude(currency__exact="")
-            .only("currency")
-            .first()
-        )
-        return first_line.currency if first_line else None
+        return self.currency
 
 
 class PurchaseOrderLine(models.Model):
@@ -254,6 +393,15 @@ class PurchaseOrderLine(models.Model):
         verbose_name="Still to be delivered (qty)",
     )
 
+    # Empreinte des valeurs importées : une ligne identique au dernier import n'est pas réécrite
+    fingerprint = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Empreinte d'import",
+    )
+
     class Meta:
         verbose_name = "Ligne de bon de commande"
         verbose_name_plural = "Lignes de bon de commande"
@@ -262,6 +410,22 @@ class PurchaseOrderLine(models.Model):
     def __str__(self):
         return f"{self.purchasing_document} / {self.item}"
 
+    def save(self, *args, **kwargs):
+        # Une modification hors import invalide l'empreinte : le prochain import réécrira la ligne
+        self.fingerprint = None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "fingerprint" not in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["fingerprint"]
+        super().save(*args, **kwargs)
+        # Garder les montants et la devise du PO à jour
+        PurchaseOrder.objects.filter(pk=self.purchase_order_id).refresh_amounts()
+
+    def delete(self, *args, **kwargs):
+        purchase_order_id = self.purchase_order_id
+        result = super().delete(*args, **kwargs)
+        PurchaseOrder.objects.filter(pk=purchase_order_id).refresh_amounts()
+        return result
+
     @classmethod
     def generate_business_id(cls, purchasing_document, item):
         doc = (str(purchasing_document) or "").strip()
@@ -319,6 +483,78 @@ class ImportedFile(models.Model):
         verbose_name="Nombre de lignes",
     )
 
+    # Cycle de vie de l'import exécuté en arrière-plan (voir orders.jobs)
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "En attente"),
+        (STATUS_RUNNING, "En cours"),
+        (STATUS_DONE, "Terminé"),
+        (STATUS_FAILED, "Échec"),
+    ]
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED,
+        editable=False,
+        db_index=True,
+        verbose_name="Statut",
+    )
+    errors_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Lignes ignorées",
+    )
+    pos_created = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name="PO créés",
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Début de l'import",
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Fin de l'import",
+    )
+    error_message = models.TextField(
+        blank=True,
+        default="",
+        editable=False,
+        verbose_name="Erreur",
+    )
+    # Empreinte SHA-256 du contenu : un fichier identique déjà importé n'est pas retraité
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        editable=False,
+        db_index=True,
+        verbose_name="Empreinte du contenu",
+    )
+    # Point de reprise : lignes du fichier dont le lot est validé en base
+    rows_committed = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Lignes du fichier validées",
+    )
+    duplicate_of = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="duplicates",
+        verbose_name="Identique à",
+    )
+
     class Meta:
         verbose_name = "Fichier importé"
         verbose_name_plural = "Fichiers importés"
@@ -327,6 +563,249 @@ class ImportedFile(models.Model):
     def __str__(self):
         return f"{self.file.name} ({self.imported_at:%Y-%m-%d %H:%M})"
 
+    def get_duration(self):
+        """Durée de l'import en secondes (en cours : depuis le début)."""
+        if self.started_at is None:
+            return None
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    def progress_data(self):
+        return {
+            "status": self.status,
+            "status_label": self.get_status_display(),
+            "rows_count": self.rows_count,
+            "errors_count": self.errors_count,
+            "pos_created": self.pos_created,
+            "rows_committed": self.rows_committed,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "duration": self.get_duration(),
+            "error_message": self.error_message,
+            "duplicate_of": self.duplicate_of_id,
+        }
+
+
+class PurchaseOrderLineSnapshotQuerySet(models.QuerySet):
+    def for_purchase_order(self, number):
+        """Historique d'un PO (par numéro), dans l'ordre chronologique."""
+        return self.filter(purchase_order__number=number).order_by("recorded_at", "business_id")
+
+    def delivery_progress(self):
+        """Quantité reçue par import et cumulée, dans l'ordre chronologique.
+
+        Une entrée par date d'enregistrement (un import = une date, voir
+        ``PurchaseOrderBulkWriter``) : ``received`` est la quantité reçue
+        depuis l'import précédent, ``cumulative`` le total reçu à cette date.
+        """
+        rows = (
+            self.order_by()
+            .values("recorded_at")
+            .annotate(received=Sum("received_delta"))
+            .order_by("recorded_at")
+        )
+        cumulative = Decimal("0")
+        progress = []
+        for row in rows:
+            cumulative += row["received"] or Decimal("0")
+            progress.append({"recorded_at": row["recorded_at"], "received": row["received"], "cumulative": cumulative})
+        return progress
+
+    def received_per_supplier_week(self):
+        """Quantité reçue par fournisseur et par semaine (début de semaine)."""
+        return (
+            self.order_by()
+            .annotate(week=TruncWeek("recorded_at"))
+            .values("supplier", "week")
+            .annotate(received=Sum("received_delta"))
+            .order_by("supplier", "week")
+        )
+
+
+class PurchaseOrderLineSnapshot(models.Model):
+    """Historique des quantités d'une ligne de PO, une entrée par import qui les modifie.
+
+    Table en ajout seul, alimentée par les writers d'import : une ligne dont
+    les quantités n'ont pas changé n'est pas dupliquée. ``received_delta``
+    (quantité reçue depuis l'entrée précédente) permet de sommer les
+    réceptions sur une période sans fenêtre SQL ; le fournisseur est recopié
+    depuis le PO pour les agrégats par fournisseur.
+    """
+
+    business_id = models.CharField(
+        max_length=255,
+        verbose_name="ID métier (PO + Item)",
+    )
+    purchase_order = models.ForeignKey(
+        PurchaseOrder,
+        on_delete=models.CASCADE,
+        related_name="line_snapshots",
+        verbose_name="Bon de commande",
+    )
+    supplier = models.ForeignKey(
+        Supplier,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="po_line_snapshots",
+        verbose_name="Fournisseur",
+    )
+    imported_file = models.ForeignKey(
+        ImportedFile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="line_snapshots",
+        verbose_name="Fichier importé",
+    )
+    recorded_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Date",
+    )
+    received_quantity = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Received Quantity",
+    )
+    still_to_be_delivered_qty = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Still to be delivered (qty)",
+    )
+    received_delta = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=Decimal("0"),
+        verbose_name="Quantité reçue depuis l'entrée précédente",
+    )
+
+    objects = PurchaseOrderLineSnapshotQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Historique de ligne de PO"
+        verbose_name_plural = "Historique des lignes de PO"
+        ordering = ["business_id", "recorded_at"]
+        indexes = [
+            models.Index(fields=["business_id", "recorded_at"], name="orders_snap_line_idx"),
+            models.Index(fields=["purchase_order", "recorded_at"], name="orders_snap_po_idx"),
+            models.Index(fields=["supplier", "recorded_at"], name="orders_snap_supplier_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.business_id} ({self.recorded_at:%Y-%m-%d %H:%M})"
+
+
+class SpendRollupQuerySet(models.QuerySet):
+    # Axes de regroupement proposés aux tableaux de bord
+    DIMENSIONS = {
+        "supplier": "supplier__nom_complet_organisation",
+        "purchasing_group": "purchasing_group",
+        "material": "material",
+        "currency": "currency",
+    }
 
+    def summary(self, by="supplier"):
+        """Totaux par axe (``DIMENSIONS``) et par devise, montant commandé décroissant.
 
-# Create your models here.
+        Les montants ne sont jamais additionnés entre devises : chaque ligne du
+        résultat porte ``label``, ``currency`` et les totaux.
+        """
+        label = self.DIMENSIONS[by]
+        # Deux fournisseurs homonymes restent distincts
+        keys = ["supplier"] if by == "supplier" else []
+        return (
+            self.order_by()
+            .values(*keys, label, "currency")
+            .annotate(
+                label=F(label),
+                lines_count=Sum("lines_count"),
+                ordered_amount=Sum("ordered_amount"),
+                received_amount=Sum("received_amount"),
+                remaining_amount=Sum("remaining_amount"),
+            )
+            .values("label", "currency", "lines_count", "ordered_amount", "received_amount", "remaining_amount")
+            .order_by("-ordered_amount", "label")
+        )
+
+
+class SpendRollup(models.Model):
+    """Totaux commandé / reçu / restant par fournisseur, groupe d'achat, article et devise.
+
+    Table dérivée de ``PurchaseOrderLine`` (fournisseur et groupe d'achat pris
+    sur le PO), tenue à jour par l'import pour les seules clés touchées et
+    reconstruite par la commande ``rebuild_spend_rollups`` (voir
+    ``orders.rollups``). Les tableaux de bord de dépenses la lisent au lieu
+    d'agréger toutes les lignes.
+    """
+
+    supplier = models.ForeignKey(
+        Supplier,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="spend_rollups",
+        verbose_name="Fournisseur",
+    )
+    purchasing_group = models.CharField(
+        max_length=50,
+        null=True,
+        blank=True,
+        verbose_name="Purchasing Group",
+    )
+    material = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        verbose_name="Material",
+    )
+    currency = models.CharField(
+        max_length=10,
+        null=True,
+        blank=True,
+        verbose_name="Currency",
+    )
+
+    lines_count = models.IntegerField(
+        default=0,
+        verbose_name="Nombre de lignes",
+    )
+    ordered_amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=Decimal("0"),
+        verbose_name="Montant commandé",
+    )
+    received_amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=Decimal("0"),
+        verbose_name="Montant reçu",
+    )
+    remaining_amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=Decimal("0"),
+        verbose_name="Montant restant",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
+
+    objects = SpendRollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Cumul de dépenses"
+        verbose_name_plural = "Cumuls de dépenses"
+        ordering = ["supplier", "purchasing_group", "material", "currency"]
+        indexes = [
+            models.Index(fields=["supplier", "currency"], name="orders_spend_supplier_idx"),
+            models.Index(fields=["purchasing_group", "currency"], name="orders_spend_group_idx"),
+            models.Index(fields=["material", "currency"], name="orders_spend_material_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.supplier_id} / {self.purchasing_group} / {self.material} / {self.currency}"
@@ -0,0 +1,90 @@
+"""Pagination par clé (keyset / seek) pour les grandes listes.
+
+Au lieu de ``OFFSET`` + ``COUNT(*)`` (coût proportionnel à la table), chaque
+page est lue à partir de la dernière clé affichée (``WHERE number > %s ORDER
+BY number LIMIT n``) : le coût d'une page reste constant grâce à l'index sur la
+clé. Le total affiché est une estimation (``estimate_count``).
+"""
+
+from typing import Any, List, Optional, Tuple
+
+from django.db import connection
+
+PAGE_SIZE = 20
+# Au-delà, le total filtré est affiché « plus de ... » sans être compté
+COUNT_LIMIT = 1000
+
+# Nature du total renvoyé par estimate_count
+COUNT_EXACT = "exact"
+COUNT_ESTIMATED = "estimated"
+COUNT_AT_LEAST = "at_least"
+
+
+class KeysetPage:
+    """Une page de résultats et les clés des pages voisines (None si absentes)."""
+
+    def __init__(self, object_list: List[Any], previous_key: Optional[str], next_key: Optional[str]):
+        self.object_list = object_list
+        self.previous_key = previous_key
+        self.next_key = next_key
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_key is not None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_key is not None
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_previous or self.has_next
+
+
+def keyset_page(
+    queryset,
+    key: str = "number",
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    size: int = PAGE_SIZE,
+) -> KeysetPage:
+    """Page de ``size`` éléments triés sur ``key`` (unique), après ``after`` ou avant ``before``."""
+    if before is not None:
+        rows = list(queryset.filter(**{f"{key}__lt": before}).order_by(f"-{key}")[: size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size][::-1]
+        if not rows:
+            return keyset_page(queryset, key, size=size)
+        return KeysetPage(rows, getattr(rows[0], key) if has_more else None, getattr(rows[-1], key))
+
+    if after is not None:
+        queryset = queryset.filter(**{f"{key}__gt": after})
+    rows = list(queryset.order_by(key)[: size + 1])
+    has_more = len(rows) > size
+    rows = rows[:size]
+    previous_key = getattr(rows[0], key) if after is not None and rows else None
+    return KeysetPage(rows, previous_key, getattr(rows[-1], key) if has_more else None)
+
+
+def estimate_count(queryset, limit: int = COUNT_LIMIT) -> Tuple[int, str]:
+    """Nombre d'éléments du queryset et nature du nombre (``COUNT_*``).
+
+    Sans filtre sur PostgreSQL : statistique du planificateur (``reltuples``),
+    sans parcours de la table (``COUNT_ESTIMATED``). Sinon : comptage borné à
+    ``limit`` ; au-delà, ``(limit, COUNT_AT_LEAST)`` signifie « plus de ``limit`` ».
+    """
+    if not queryset.query.where and connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 : table jamais analysée
+        if row is not None and row[0] >= 0:
+            return int(row[0]), COUNT_ESTIMATED
+
+    count = queryset.order_by()[: limit + 1].count()
+    if count > limit:
+        return limit, COUNT_AT_LEAST
+    return count, COUNT_EXACT
@@ -0,0 +1,340 @@
+"""Lecture par morceaux des fichiers d'import (Excel / CSV).
+
+Le format est détecté une seule fois (``detect_format``) à partir des premiers
+octets du fichier et de son extension, puis le lecteur correspondant est pris
+dans ``READERS`` : pas de double lecture ni d'essai / échec d'un parseur.
+
+Chaque lecteur renvoie un itérateur de DataFrames d'au plus ``chunk_size``
+lignes, avec les mêmes colonnes, afin que la mémoire reste constante quelle
+que soit la taille du fichier. ``select_columns`` reçoit les en-têtes du
+fichier et renvoie ceux à conserver : les autres colonnes ne sont pas
+converties.
+
+L'index de chaque DataFrame est le numéro de ligne dans le fichier (l'en-tête
+étant la ligne 1), pour que les messages pointent sur la ligne à corriger. Les
+lignes vides dans les colonnes lues sont ignorées, quel que soit le format.
+"""
+
+import csv
+import io
+import zipfile
+from os.path import splitext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# Taille par défaut des morceaux lus depuis le fichier
+READ_CHUNK_SIZE = 5000
+
+# Reçoit les en-têtes (uniques) du fichier, renvoie ceux à lire
+ColumnSelector = Callable[[List[str]], Sequence[str]]
+
+# Format attendu d'après l'extension (les premiers octets du fichier priment)
+EXTENSION_FORMATS: Dict[str, str] = {
+    "xlsx": "xlsx",
+    "xlsm": "xlsx",
+    "xls": "xls",
+    "xlsb": "xlsb",
+    "csv": "csv",
+    "tsv": "csv",
+    "txt": "csv",
+}
+# Extensions de classeurs zip : un contenu texte est forcément un fichier invalide
+ZIP_EXTENSIONS = {"xlsx", "xlsm", "xlsb"}
+
+ZIP_MAGIC = b"PK\x03\x04"
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+# Détection CSV / TSV sur le début du fichier
+CSV_SNIFF_BYTES = 64 * 1024
+CSV_SNIFF_LINES = 20
+CSV_DELIMITERS = ",;\t|"
+
+
+def file_extension(uploaded_file) -> str:
+    """Extension (sans le point, en minuscules) du fichier uploadé."""
+    _, ext = splitext(getattr(uploaded_file, "name", "") or "")
+    return ext.lstrip(".").lower()
+
+
+def make_unique_headers(headers: Sequence[Any]) -> List[str]:
+    """Nomme les colonnes comme pandas : 'Unnamed: i' et suffixes '.1', '.2'..."""
+    result: List[str] = []
+    seen = {}
+    for index, header in enumerate(headers):
+        name = f"Unnamed: {index}" if header is None or str(header).strip() == "" else str(header)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        result.append(name)
+    return result
+
+
+def select_headers(
+    headers: Sequence[Any], select_columns: Optional[ColumnSelector] = None
+) -> Tuple[List[int], List[str]]:
+    """Positions et noms des colonnes à lire (toutes si aucune n'est retenue)."""
+    names = make_unique_headers(headers)
+    if select_columns is not None:
+        wanted = set(select_columns(names))
+        indices = [index for index, name in enumerate(names) if name in wanted]
+        if indices:
+            return indices, [names[index] for index in indices]
+    return list(range(len(names))), names
+
+
+def _read_head(uploaded_file, size: int) -> bytes:
+    uploaded_file.seek(0)
+    head = uploaded_file.read(size)
+    uploaded_file.seek(0)
+    return head
+
+
+def detect_format(uploaded_file, extension: Optional[str] = None) -> str:
+    """Format du fichier (clé de ``READERS``) d'après ses premiers octets et son extension.
+
+    - zip : xlsx / xlsm, ou xlsb si le classeur est binaire (``xl/workbook.bin``)
+    - OLE2 : xls
+    - texte : CSV / TSV, y compris les exports SAP « .xls » au format texte
+    """
+    ext = (extension or file_extension(uploaded_file)).lstrip(".").lower()
+    head = _read_head(uploaded_file, len(OLE2_MAGIC))
+
+    if head.startswith(ZIP_MAGIC):
+        try:
+            names = zipfile.ZipFile(uploaded_file).namelist()
+        finally:
+            uploaded_file.seek(0)
+        return "xlsb" if "xl/workbook.bin" in names else "xlsx"
+    if head.startswith(OLE2_MAGIC):
+        return "xls"
+    if ext in ZIP_EXTENSIONS:
+        raise ValueError(f"Le fichier .{ext} n'est pas un classeur Excel valide")
+    if not head:
+        return EXTENSION_FORMATS.get(ext, "csv")
+    return "csv"
+
+
+def iter_row_chunks(
+    rows: Iterable[Tuple[int, Sequence[Any]]],
+    chunk_size: int = READ_CHUNK_SIZE,
+    select_columns: Optional[ColumnSelector] = None,
+) -> Iterator[pd.DataFrame]:
+    """Découpe des lignes ``(numéro de ligne, valeurs)``, la première étant l'en-tête, en DataFrames."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    indices, names = select_headers(first[1], select_columns)
+
+    numbers, buffer = [], []
+    for number, values in rows:
+        width = len(values)
+        selected = tuple(values[index] if index < width else None for index in indices)
+        # Ignorer les lignes vides (dans les colonnes lues)
+        if all(value is None for value in selected):
+            continue
+        numbers.append(number)
+        buffer.append(selected)
+        if len(buffer) >= chunk_size:
+            yield pd.DataFrame.from_records(buffer, columns=names, index=numbers)
+            numbers, buffer = [], []
+    if buffer:
+        yield pd.DataFrame.from_records(buffer, columns=names, index=numbers)
+
+
+def iter_xlsx_chunks(
+    uploaded_file,
+    chunk_size: int = READ_CHUNK_SIZE,
+    select_columns: Optional[ColumnSelector] = None,
+    sheet: int = 0,
+) -> Iterator[pd.DataFrame]:
+    """Lit une feuille (la première par défaut) d'un xlsx / xlsm en mode ``read_only`` (openpyxl)."""
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        # En lecture seule, openpyxl renvoie aussi les lignes vides : la position est le numéro de ligne
+        rows = enumerate(workbook.worksheets[sheet].iter_rows(values_only=True), start=1)
+        yield from iter_row_chunks(rows, chunk_size, select_columns)
+    finally:
+        workbook.close()
+
+
+def _whole_number(value: Any) -> Any:
+    # Comme pandas : 10.0 -> 10 (sinon l'item "10" deviendrait "10.0")
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def iter_xls_chunks(
+    uploaded_file,
+    chunk_size: int = READ_CHUNK_SIZE,
+    select_columns: Optional[ColumnSelector] = None,
+    sheet: int = 0,
+) -> Iterator[pd.DataFrame]:
+    """Lit une feuille d'un xls (xlrd), dates converties comme ``pd.read_excel``."""
+    import xlrd
+
+    book = xlrd.open_workbook(file_contents=uploaded_file.read(), on_demand=True)
+    try:
+        worksheet = book.sheet_by_index(sheet)
+
+        def values(row):
+            for cell in row:
+                if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    yield None
+                elif cell.ctype == xlrd.XL_CELL_DATE:
+                    yield xlrd.xldate.xldate_as_datetime(cell.value, book.datemode)
+                elif cell.ctype == xlrd.XL_CELL_NUMBER:
+                    yield _whole_number(cell.value)
+                else:
+                    yield cell.value
+
+        rows = ((index + 1, tuple(values(worksheet.row(index)))) for index in range(worksheet.nrows))
+        yield from iter_row_chunks(rows, chunk_size, select_columns)
+    finally:
+        book.release_resources()
+
+
+def iter_xlsb_chunks(
+    uploaded_file,
+    chunk_size: int = READ_CHUNK_SIZE,
+    select_columns: Optional[ColumnSelector] = None,
+    sheet: int = 0,
+) -> Iterator[pd.DataFrame]:
+    """Lit une feuille d'un xlsb ligne à ligne (pyxlsb)."""
+    from pyxlsb import open_workbook
+
+    with open_workbook(uploaded_file) as workbook:
+        # pyxlsb numérote les feuilles à partir de 1
+        with workbook.get_sheet(sheet + 1) as worksheet:
+            # sparse : lignes vides absentes, le numéro vient des cellules (``r`` à partir de 0)
+            rows = (
+                (row[0].r + 1, tuple(_whole_number(cell.v) for cell in row))
+                for row in worksheet.rows(sparse=True) if row
+            )
+            yield from iter_row_chunks(rows, chunk_size, select_columns)
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Encodage d'un export texte : BOM, sinon UTF-8, sinon Windows-1252."""
+    if sample.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return "utf-16"
+    if sample.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # Caractère coupé en fin d'échantillon : le fichier reste en UTF-8
+        if exc.start < len(sample) - 3:
+            return "cp1252"
+    return "utf-8"
+
+
+def sniff_delimiter(lines: Sequence[str]) -> str:
+    """Séparateur d'un CSV / TSV d'après ses premières lignes."""
+    try:
+        return csv.Sniffer().sniff("\n".join(lines), delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        # Par défaut : le séparateur le plus fréquent de la ligne d'en-tête
+        header = lines[0] if lines else ""
+        return max(CSV_DELIMITERS, key=header.count)
+
+
+def iter_csv_chunks(
+    uploaded_file,
+    chunk_size: int = READ_CHUNK_SIZE,
+    select_columns: Optional[ColumnSelector] = None,
+    sheet: int = 0,
+) -> Iterator[pd.DataFrame]:
+    """Lit un CSV / TSV par morceaux avec le moteur C de pandas.
+
+    Encodage et séparateur sont détectés sur le début du fichier ; seules les
+    colonnes retenues sont lues, toutes en texte (nettoyées ensuite). Un CSV
+    n'a qu'une feuille : ``sheet`` est ignoré.
+
+    Les lignes vides sont lues puis retirées (comme ``,,``) pour que l'index
+    reste le numéro de ligne du fichier.
+    """
+    sample = _read_head(uploaded_file, CSV_SNIFF_BYTES)
+    encoding = detect_encoding(sample)
+    lines = sample.decode(encoding, errors="ignore").splitlines()[:CSV_SNIFF_LINES]
+    if not lines:
+        return
+    delimiter = sniff_delimiter(lines)
+
+    header = next(csv.reader(io.StringIO(lines[0]), delimiter=delimiter), [])
+    indices, names = select_headers(header, select_columns)
+
+    reader = pd.read_csv(
+        uploaded_file,
+        sep=delimiter,
+        encoding=encoding,
+        engine="c",
+        header=0,
+        usecols=indices,
+        names=names,
+        dtype={name: str for name in names},
+        chunksize=chunk_size,
+        skip_blank_lines=False,
+    )
+    with reader:
+        for chunk in reader:
+            # L'index de pandas compte les lignes de données à partir de 0
+            chunk.index += 2
+            chunk = chunk.dropna(how="all")
+            if len(chunk):
+                yield chunk
+
+
+# Format -> lecteur (voir detect_format)
+READERS: Dict[str, Callable[..., Iterator[pd.DataFrame]]] = {
+    "xlsx": iter_xlsx_chunks,
+    "xls": iter_xls_chunks,
+    "xlsb": iter_xlsb_chunks,
+    "csv": iter_csv_chunks,
+}
+
+
+def list_sheets(uploaded_file, extension: Optional[str] = None) -> List[str]:
+    """Noms des feuilles du fichier, dans l'ordre (un CSV a une seule feuille, sans nom)."""
+    fmt = detect_format(uploaded_file, extension)
+    try:
+        if fmt == "xlsx":
+            workbook = load_workbook(uploaded_file, read_only=True)
+            try:
+                return list(workbook.sheetnames)
+            finally:
+                workbook.close()
+        if fmt == "xls":
+            import xlrd
+
+            return xlrd.open_workbook(file_contents=uploaded_file.read(), on_demand=True).sheet_names()
+        if fmt == "xlsb":
+            from pyxlsb import open_workbook
+
+            with open_workbook(uploaded_file) as workbook:
+                return list(workbook.sheets)
+        return [""]
+    finally:
+        uploaded_file.seek(0)
+
+
+def iter_import_chunks(
+    uploaded_file,
+    chunk_size: int = READ_CHUNK_SIZE,
+    select_columns: Optional[ColumnSelector] = None,
+    extension: Optional[str] = None,
+    sheet: int = 0,
+) -> Iterator[pd.DataFrame]:
+    """Lit le fichier avec le lecteur de son format (voir ``detect_format``).
+
+    ``extension`` (par exemple ``ImportedFile.extension``) remplace celle du
+    nom de fichier quand elle est connue ; ``sheet`` est l'index de la feuille
+    à lire (voir ``list_sheets``).
+    """
+    reader = READERS[detect_format(uploaded_file, extension)]
+    yield from reader(uploaded_file, chunk_size, select_columns, sheet)
@@ -0,0 +1,141 @@
+"""Maintenance de la table ``SpendRollup`` (totaux de dépenses pré-calculés).
+
+Une clé de cumul est (fournisseur, groupe d'achat, article, devise). Après
+chaque lot importé, seules les clés touchées sont recalculées :
+
+- ``collect_spend_keys`` relève les clés présentes sur les lignes des PO du
+  lot, avant et après l'écriture (une ligne peut changer d'article ou de
+  devise, un PO recevoir son fournisseur)
+- ``refresh_spend_rollups`` recalcule exactement ces clés, par paquets de
+  ``KEY_BATCH_SIZE`` (une requête d'agrégat filtrée sur les clés du paquet),
+  puis remplace les cumuls correspondants
+
+``rebuild_spend_rollups`` recalcule la table entière (commande
+``rebuild_spend_rollups``), par exemple après des modifications hors import.
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import AMOUNT_FIELD, PurchaseOrderLine, SpendRollup
+
+# Dimension du cumul -> champ correspondant sur PurchaseOrderLine
+SPEND_DIMENSIONS: Dict[str, str] = {
+    "supplier": "purchase_order__supplier",
+    "purchasing_group": "purchase_order__purchasing_group",
+    "material": "material",
+    "currency": "currency",
+}
+
+# Clés de cumul : (fournisseur, groupe d'achat, article, devise), dans l'ordre de SPEND_DIMENSIONS
+SpendKeys = Set[Tuple[Any, ...]]
+
+ROLLUP_BATCH_SIZE = 1000
+# Clés recalculées par requête (taille du filtre OR)
+KEY_BATCH_SIZE = 200
+
+
+def _sum(expression):
+    return Coalesce(Sum(expression, output_field=AMOUNT_FIELD), Value(Decimal("0")), output_field=AMOUNT_FIELD)
+
+
+def _aggregate(lines):
+    """Cumuls des lignes groupés par clé (mêmes règles que ``refresh_amounts``)."""
+    return (
+        lines.order_by()
+        .values(*SPEND_DIMENSIONS.values())
+        .annotate(
+            lines_count=Count("pk"),
+            ordered_amount=_sum(F("net_order_value")),
+            received_amount=_sum(F("received_quantity") * F("net_price")),
+            remaining_amount=_sum(F("still_to_be_delivered_qty") * F("net_price")),
+        )
+    )
+
+
+def _rollups(rows) -> Iterator[SpendRollup]:
+    for row in rows:
+        yield SpendRollup(
+            **{dimension: row[field] for dimension, field in SPEND_DIMENSIONS.items() if dimension != "supplier"},
+            supplier_id=row["purchase_order__supplier"],
+            lines_count=row["lines_count"],
+            ordered_amount=row["ordered_amount"],
+            received_amount=row["received_amount"],
+            remaining_amount=row["remaining_amount"],
+        )
+
+
+def _keys_filter(fields: Iterable[str], keys: Iterable[Tuple[Any, ...]]) -> Q:
+    """Lignes ou cumuls de l'une des clés (une valeur absente est comparée par ``IS NULL``)."""
+    fields = list(fields)
+    condition = Q()
+    for key in keys:
+        key_condition = Q()
+        for field, value in zip(fields, key):
+            key_condition &= Q(**{f"{field}__isnull": True}) if value is None else Q(**{field: value})
+        condition |= key_condition
+    return condition
+
+
+def collect_spend_keys(
+    po_numbers: Iterable[str] = (), po_ids: Iterable[int] = (), keys: Optional[SpendKeys] = None
+) -> SpendKeys:
+    """Clés de cumul des lignes des PO donnés (ajoutées à ``keys``)."""
+    if keys is None:
+        keys = set()
+    po_numbers, po_ids = list(po_numbers), list(po_ids)
+    if not po_numbers and not po_ids:
+        return keys
+    lines = PurchaseOrderLine.objects.filter(
+        Q(purchase_order__number__in=po_numbers) | Q(purchase_order_id__in=po_ids)
+    )
+    keys.update(lines.order_by().values_list(*SPEND_DIMENSIONS.values()).distinct())
+    return keys
+
+
+def refresh_spend_rollups(keys: SpendKeys) -> int:
+    """Recalcule les cumuls des clés relevées ; retourne le nombre de cumuls écrits."""
+    keys = list(keys)
+    count = 0
+    with transaction.atomic():
+        for start in range(0, len(keys), KEY_BATCH_SIZE):
+            batch = keys[start:start + KEY_BATCH_SIZE]
+            lines = PurchaseOrderLine.objects.filter(_keys_filter(SPEND_DIMENSIONS.values(), batch))
+            rollups = list(_rollups(_aggregate(lines)))
+            SpendRollup.objects.filter(_keys_filter(SPEND_DIMENSIONS, batch)).delete()
+            SpendRollup.objects.bulk_create(rollups, batch_size=ROLLUP_BATCH_SIZE)
+            count += len(rollups)
+    return count
+
+
+def refresh_touched_spend_rollups(keys: SpendKeys, affected_po_ids: Iterable[int]) -> int:
+    """Après l'écriture d'un lot : ``keys`` relevées avant l'écriture, PO modifiés par le writer.
+
+    Aucun recalcul si le lot n'a modifié aucun PO.
+    """
+    affected_po_ids = list(affected_po_ids)
+    if not affected_po_ids:
+        return 0
+    return refresh_spend_rollups(collect_spend_keys(po_ids=affected_po_ids, keys=keys))
+
+
+def rebuild_spend_rollups() -> int:
+    """Recalcule toute la table ; retourne le nombre de cumuls."""
+    rollups = _rollups(_aggregate(PurchaseOrderLine.objects.all()).iterator())
+    count = 0
+    with transaction.atomic():
+        SpendRollup.objects.all().delete()
+        batch = []
+        for rollup in rollups:
+            batch.append(rollup)
+            if len(batch) >= ROLLUP_BATCH_SIZE:
+                SpendRollup.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        SpendRollup.objects.bulk_create(batch)
+        count += len(batch)
+    return count
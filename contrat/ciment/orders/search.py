@@ -0,0 +1,240 @@
+"""Recherche plein texte des bons de commande.
+
+Une recherche porte sur le numéro de PO, le fournisseur et les lignes
+(``business_id``, ``material``, ``short_text``). Les PO trouvés sont classés
+par score, avec les lignes correspondantes surlignées.
+
+Sur PostgreSQL, les lignes sont cherchées sur un document
+``business_id material short_text`` indexé deux fois (migration
+``0012_search_indexes``) :
+
+- index GIN trigramme (``pg_trgm``) : ``ILIKE '%terme%'``, utile pour les
+  fragments de codes article ou de business_id
+- index GIN ``tsvector`` (configuration ``simple``) : mots du texte court
+
+Les lignes trouvées sont classées (``ts_rank`` + ``word_similarity``) puis
+seules les ``SEARCH_CANDIDATES`` meilleures sont regroupées par PO, pour que
+le regroupement ne dépende pas du nombre de lignes qui contiennent un mot
+fréquent. Sans l'extension ``pg_trgm`` (non créée faute de droits, voir la
+migration), le score se limite à ``ts_rank``. Ailleurs (SQLite en
+développement et en test), la recherche se rabat sur des ``icontains`` et un
+score calculé en Python.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape, format_html
+from django.utils.safestring import SafeString, mark_safe
+
+from .models import PurchaseOrder, PurchaseOrderLine
+from suppliers.models import Supplier
+
+# Nombre de PO renvoyés
+SEARCH_LIMIT = 20
+# Lignes (ou PO d'un fournisseur) examinées au plus avant le classement
+SEARCH_CANDIDATES = 2000
+# Lignes surlignées affichées par PO
+LINES_PER_HIT = 3
+MIN_QUERY_LENGTH = 2
+
+# Poids des correspondances : numéro de PO (préfixe) > lignes > fournisseur.
+# Sur PostgreSQL, une ligne trouvée vaut LINE_SCORE plus sa pertinence
+# (ts_rank, similarité trigramme), le fournisseur SUPPLIER_SCORE plus sa similarité.
+NUMBER_SCORE = 2.0
+LINE_SCORE = 1.0
+SUPPLIER_SCORE = 0.5
+
+# Document indexé des lignes : doit rester identique à l'expression des index
+LINE_DOCUMENT_SQL = (
+    "(COALESCE({table}.business_id, '') || ' ' || COALESCE({table}.material, '')"
+    " || ' ' || COALESCE({table}.short_text, ''))"
+)
+
+
+class LineMatch(NamedTuple):
+    business_id: str
+    item: str
+    material: SafeString
+    short_text: SafeString
+
+
+class SearchHit(NamedTuple):
+    purchase_order: PurchaseOrder
+    score: float
+    supplier_name: SafeString
+    lines: List[LineMatch]
+
+
+def query_words(query: str) -> List[str]:
+    """Mots de la recherche, sans doublon (casse ignorée)."""
+    words: Dict[str, str] = {}
+    for word in query.split():
+        words.setdefault(word.lower(), word)
+    return list(words.values())
+
+
+def _words_pattern(words: Sequence[str]) -> Optional["re.Pattern"]:
+    if not words:
+        return None
+    # Les mots les plus longs d'abord : « ciment » avant « ci »
+    alternatives = sorted((re.escape(word) for word in words), key=len, reverse=True)
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+def highlight(text: Optional[str], words: Sequence[str]) -> SafeString:
+    """Texte échappé, occurrences des mots entourées de ``<mark>``."""
+    if not text:
+        return mark_safe("")
+    pattern = _words_pattern(words)
+    if pattern is None:
+        return escape(text)
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(escape(text[last:match.start()]))
+        parts.append(format_html("<mark>{}</mark>", match.group()))
+        last = match.end()
+    parts.append(escape(text[last:]))
+    return mark_safe("".join(parts))
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _has_trigram(cursor) -> bool:
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+    return cursor.fetchone()[0]
+
+
+def _postgresql_scores(query: str, limit: int, candidates: int) -> List[tuple]:
+    """(id de PO, score) des meilleurs PO, calculés en une requête sur les index GIN."""
+    line_table = PurchaseOrderLine._meta.db_table
+    po_table = PurchaseOrder._meta.db_table
+    supplier_table = Supplier._meta.db_table
+    document = LINE_DOCUMENT_SQL.format(table=line_table)
+    with connection.cursor() as cursor:
+        trigram = _has_trigram(cursor)
+        line_similarity = f"word_similarity(%(query)s, {document})" if trigram else "0"
+        supplier_similarity = "word_similarity(%(query)s, s.nom_complet_organisation)" if trigram else "0"
+        sql = f"""
+            WITH line_hits AS (
+                SELECT purchase_order_id,
+                       %(line_score)s + ts_rank(to_tsvector('simple', {document}), plainto_tsquery('simple', %(query)s))
+                       + {line_similarity} AS score
+                FROM {line_table}
+                WHERE {document} ILIKE %(pattern)s
+                   OR to_tsvector('simple', {document}) @@ plainto_tsquery('simple', %(query)s)
+                ORDER BY score DESC, purchase_order_id
+                LIMIT %(candidates)s
+            ),
+            po_scores AS (
+                SELECT purchase_order_id AS po_id, MAX(score) AS score
+                FROM line_hits
+                GROUP BY purchase_order_id
+                UNION ALL
+                (SELECT id, %(number_score)s FROM {po_table}
+                 WHERE number LIKE %(prefix)s
+                 ORDER BY number
+                 LIMIT %(candidates)s)
+                UNION ALL
+                (SELECT po.id, %(supplier_score)s + {supplier_similarity}
+                 FROM {po_table} po
+                 JOIN {supplier_table} s ON s.id = po.supplier_id
+                 WHERE s.nom_complet_organisation ILIKE %(pattern)s
+                 ORDER BY 2 DESC, po.id
+                 LIMIT %(candidates)s)
+            )
+            SELECT po_id, SUM(score) AS score
+            FROM po_scores
+            GROUP BY po_id
+            ORDER BY score DESC, po_id
+            LIMIT %(limit)s
+        """
+        params = {
+            "query": query,
+            "pattern": f"%{_like_escape(query)}%",
+            "prefix": f"{_like_escape(query)}%",
+            "candidates": candidates,
+            "limit": limit,
+            "number_score": NUMBER_SCORE,
+            "line_score": LINE_SCORE,
+            "supplier_score": SUPPLIER_SCORE,
+        }
+        cursor.execute(sql, params)
+        return [(po_id, float(score)) for po_id, score in cursor.fetchall()]
+
+
+def _line_filter(words: Sequence[str]) -> Q:
+    condition = Q()
+    for word in words:
+        condition |= Q(business_id__icontains=word) | Q(material__icontains=word) | Q(short_text__icontains=word)
+    return condition
+
+
+def _fallback_scores(query: str, words: Sequence[str], limit: int, candidates: int) -> List[tuple]:
+    """(id de PO, score) sans index de recherche : part des mots trouvés sur la meilleure ligne."""
+    pattern = _words_pattern(words)
+    scores: Dict[int, float] = {}
+    lines = (
+        PurchaseOrderLine.objects.filter(_line_filter(words))
+        .order_by()
+        .values_list("purchase_order_id", "business_id", "material", "short_text")[:candidates]
+    )
+    for po_id, *texts in lines:
+        document = " ".join(text for text in texts if text)
+        found = {match.group().lower() for match in pattern.finditer(document)}
+        scores[po_id] = max(scores.get(po_id, 0.0), len(found) / len(words))
+
+    for po_id in PurchaseOrder.objects.filter(number__startswith=query).values_list("pk", flat=True)[:candidates]:
+        scores[po_id] = scores.get(po_id, 0.0) + NUMBER_SCORE
+    suppliers = PurchaseOrder.objects.filter(supplier__nom_complet_organisation__icontains=query)
+    for po_id in suppliers.values_list("pk", flat=True)[:candidates]:
+        scores[po_id] = scores.get(po_id, 0.0) + SUPPLIER_SCORE
+
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def search_purchase_orders(
+    query: str, limit: int = SEARCH_LIMIT, candidates: int = SEARCH_CANDIDATES
+) -> List[SearchHit]:
+    """PO correspondant à ``query``, du meilleur score au moins bon."""
+    query = " ".join(query.split())
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    words = query_words(query)
+
+    if connection.vendor == "postgresql":
+        scores = _postgresql_scores(query, limit, candidates)
+    else:
+        scores = _fallback_scores(query, words, limit, candidates)
+    if not scores:
+        return []
+
+    po_ids = [po_id for po_id, _score in scores]
+    purchase_orders = PurchaseOrder.objects.select_related("supplier").with_amounts().in_bulk(po_ids)
+
+    # Lignes à surligner : seulement celles des PO renvoyés (index sur purchase_order_id)
+    matches: Dict[int, List[LineMatch]] = {po_id: [] for po_id in po_ids}
+    lines = (
+        PurchaseOrderLine.objects.filter(_line_filter(words), purchase_order_id__in=po_ids)
+        .order_by("purchase_order_id", "item")
+        .values_list("purchase_order_id", "business_id", "item", "material", "short_text")
+    )
+    for po_id, business_id, item, material, short_text in lines[:candidates]:
+        if len(matches[po_id]) < LINES_PER_HIT:
+            matches[po_id].append(
+                LineMatch(business_id, item, highlight(material, words), highlight(short_text, words))
+            )
+
+    hits = []
+    for po_id, score in scores:
+        po = purchase_orders.get(po_id)
+        if po is None:
+            continue
+        supplier_name = po.supplier.nom_complet_organisation if po.supplier_id else ""
+        hits.append(SearchHit(po, score, highlight(supplier_name, words), matches[po_id]))
+    return hits
@@ -1,12 +1,25 @@
+import hashlib
+import time
+from collections import defaultdict
+from contextlib import contextmanager
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
-from django.db import transaction
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
 
-from .models import PurchaseOrder, PurchaseOrderLine
-from suppliers.models import Supplier
+from .models import ImportedFile, PurchaseOrder, PurchaseOrderLine, PurchaseOrderLineSnapshot
+from .readers import iter_import_chunks
+from .rollups import collect_spend_keys, refresh_touched_spend_rollups
+from suppliers.services import NULL_TOKENS, SupplierResolver
+
+
+# Montants au-delà desquels l'arrondi en float64 n'est plus exact au centime
+VECTOR_ROUND_LIMIT = 1e13
 
 
 def round_decimal(value: Any, places: int = 2) -> Decimal:
@@ -23,6 +36,9 @@ def round_decimal(value: Any, places: int = 2) -> Decimal:
             value = Decimal(str(value))
         except (InvalidOperation, ValueError, TypeError):
             return Decimal("0")
+    # Cellules vides lues par pandas (NaN) ou valeurs infinies
+    if not value.is_finite():
+        return Decimal("0")
 
     if places <= 0:
         quant_format = Decimal("1")
@@ -54,12 +70,64 @@ def clean_text(value: Any) -> Optional[str]:
         return None
 
     lower = text.lower()
-    if lower in {"nan", "nat", "none", "null"}:
+    if lower in NULL_TOKENS:
         return None
 
     return text
 
 
+def clean_text_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """Version vectorisée de ``clean_text`` pour toutes les colonnes de ``frame``.
+
+    Les colonnes sont traitées ensemble : les valeurs sont factorisées (un
+    export répète beaucoup devise, unité, groupe d'achat, fournisseur...) et
+    seules les valeurs distinctes passent par les opérations de chaîne.
+    Retourne des colonnes ``object`` : texte nettoyé ou None.
+    """
+    # to_numpy(object) : les dates restent des Timestamp, str() comme clean_text
+    values = frame.to_numpy(dtype=object)
+    flat = values.ravel()
+    codes, uniques = pd.factorize(pd.Series(flat, dtype=object).astype(str))
+    text = pd.Series(uniques, dtype=object).str.strip()
+    text = text.where((text != "") & ~text.str.lower().isin(NULL_TOKENS), None)
+    cleaned = text.to_numpy(dtype=object)[codes]
+    # Valeurs manquantes pandas (None, NaN, NaT, NA)
+    cleaned[pd.isna(flat)] = None
+    return pd.DataFrame(
+        cleaned.reshape(values.shape), index=frame.index, columns=frame.columns, dtype=object
+    )
+
+
+def round_decimal_columns(frame: pd.DataFrame, places: int = 2) -> pd.DataFrame:
+    """Version vectorisée de ``round_decimal`` pour toutes les colonnes de ``frame``.
+
+    Conversion numérique (``pd.to_numeric``) et arrondi au plus proche, moitié
+    vers le haut comme ROUND_HALF_UP, faits en bloc par numpy ; les valeurs
+    vides ou invalides valent 0. Un seul Decimal est construit par valeur
+    distincte.
+
+    Le calcul en float64 n'est exact que pour les montants inférieurs à
+    ``VECTOR_ROUND_LIMIT`` en valeur absolue : les plus grands (jusqu'aux 18
+    chiffres du DecimalField) passent par ``round_decimal``.
+    """
+    shape = frame.shape
+    raw = frame.to_numpy(dtype=object).ravel()
+    values = pd.to_numeric(pd.Series(raw, dtype=object), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    finite = np.isfinite(values)
+    large = finite & (np.abs(values) >= VECTOR_ROUND_LIMIT)
+    values = np.where(finite & ~large, values, 0.0)
+    # L'arrondi intermédiaire à 1e-6 absorbe l'erreur binaire (2.675 * 100 = 267.4999...)
+    scaled = np.round(np.abs(values) * 10**places, 6)
+    units = (np.sign(values) * np.floor(scaled + 0.5)).astype(np.int64)
+    codes, uniques = pd.factorize(units)
+    decimals = np.array([Decimal(unit).scaleb(-places) for unit in uniques.tolist()], dtype=object)[codes]
+    for index in np.flatnonzero(large):
+        decimals[index] = round_decimal(raw[index], places)
+    return pd.DataFrame(
+        decimals.reshape(shape), index=frame.index, columns=frame.columns, dtype=object
+    )
+
+
 def normalize_header(header: str) -> str:
     """Normalise un nom de colonne en format canonique.
 
@@ -148,291 +216,693 @@ def normalize_keys(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return normalized_rows
 
 
-@transaction.atomic
-def import_purchase_orders_from_excel(uploaded_file, imported_file: Optional[object] = None) -> Dict[str, Any]:
-    """Importe un fichier Excel et alimente PurchaseOrder / PurchaseOrderLine.
-
-    - Lit le fichier avec pandas
-    - Normalise les clés
-    - Utilise business_id = Purchasing Document + Item
-    - Crée / met à jour les lignes et les PO
+# Colonnes attendues dans les exports SAP : champ canonique -> (candidats exacts, tokens)
+PO_IMPORT_COLUMNS: Dict[str, Tuple[Sequence[str], Sequence[str]]] = {
+    "purchasing_document": (["Purchasing Document", "PO Number", "Purchasing Doc"], ["purchasing", "document"]),
+    "item": (["Item", "Item Number", "Item No."], ["item"]),
+    "net_order_value": (["Net Order Value", "Net Value"], ["net", "value"]),
+    "order_quantity": (["Order Quantity", "Quantity", "Qty"], ["order", "quantity"]),
+    "net_price": (["Net Price", "Unit Price"], ["price"]),
+    "received_quantity": (["Received Quantity", "Received Qty"], ["received", "quantity"]),
+    "still_to_be_delivered_qty": (
+        ["Still to be delivered (qty)", "Still to be delivered qty", "Remaining Qty"],
+        ["still", "delivered"],
+    ),
+    "release_indicator": (["Release indicator"], ["release", "indicator"]),
+    "document_date": (["Document Date"], ["document", "date"]),
+    "purchasing_group": (["Purchasing Group"], ["purchasing", "group"]),
+    "release_date": (["Release Date"], ["release", "date"]),
+    "created_by": (["Created By"], ["created", "by"]),
+    "material": (["Material"], ["material"]),
+    "short_text": (["Short Text"], ["short", "text"]),
+    "order_unit": (["Order Unit"], ["order", "unit"]),
+    "currency": (["Currency"], ["currency"]),
+    "supplier_name": (["Name of Supplier", "Supplier", "Vendor"], ["supplier"]),
+}
+
+
+class ColumnMapping:
+    """Correspondance champ canonique -> colonne du fichier, résolue une seule fois.
+
+    Applique les mêmes règles que ``get_value_tolerant`` (candidats exacts puis
+    tokens) mais sur les en-têtes du fichier au lieu de chaque ligne.
+
+    - ``columns`` : champ -> nom de colonne original
+    - ``missing`` : champs sans colonne correspondante
+    - ``unmatched_columns`` : colonnes du fichier non utilisées
+    - ``ambiguous`` : champ -> colonnes candidates quand la recherche par tokens
+      en trouve plusieurs (la première est retenue)
     """
-    # 1) Lire le fichier avec pandas
-    try:
-        df = pd.read_excel(uploaded_file)
-    except Exception:
-        # Tentative de lecture CSV en fallback
-        uploaded_file.seek(0)
-        df = pd.read_csv(uploaded_file)
 
-    records = df.to_dict(orient="records")
-    records = normalize_keys(records)
+    def __init__(self, columns, missing, unmatched_columns, ambiguous):
+        self.columns: Dict[str, Any] = columns
+        self.missing: List[str] = missing
+        self.unmatched_columns: List[Any] = unmatched_columns
+        self.ambiguous: Dict[str, List[Any]] = ambiguous
 
-    lines_processed = 0
-    pos_created = 0
-    pos_updated = 0
-    errors: List[str] = []
+    def __contains__(self, field: str) -> bool:
+        return field in self.columns
 
-    affected_pos: Dict[str, PurchaseOrder] = {}
+    def __getitem__(self, field: str) -> Any:
+        return self.columns[field]
 
-    for row in records:
-        # Extraire les valeurs brutes avec recherche tolérante
-        purchasing_document = get_value_tolerant(
-            row,
-            exact_candidates=["Purchasing Document", "PO Number", "Purchasing Doc"],
-            tokens=["purchasing", "document"],
-        )
-        item = get_value_tolerant(
-            row,
-            exact_candidates=["Item", "Item Number", "Item No."],
-            tokens=["item"],
-        )
+    def get(self, field: str, default: Any = None) -> Any:
+        return self.columns.get(field, default)
 
-        if not purchasing_document or item in (None, ""):
-            # Ligne inutilisable pour notre logique : on loggue et on skip
-            errors.append("Ligne ignorée: Purchasing Document ou Item manquant")
-            continue
-
-        purchasing_document = str(purchasing_document).strip()
-        item_str = str(item).strip()
-
-        # Champs numériques
-        net_order_value_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Net Order Value", "Net Value"],
-            tokens=["net", "value"],
-        )
-        order_quantity_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Order Quantity", "Quantity", "Qty"],
-            tokens=["order", "quantity"],
-        )
-        net_price_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Net Price", "Unit Price"],
-            tokens=["price"],
-        )
-        received_quantity_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Received Quantity", "Received Qty"],
-            tokens=["received", "quantity"],
-        )
-        still_to_be_delivered_raw = get_value_tolerant(
-            row,
-            exact_candidates=[
-                "Still to be delivered (qty)",
-                "Still to be delivered qty",
-                "Remaining Qty",
-            ],
-            tokens=["still", "delivered"],
-        )
-
-        # Champs texte supplémentaires (en-tête et ligne)
-        release_indicator_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Release indicator"],
-            tokens=["release", "indicator"],
-        )
-        document_date_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Document Date"],
-            tokens=["document", "date"],
-        )
-        purchasing_group_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Purchasing Group"],
-            tokens=["purchasing", "group"],
-        )
-        release_date_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Release Date"],
-            tokens=["release", "date"],
-        )
-        created_by_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Created By"],
-            tokens=["created", "by"],
+    def extract(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Retourne un DataFrame aux colonnes canoniques (None si colonne absente)."""
+        frame = pd.DataFrame(
+            {field: df[column] for field, column in self.columns.items()},
+            index=df.index,
         )
+        for field in self.missing:
+            frame[field] = None
+        return frame
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "columns": {field: str(column) for field, column in self.columns.items()},
+            "missing": list(self.missing),
+            "unmatched_columns": [str(c) for c in self.unmatched_columns],
+            "ambiguous": {field: [str(c) for c in cols] for field, cols in self.ambiguous.items()},
+        }
+
+
+def resolve_columns(
+    headers: Iterable[Any],
+    specs: Optional[Dict[str, Tuple[Sequence[str], Sequence[str]]]] = None,
+) -> ColumnMapping:
+    """Résout une fois pour toutes les colonnes du fichier vers les champs canoniques."""
+    if specs is None:
+        specs = PO_IMPORT_COLUMNS
+
+    normalized: Dict[str, Any] = {}
+    for header in headers:
+        if header is None:
+            continue
+        norm = normalize_header(header)
+        if norm and norm not in normalized:
+            normalized[norm] = header
 
-        material_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Material"],
-            tokens=["material"],
-        )
-        short_text_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Short Text"],
-            tokens=["short", "text"],
-        )
-        order_unit_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Order Unit"],
-            tokens=["order", "unit"],
-        )
-        currency_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Currency"],
-            tokens=["currency"],
-        )
+    columns: Dict[str, Any] = {}
+    missing: List[str] = []
+    ambiguous: Dict[str, List[Any]] = {}
 
-        net_order_value = round_decimal(net_order_value_raw)
-        order_quantity = round_decimal(order_quantity_raw)
-        net_price = round_decimal(net_price_raw)
-        received_quantity = round_decimal(received_quantity_raw)
-        still_to_be_delivered_qty = round_decimal(still_to_be_delivered_raw)
-
-        # 2) Récupérer ou créer le Supplier depuis Name of Supplier
-        supplier_name_raw = get_value_tolerant(
-            row,
-            exact_candidates=["Name of Supplier", "Supplier", "Vendor"],
-            tokens=["supplier"],
-        )
+    for field, (exact_candidates, tokens) in specs.items():
+        found = None
+        for candidate in exact_candidates or []:
+            norm_candidate = normalize_header(candidate)
+            if norm_candidate in normalized:
+                found = normalized[norm_candidate]
+                break
+
+        if found is None and tokens:
+            norm_tokens = [normalize_header(t) for t in tokens if t]
+            norm_tokens = [t for t in norm_tokens if t]
+            matches = [
+                original
+                for norm_key, original in normalized.items()
+                if all(t in norm_key for t in norm_tokens)
+            ]
+            if matches:
+                found = matches[0]
+                if len(matches) > 1:
+                    ambiguous[field] = matches
+
+        if found is None:
+            missing.append(field)
+        else:
+            columns[field] = found
+
+    used = set(columns.values())
+    unmatched_columns = [original for original in normalized.values() if original not in used]
+
+    return ColumnMapping(columns, missing, unmatched_columns, ambiguous)
+
+
+# Champs d'en-tête PO renseignés depuis le fichier (sans écraser l'existant)
+PO_HEADER_FIELDS: Tuple[str, ...] = (
+    "release_indicator",
+    "document_date",
+    "purchasing_group",
+    "release_date",
+    "created_by",
+)
+# Champs texte de ligne : mis à jour uniquement si la colonne existe dans le fichier
+LINE_TEXT_FIELDS: Tuple[str, ...] = ("material", "short_text", "order_unit", "currency")
+# Champs numériques de ligne : toujours mis à jour
+LINE_DECIMAL_FIELDS: Tuple[str, ...] = (
+    "net_order_value",
+    "order_quantity",
+    "net_price",
+    "received_quantity",
+    "still_to_be_delivered_qty",
+)
+
+# Nombre de lignes écrites par lot (nombre de requêtes constant par lot)
+IMPORT_BATCH_SIZE = 2000
+
+# Quantités suivies dans l'historique des lignes (PurchaseOrderLineSnapshot)
+SNAPSHOT_QUANTITY_FIELDS: Tuple[str, ...] = ("received_quantity", "still_to_be_delivered_qty")
+
+# Valeurs minimales / factices pour les fournisseurs créés par l'import,
+# à compléter ensuite dans le module suppliers
+AUTO_SUPPLIER_DEFAULTS: Dict[str, Any] = {
+    "type_fournisseur": "Local",
+    "type_organisation": "SA",
+    "date_enregistrement": "2000-01-01",
+    "adresse_physique": "",
+    "telephone": "",
+    "email": "",
+    "nom_representant_legal": "",
+    "fonction_representant": "",
+    "personne_contact": "",
+    "telephone_contact": "",
+    "email_contact": "",
+    "registre_commerce": "",
+    "numero_compte_contribuable": "",
+    "attestation_regularite_fiscale": "",
+    "numero_cnps": "",
+    "banque": "",
+    "agence": "",
+    "iban": "",
+    "modalite_paiement": "Net 30",
+    "type_categorie": "Autres",
+    "categorie": "Autres",
+    "description_categorie": "Import automatique depuis fichier PO",
+}
+
+
+class PurchaseOrderBulkWriter:
+    """Écrit les lignes importées par lots au lieu d'une requête par ligne.
+
+    Pour chaque lot :
+    - précharge les PO et les lignes existants (``number`` / ``business_id``)
+    - calcule le diff en mémoire (empreinte des valeurs importées, voir
+      ``line_fingerprint``) : une ligne inchangée n'est ni réécrite ni recalculée
+    - crée les PO manquants, met à jour les en-têtes modifiés
+    - écrit uniquement les lignes nouvelles ou modifiées, en upsert
+      (``ON CONFLICT (business_id) DO UPDATE``) quand la base le permet,
+      sinon avec ``bulk_create`` / ``bulk_update``
+    - ajoute une entrée d'historique (``PurchaseOrderLineSnapshot``) pour
+      chaque ligne créée ou dont les quantités reçue / restante ont changé,
+      datée de la création du writer et rattachée à ``imported_file_id``
+
+    Chaque enregistrement est un dict déjà nettoyé contenant ``business_id``,
+    ``purchasing_document``, ``item``, ``supplier_id`` et les champs
+    ``PO_HEADER_FIELDS`` / ``LINE_TEXT_FIELDS`` / ``LINE_DECIMAL_FIELDS``.
+    """
 
-        supplier_obj = None
-        supplier_name = clean_text(supplier_name_raw)
-        if supplier_name:
-            # On matche sur nom_complet_organisation, création minimale si besoin
-            supplier_obj, _ = Supplier.objects.get_or_create(
-                nom_complet_organisation=supplier_name,
-                defaults={
-                    # Valeurs minimales / factices, à compléter ensuite dans le module suppliers
-                    "type_fournisseur": "Local",
-                    "type_organisation": "SA",
-                    "date_enregistrement": "2000-01-01",
-                    "adresse_physique": "",
-                    "telephone": "",
-                    "email": "",
-                    "nom_representant_legal": "",
-                    "fonction_representant": "",
-                    "personne_contact": "",
-                    "telephone_contact": "",
-                    "email_contact": "",
-                    "registre_commerce": "",
-                    "numero_compte_contribuable": "",
-                    "attestation_regularite_fiscale": "",
-                    "numero_cnps": "",
-                    "banque": "",
-                    "agence": "",
-                    "iban": "",
-                    "modalite_paiement": "Net 30",
-                    "type_categorie": "Autres",
-                    "categorie": "Autres",
-                    "description_categorie": "Import automatique depuis fichier PO",
-                },
+    def __init__(
+        self,
+        line_fields: Optional[Sequence[str]] = None,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        imported_file_id: Optional[int] = None,
+    ):
+        if line_fields is None:
+            line_fields = LINE_TEXT_FIELDS + LINE_DECIMAL_FIELDS
+        self.line_fields: List[str] = list(line_fields)
+        self.batch_size = batch_size
+        self.imported_file_id = imported_file_id
+        # Une seule date par import : l'historique se regroupe par import
+        self.recorded_at = timezone.now()
+        self.pos_created = 0
+        self.lines_created = 0
+        self.lines_updated = 0
+        self.lines_unchanged = 0
+        self.snapshots_created = 0
+        self.affected_po_ids: set = set()
+
+    def write(self, records: Sequence[Dict[str, Any]]) -> None:
+        """Écrit un lot d'enregistrements (la dernière occurrence d'un business_id l'emporte)."""
+        if not records:
+            return
+        purchase_orders = self._upsert_purchase_orders(records)
+
+        latest: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            latest[record["business_id"]] = record
+        self._upsert_lines(list(latest.values()), purchase_orders)
+
+    # -- En-têtes PO -------------------------------------------------------
+
+    def _upsert_purchase_orders(self, records: Sequence[Dict[str, Any]]) -> Dict[str, PurchaseOrder]:
+        # Première valeur non vide rencontrée pour chaque champ d'en-tête
+        headers: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            header = headers.setdefault(record["purchasing_document"], {})
+            if record.get("supplier_id") and "supplier_id" not in header:
+                header["supplier_id"] = record["supplier_id"]
+            for field in PO_HEADER_FIELDS:
+                if record.get(field) and field not in header:
+                    header[field] = record[field]
+
+        purchase_orders = {
+            po.number: po for po in PurchaseOrder.objects.filter(number__in=list(headers))
+        }
+
+        now = timezone.now()
+        to_update: List[PurchaseOrder] = []
+        update_fields: set = set()
+        for number, po in purchase_orders.items():
+            changed = self._apply_header(po, headers[number])
+            if changed:
+                po.updated_at = now
+                to_update.append(po)
+                update_fields.update(changed)
+        if to_update:
+            PurchaseOrder.objects.bulk_update(
+                to_update, sorted(update_fields) + ["updated_at"], batch_size=self.batch_size
             )
 
-        # 3) Récupérer ou créer le PurchaseOrder
-        po, created = PurchaseOrder.objects.get_or_create(number=purchasing_document)
-
-        header_changed = False
-        if supplier_obj and po.supplier_id is None:
-            po.supplier = supplier_obj
-            header_changed = True
-
-        # Nettoyer d'éventuelles anciennes valeurs invalides ('nan', 'NaT', etc.)
-        for field in [
-            "release_indicator",
-            "document_date",
-            "purchasing_group",
-            "release_date",
-            "created_by",
-        ]:
+        missing = [number for number in headers if number not in purchase_orders]
+        if missing:
+            new_orders = [PurchaseOrder(number=number, **headers[number]) for number in missing]
+            PurchaseOrder.objects.bulk_create(new_orders, batch_size=self.batch_size, ignore_conflicts=True)
+            # ignore_conflicts ne renvoie pas les clés : on relit les PO. Un PO inséré
+            # entre-temps par un autre import a été ignoré : il n'a pas notre created_at
+            created_at = {po.number: po.created_at for po in new_orders}
+            for po in PurchaseOrder.objects.filter(number__in=missing):
+                purchase_orders[po.number] = po
+                if po.created_at == created_at[po.number]:
+                    self.pos_created += 1
+
+        return purchase_orders
+
+    @staticmethod
+    def _apply_header(po: PurchaseOrder, header: Dict[str, Any]) -> List[str]:
+        changed: List[str] = []
+        if header.get("supplier_id") and po.supplier_id is None:
+            po.supplier_id = header["supplier_id"]
+            changed.append("supplier")
+
+        for field in PO_HEADER_FIELDS:
             current = getattr(po, field)
+            # Nettoyer d'éventuelles anciennes valeurs invalides ('nan', 'NaT', etc.)
             if current is not None and clean_text(current) is None:
+                current = None
                 setattr(po, field, None)
-                header_changed = True
-
-        # Renseigner les champs d'en-tête importés (sans écraser si déjà présents)
-        value = clean_text(release_indicator_raw)
-        if value and not po.release_indicator:
-            po.release_indicator = value
-            header_changed = True
-        value = clean_text(document_date_raw)
-        if value and not po.document_date:
-            po.document_date = value
-            header_changed = True
-        value = clean_text(purchasing_group_raw)
-        if value and not po.purchasing_group:
-            po.purchasing_group = value
-            header_changed = True
-        value = clean_text(release_date_raw)
-        if value and not po.release_date:
-            po.release_date = value
-            header_changed = True
-        value = clean_text(created_by_raw)
-        if value and not po.created_by:
-            po.created_by = value
-            header_changed = True
-
-        if header_changed:
-            po.save()
-        if created:
-            pos_created += 1
+                changed.append(field)
+            # Renseigner les champs d'en-tête importés (sans écraser si déjà présents)
+            value = header.get(field)
+            if value and not current:
+                setattr(po, field, value)
+                if field not in changed:
+                    changed.append(field)
+        return changed
+
+    # -- Lignes ------------------------------------------------------------
+
+    def _upsert_lines(self, records: Sequence[Dict[str, Any]], purchase_orders: Dict[str, PurchaseOrder]) -> None:
+        # Seules l'empreinte et les quantités suivies sont comparées : inutile de recharger toutes les valeurs
+        existing = {
+            values[0]: values[1:]
+            for values in PurchaseOrderLine.objects.filter(
+                business_id__in=[record["business_id"] for record in records]
+            ).values_list(
+                "business_id", "id", "purchase_order_id", "fingerprint", *SNAPSHOT_QUANTITY_FIELDS
+            )
+        }
+
+        to_create: List[PurchaseOrderLine] = []
+        to_update: List[PurchaseOrderLine] = []
+        snapshots: List[PurchaseOrderLineSnapshot] = []
+        for record in records:
+            po = purchase_orders[record["purchasing_document"]]
+            fingerprint = line_fingerprint(record, self.line_fields)
+            current = existing.get(record["business_id"])
+
+            if current is None:
+                to_create.append(
+                    PurchaseOrderLine(
+                        business_id=record["business_id"],
+                        purchase_order_id=po.pk,
+                        purchasing_document=record["purchasing_document"],
+                        item=record["item"],
+                        fingerprint=fingerprint,
+                        **{field: record.get(field) for field in LINE_TEXT_FIELDS + LINE_DECIMAL_FIELDS},
+                    )
+                )
+                self.affected_po_ids.add(po.pk)
+                snapshots.append(self._snapshot(record, po, None))
+                continue
+
+            line_id, current_po_id, current_fingerprint = current[:3]
+            if current_fingerprint == fingerprint and current_po_id == po.pk:
+                self.lines_unchanged += 1
+                continue
+            if tuple(record.get(field) for field in SNAPSHOT_QUANTITY_FIELDS) != current[3:]:
+                snapshots.append(self._snapshot(record, po, current[3]))
+
+            # Si la ligne change de PO, l'ancien PO doit aussi être recalculé
+            self.affected_po_ids.add(current_po_id)
+            self.affected_po_ids.add(po.pk)
+            to_update.append(
+                PurchaseOrderLine(
+                    pk=line_id,
+                    business_id=record["business_id"],
+                    purchase_order_id=po.pk,
+                    purchasing_document=record["purchasing_document"],
+                    item=record["item"],
+                    fingerprint=fingerprint,
+                    **{field: record.get(field) for field in self.line_fields},
+                )
+            )
+
+        self.lines_created += len(to_create)
+        self.lines_updated += len(to_update)
+        update_fields = ["purchase_order", "purchasing_document", "item", "fingerprint"] + self.line_fields
+
+        if to_update and connection.features.supports_update_conflicts_with_target:
+            # Un seul INSERT ... ON CONFLICT (business_id) DO UPDATE pour tout le lot
+            for line in to_update:
+                line.pk = None
+            PurchaseOrderLine.objects.bulk_create(
+                to_create + to_update,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=["business_id"],
+                update_fields=update_fields,
+            )
         else:
-            pos_updated += 1
-        affected_pos[purchasing_document] = po
-
-        # 3) Générer business_id et créer / mettre à jour la ligne
-        business_id = PurchaseOrderLine.generate_business_id(purchasing_document, item_str)
-
-        line, created_line = PurchaseOrderLine.objects.get_or_create(
-            business_id=business_id,
-            defaults={
-                "purchase_order": po,
-                "purchasing_document": purchasing_document,
-                "item": item_str,
-                "material": clean_text(material_raw),
-                "short_text": clean_text(short_text_raw),
-                "order_unit": clean_text(order_unit_raw),
-                "currency": clean_text(currency_raw),
-                "net_order_value": net_order_value,
-                "order_quantity": order_quantity,
-                "net_price": net_price,
-                "received_quantity": received_quantity,
-                "still_to_be_delivered_qty": still_to_be_delivered_qty,
-            },
+            if to_create:
+                PurchaseOrderLine.objects.bulk_create(to_create, batch_size=self.batch_size)
+            if to_update:
+                PurchaseOrderLine.objects.bulk_update(to_update, update_fields, batch_size=self.batch_size)
+
+        if snapshots:
+            PurchaseOrderLineSnapshot.objects.bulk_create(snapshots, batch_size=self.batch_size)
+            self.snapshots_created += len(snapshots)
+
+    def _snapshot(self, record: Dict[str, Any], po: PurchaseOrder, previous_received: Any) -> PurchaseOrderLineSnapshot:
+        received = record.get("received_quantity")
+        return PurchaseOrderLineSnapshot(
+            business_id=record["business_id"],
+            purchase_order_id=po.pk,
+            supplier_id=po.supplier_id,
+            imported_file_id=self.imported_file_id,
+            recorded_at=self.recorded_at,
+            received_quantity=received,
+            still_to_be_delivered_qty=record.get("still_to_be_delivered_qty"),
+            received_delta=(received or Decimal("0")) - (previous_received or Decimal("0")),
         )
 
-        if not created_line:
-            # Mettre à jour les valeurs numériques et le lien PO si besoin
-            line.purchase_order = po
-            line.purchasing_document = purchasing_document
-            line.item = item_str
-            if material_raw is not None:
-                line.material = clean_text(material_raw)
-            if short_text_raw is not None:
-                line.short_text = clean_text(short_text_raw)
-            if order_unit_raw is not None:
-                line.order_unit = clean_text(order_unit_raw)
-            if currency_raw is not None:
-                line.currency = clean_text(currency_raw)
-            line.net_order_value = net_order_value
-            line.order_quantity = order_quantity
-            line.net_price = net_price
-            line.received_quantity = received_quantity
-            line.still_to_be_delivered_qty = still_to_be_delivered_qty
-            line.save()
-
-        lines_processed += 1
-
-    # 4) Mettre à jour les montants des PO impactés
-    for po in affected_pos.values():
-        po.update_amounts(save=True)
+
+def make_import_writer(
+    line_fields: Sequence[str], batch_size: int = IMPORT_BATCH_SIZE, imported_file_id: Optional[int] = None
+):
+    """Writer utilisé par l'import : COPY + fusion SQL sur PostgreSQL, ORM sinon.
+
+    Le chemin COPY (``PurchaseOrderCopyLoader``) est activé par ``ORDERS_IMPORT_COPY = True`` ;
+    par défaut, l'ORM (``PurchaseOrderBulkWriter``).
+    ``imported_file_id`` est rattaché aux entrées d'historique des lignes.
+    """
+    # Import local : orders.staging dépend des constantes de ce module
+    from .staging import PurchaseOrderCopyLoader, supports_copy_import
+
+    if getattr(settings, "ORDERS_IMPORT_COPY", False) and supports_copy_import():
+        return PurchaseOrderCopyLoader(line_fields=line_fields, batch_size=batch_size, imported_file_id=imported_file_id)
+    return PurchaseOrderBulkWriter(line_fields=line_fields, batch_size=batch_size, imported_file_id=imported_file_id)
+
+
+# Compteurs des writers, restaurés quand un lot est annulé (voir write_with_savepoints)
+WRITER_COUNTERS: Tuple[str, ...] = (
+    "pos_created",
+    "lines_created",
+    "lines_updated",
+    "lines_unchanged",
+    "snapshots_created",
+)
+
+
+def write_with_savepoints(
+    writer,
+    records: List[Dict[str, Any]],
+    errors: List[str],
+    rejected: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """Écrit ``records`` sous un savepoint et isole les lignes refusées par la base.
+
+    Si l'écriture échoue (contrainte, valeur trop longue...), le savepoint est
+    annulé et le lot est coupé en deux, récursivement, jusqu'à la ligne fautive,
+    qui est reportée dans ``errors`` (et ajoutée à ``rejected`` si fourni). Les
+    bonnes lignes du lot sont conservées. Retourne le nombre de lignes refusées.
+    """
+    if not records:
+        return 0
+    counters = {name: getattr(writer, name) for name in WRITER_COUNTERS}
+    affected_po_ids = set(writer.affected_po_ids)
+    try:
+        with transaction.atomic():
+            writer.write(records)
+        return 0
+    except DatabaseError as exc:
+        for name, value in counters.items():
+            setattr(writer, name, value)
+        writer.affected_po_ids = affected_po_ids
+        if len(records) == 1:
+            message = str(exc).strip().splitlines()[0] if str(exc).strip() else exc.__class__.__name__
+            errors.append(f"Ligne ignorée ({records[0]['business_id']}): {message}")
+            if rejected is not None:
+                rejected.append(records[0])
+            return 1
+
+    # Moitiés écrites dans l'ordre : la dernière occurrence d'un business_id l'emporte toujours
+    middle = len(records) // 2
+    return write_with_savepoints(writer, records[:middle], errors, rejected) + write_with_savepoints(
+        writer, records[middle:], errors, rejected
+    )
+
+
+def line_fingerprint(record: Dict[str, Any], line_fields: Sequence[str]) -> str:
+    """Empreinte des valeurs importées d'une ligne (PO, item et champs écrits)."""
+    parts = [record["purchasing_document"], record["item"]]
+    for field in line_fields:
+        value = record.get(field)
+        parts.append(f"{field}={'' if value is None else value}")
+    return hashlib.md5("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def refresh_purchase_order_amounts(po_ids: Iterable[int], batch_size: int = IMPORT_BATCH_SIZE) -> int:
+    """Recalcule les montants en cache d'un ensemble de PO (un UPDATE par lot d'ids)."""
+    po_ids = sorted(set(po_ids))
+    for start in range(0, len(po_ids), batch_size):
+        PurchaseOrder.objects.filter(pk__in=po_ids[start:start + batch_size]).refresh_amounts()
+    return len(po_ids)
+
+
+class PhaseTimer:
+    """Cumule le temps passé dans chaque phase de l'import.
+
+    Phases : ``parse`` (lecture du fichier), ``normalize`` (nettoyage des
+    lignes), ``resolve`` (fournisseurs), ``write`` (PO / lignes) et
+    ``aggregate`` (montants en cache des PO).
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - start
+
+    def timed(self, name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+        """Itère sur ``iterable`` en comptant le temps de production de chaque élément."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self) -> Dict[str, float]:
+        return {name: round(seconds, 4) for name, seconds in self.totals.items()}
+
+
+def clean_line_records(frame: pd.DataFrame, errors: List[str]) -> List[Dict[str, Any]]:
+    """Transforme les lignes du fichier (colonnes canoniques) en enregistrements nettoyés.
+
+    Le nettoyage est fait colonne par colonne (``clean_text_columns`` /
+    ``round_decimal_columns``) ; seuls les dicts finaux sont construits par ligne.
+    N'accède pas à la base : le fournisseur reste sous forme de nom
+    (``supplier_name``), résolu ensuite par ``assign_suppliers``.
+    """
+    text_fields = ("purchasing_document", "item", "supplier_name") + PO_HEADER_FIELDS + LINE_TEXT_FIELDS
+    texts = clean_text_columns(frame[list(text_fields)])
+
+    # Ligne inutilisable pour notre logique : on loggue et on skip
+    valid = (texts["purchasing_document"].notna() & texts["item"].notna()).to_numpy()
+    skipped = int((~valid).sum())
+    if skipped:
+        errors.extend(["Ligne ignorée: Purchasing Document ou Item manquant"] * skipped)
+    if not valid.any():
+        return []
+
+    texts = texts[valid]
+    numbers = round_decimal_columns(frame.loc[valid, list(LINE_DECIMAL_FIELDS)])
+
+    columns: Dict[str, List[Any]] = {
+        # Même format que PurchaseOrderLine.generate_business_id
+        "business_id": (texts["purchasing_document"] + "-" + texts["item"].str.zfill(4)).tolist(),
+    }
+    for field in ("purchasing_document", "item", "supplier_name") + PO_HEADER_FIELDS + LINE_TEXT_FIELDS:
+        columns[field] = texts[field].tolist()
+    for field in LINE_DECIMAL_FIELDS:
+        columns[field] = numbers[field].tolist()
+
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+def assign_suppliers(records: List[Dict[str, Any]], suppliers: SupplierResolver) -> List[Dict[str, Any]]:
+    """Remplace ``supplier_name`` par ``supplier_id`` (fournisseurs préchargés / créés par le resolver)."""
+    suppliers.preload([record["supplier_name"] for record in records])
+    for record in records:
+        record["supplier_id"] = suppliers.get(record.pop("supplier_name"))
+    return records
+
+
+def import_purchase_orders_from_excel(
+    uploaded_file,
+    imported_file: Optional[ImportedFile] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    start_row: int = 0,
+) -> Dict[str, Any]:
+    """Importe un fichier Excel/CSV et alimente PurchaseOrder / PurchaseOrderLine.
+
+    - Lit le fichier par morceaux de ``batch_size`` lignes avec le lecteur de son
+      format (voir ``orders.readers``)
+    - Résout les colonnes une seule fois (voir ``resolve_columns``) et ne lit que
+      les colonnes retenues
+    - Utilise business_id = Purchasing Document + Item
+    - Crée / met à jour les lignes et les PO par lots (voir ``make_import_writer``)
+
+    Chaque lot est validé dans sa propre transaction : la mémoire utilisée ne
+    dépend pas de la taille du fichier. Les lignes refusées par la base sont
+    isolées par savepoint (voir ``write_with_savepoints``) sans annuler le lot.
+    ``progress`` est appelé après chaque lot avec les compteurs courants.
+
+    Avec ``imported_file``, le point de reprise (``rows_committed``) et les
+    compteurs sont enregistrés dans la transaction de chaque lot ;
+    ``start_row`` permet de reprendre un import interrompu après les lignes
+    du fichier déjà validées.
+    """
+    column_mapping: Optional[ColumnMapping] = None
+    writer = None
+
+    errors: List[str] = []
+    suppliers = SupplierResolver(defaults=AUTO_SUPPLIER_DEFAULTS)
+    timer = PhaseTimer()
+    lines_processed = 0
+    pos_created = 0
+    errors_count = 0
+    rows_read = 0
+
+    # Reprise : compteurs des lots déjà validés
+    if start_row and imported_file is not None:
+        lines_processed = imported_file.rows_count
+        pos_created = imported_file.pos_created
+        errors_count = imported_file.errors_count
+
+    def select_columns(headers: List[str]) -> List[Any]:
+        # 1) Résoudre les colonnes une seule fois pour tout le fichier : seules
+        # les colonnes utiles sont ensuite lues
+        nonlocal column_mapping
+        column_mapping = resolve_columns(headers)
+        return list(column_mapping.columns.values())
+
+    chunks = iter_import_chunks(
+        uploaded_file,
+        chunk_size=batch_size,
+        select_columns=select_columns,
+        extension=getattr(imported_file, "extension", None),
+    )
+    for chunk in timer.timed("parse", chunks):
+        with timer.phase("parse"):
+            if writer is None:
+                # Les champs texte absents du fichier ne doivent pas écraser l'existant
+                line_fields = [f for f in LINE_TEXT_FIELDS if f in column_mapping] + list(LINE_DECIMAL_FIELDS)
+                writer = make_import_writer(line_fields, batch_size, getattr(imported_file, "pk", None))
+
+            # Lignes déjà validées par un import précédent
+            chunk_start = rows_read
+            rows_read += len(chunk)
+            if rows_read <= start_row:
+                continue
+            if chunk_start < start_row:
+                chunk = chunk.iloc[start_row - chunk_start:]
+
+            frame = column_mapping.extract(chunk)
+            del chunk
+
+        chunk_errors: List[str] = []
+        with transaction.atomic():
+            # 2) Nettoyer le lot
+            with timer.phase("normalize"):
+                records = clean_line_records(frame, chunk_errors)
+
+            # 3) Fournisseurs : noms distincts du lot, une requête + un bulk_create, puis écrire le lot
+            with timer.phase("resolve"):
+                assign_suppliers(records, suppliers)
+            with timer.phase("write"):
+                spend_keys = collect_spend_keys(record["purchasing_document"] for record in records)
+                rejected = write_with_savepoints(writer, records, chunk_errors)
+
+            # 4) Mettre à jour les montants des PO impactés par ce lot et les cumuls de dépenses
+            with timer.phase("aggregate"):
+                refresh_purchase_order_amounts(writer.affected_po_ids, batch_size=batch_size)
+                refresh_touched_spend_rollups(spend_keys, writer.affected_po_ids)
+                writer.affected_po_ids.clear()
+
+            # 5) Point de reprise, validé avec le lot
+            if imported_file is not None:
+                ImportedFile.objects.filter(pk=imported_file.pk).update(
+                    rows_committed=rows_read,
+                    rows_count=lines_processed + len(records) - rejected,
+                    errors_count=errors_count + len(chunk_errors),
+                    pos_created=pos_created + writer.pos_created,
+                )
+
+        lines_processed += len(records) - rejected
+        errors_count += len(chunk_errors)
+        errors.extend(chunk_errors)
+
+        if progress is not None:
+            progress(
+                {
+                    "lines_processed": lines_processed,
+                    "pos_created": pos_created + writer.pos_created,
+                    "errors_count": errors_count,
+                }
+            )
+
+    if writer is not None:
+        pos_created += writer.pos_created
 
     summary = {
         "lines_processed": lines_processed,
         "pos_created": pos_created,
-        "pos_updated": pos_updated,
+        # Comme auparavant : chaque ligne traitée d'un PO déjà existant compte comme une mise à jour
+        "pos_updated": lines_processed - pos_created,
         "errors": errors,
+        # Total, y compris les lots validés avant une reprise
+        "errors_count": errors_count,
+        "resumed_from": start_row,
+        "columns": column_mapping.report() if column_mapping is not None else None,
+        "timings": timer.report(),
     }
 
-    # Optionnel: si on veut stocker rows_count sur ImportedFile quand on passe imported_file
     if imported_file is not None:
-        try:
-            imported_file.rows_count = lines_processed
-            imported_file.save(update_fields=["rows_count"])
-        except Exception:
-            # On ne casse pas l'import si l'update échoue
-            pass
+        imported_file.rows_count = lines_processed
+        imported_file.rows_committed = rows_read
+        imported_file.errors_count = errors_count
+        imported_file.pos_created = pos_created
 
     return summary
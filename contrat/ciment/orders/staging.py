@@ -0,0 +1,235 @@
+"""Chargement des imports PO par COPY PostgreSQL.
+
+Les lignes nettoyées d'un lot sont copiées (``COPY ... FROM STDIN``) dans une
+table de staging non journalisée, puis fusionnées dans ``orders_purchaseorder``
+et ``orders_purchaseorderline`` par des ``INSERT ... ON CONFLICT DO UPDATE``.
+Le tout s'exécute dans la transaction du lot : les montants en cache des PO
+sont recalculés ensuite par ``refresh_purchase_order_amounts`` dans la même
+transaction.
+
+Même interface et mêmes règles que ``PurchaseOrderBulkWriter`` (utilisé pour
+SQLite et comme repli) : en-têtes PO complétés sans écraser l'existant,
+dernière occurrence d'un business_id retenue, lignes à l'empreinte inchangée
+non réécrites, historique des quantités (``PurchaseOrderLineSnapshot``) ajouté
+dans la même requête que la fusion des lignes.
+"""
+
+import csv
+import io
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import PurchaseOrder, PurchaseOrderLine, PurchaseOrderLineSnapshot
+from .services import (
+    LINE_DECIMAL_FIELDS,
+    LINE_TEXT_FIELDS,
+    PO_HEADER_FIELDS,
+    SNAPSHOT_QUANTITY_FIELDS,
+    line_fingerprint,
+)
+
+# Table partagée par les imports, créée par la migration 0013 : chaque
+# chargeur n'y voit que ses lignes (``session_key``) et les supprime à la fin
+# de chaque lot.
+STAGING_TABLE = "orders_purchaseorderline_staging"
+
+STAGING_TEXT_FIELDS = (
+    "business_id",
+    "purchasing_document",
+    "item",
+    "fingerprint",
+    "release_indicator",
+    "document_date",
+    "purchasing_group",
+    "release_date",
+    "created_by",
+    "material",
+    "short_text",
+    "order_unit",
+    "currency",
+)
+STAGING_DECIMAL_FIELDS = (
+    "net_order_value",
+    "order_quantity",
+    "net_price",
+    "received_quantity",
+    "still_to_be_delivered_qty",
+)
+STAGING_COLUMNS = ("position", "supplier_id") + STAGING_TEXT_FIELDS + STAGING_DECIMAL_FIELDS
+
+
+def supports_copy_import() -> bool:
+    """Le chargement par COPY n'est possible que sur PostgreSQL."""
+    return connection.vendor == "postgresql"
+
+
+class PurchaseOrderCopyLoader:
+    """Écrit les lots importés via COPY + fusion SQL (PostgreSQL uniquement).
+
+    Compteurs et ``affected_po_ids`` identiques à ``PurchaseOrderBulkWriter``.
+    Par lot, un nombre constant de requêtes quel que soit le nombre de lignes :
+    un COPY, un upsert des PO, un upsert des lignes (avec l'historique) et un
+    DELETE de la table de staging.
+    """
+
+    def __init__(
+        self,
+        line_fields: Optional[Sequence[str]] = None,
+        batch_size: Optional[int] = None,
+        imported_file_id: Optional[int] = None,
+    ):
+        if line_fields is None:
+            line_fields = LINE_TEXT_FIELDS + LINE_DECIMAL_FIELDS
+        self.line_fields: List[str] = list(line_fields)
+        self.header_fields: List[str] = list(PO_HEADER_FIELDS)
+        self.batch_size = batch_size
+        self.imported_file_id = imported_file_id
+        self.recorded_at = timezone.now()
+        self.session_key = uuid.uuid4().hex
+        self.pos_created = 0
+        self.lines_created = 0
+        self.lines_updated = 0
+        self.lines_unchanged = 0
+        self.snapshots_created = 0
+        self.affected_po_ids: set = set()
+
+    def write(self, records: Sequence[Dict[str, Any]]) -> None:
+        """Écrit un lot d'enregistrements (la dernière occurrence d'un business_id l'emporte)."""
+        if not records:
+            return
+        with connection.cursor() as cursor:
+            self._copy(cursor, records)
+            self._merge_purchase_orders(cursor)
+            self._merge_lines(cursor, len({record["business_id"] for record in records}))
+            # En cas d'erreur, l'annulation du lot (savepoint) retire aussi les lignes copiées
+            cursor.execute(f"DELETE FROM {STAGING_TABLE} WHERE session_key = %s", [self.session_key])
+
+    # -- Staging -----------------------------------------------------------
+
+    def _copy(self, cursor, records: Sequence[Dict[str, Any]]) -> None:
+        # CSV : None devient un champ vide, lu comme NULL. Les textes nettoyés
+        # ne sont jamais vides (clean_text renvoie None), il n'y a pas d'ambiguïté.
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for position, record in enumerate(records):
+            values = dict(record, position=position, fingerprint=line_fingerprint(record, self.line_fields))
+            writer.writerow([self.session_key] + [values.get(column) for column in STAGING_COLUMNS])
+        buffer.seek(0)
+
+        sql = f"COPY {STAGING_TABLE} (session_key, {', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy_expert"):
+            # psycopg2
+            raw_cursor.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    # -- Fusion ------------------------------------------------------------
+
+    def _merge_purchase_orders(self, cursor) -> None:
+        po_table = PurchaseOrder._meta.db_table
+        fields = ["supplier_id"] + self.header_fields
+        # Première valeur renseignée de chaque champ d'en-tête, dans l'ordre du fichier
+        firsts = ", ".join(
+            f"(array_agg({field} ORDER BY position) FILTER (WHERE {field} IS NOT NULL))[1]"
+            for field in fields
+        )
+        # Comme PurchaseOrderBulkWriter._apply_header : un en-tête vide ou invalide
+        # ('nan', 'NaT'...) est remplacé, une valeur existante est conservée
+        merged = {"supplier_id": f"COALESCE({po_table}.supplier_id, EXCLUDED.supplier_id)"}
+        for field in self.header_fields:
+            existing = f"{po_table}.{field}"
+            empty = f"{existing} IS NULL OR lower(btrim({existing})) IN ('', 'nan', 'nat', 'none', 'null')"
+            merged[field] = f"CASE WHEN {empty} THEN EXCLUDED.{field} ELSE {existing} END"
+        assignments = ", ".join(f"{field} = {expression}" for field, expression in merged.items())
+        current = ", ".join(f"{po_table}.{field}" for field in merged)
+
+        cursor.execute(
+            f"""
+            INSERT INTO {po_table} (number, {', '.join(fields)}, is_multi_currency, created_at, updated_at)
+            SELECT purchasing_document, {firsts}, false, now(), now()
+            FROM {STAGING_TABLE}
+            WHERE session_key = %s
+            GROUP BY purchasing_document
+            ON CONFLICT (number) DO UPDATE SET {assignments}, updated_at = EXCLUDED.updated_at
+            WHERE ({current}) IS DISTINCT FROM ({', '.join(merged.values())})
+            RETURNING (xmax = 0)
+            """,
+            [self.session_key],
+        )
+        self.pos_created += sum(1 for (inserted,) in cursor.fetchall() if inserted)
+
+    def _merge_lines(self, cursor, staged_count: int) -> None:
+        po_table = PurchaseOrder._meta.db_table
+        line_table = PurchaseOrderLine._meta.db_table
+        snapshot_table = PurchaseOrderLineSnapshot._meta.db_table
+        quantities = ", ".join(SNAPSHOT_QUANTITY_FIELDS)
+        value_fields = list(LINE_TEXT_FIELDS + LINE_DECIMAL_FIELDS)
+        columns = ["business_id", "purchase_order_id", "purchasing_document", "item", "fingerprint"] + value_fields
+        # Les champs texte absents du fichier ne sont pas écrasés (voir line_fields)
+        updated = ["purchase_order_id", "purchasing_document", "item", "fingerprint"] + self.line_fields
+        assignments = ", ".join(f"{field} = EXCLUDED.{field}" for field in updated)
+        selected = ", ".join(
+            "po.id" if column == "purchase_order_id" else f"s.{column}" for column in columns
+        )
+
+        cursor.execute(
+            f"""
+            WITH previous AS (
+                SELECT DISTINCT l.business_id, l.purchase_order_id, {', '.join('l.' + f for f in SNAPSHOT_QUANTITY_FIELDS)}
+                FROM {line_table} l
+                JOIN {STAGING_TABLE} s ON s.business_id = l.business_id AND s.session_key = %s
+            ),
+            merged AS (
+                INSERT INTO {line_table} ({', '.join(columns)})
+                SELECT DISTINCT ON (s.business_id) {selected}
+                FROM {STAGING_TABLE} s
+                JOIN {po_table} po ON po.number = s.purchasing_document
+                WHERE s.session_key = %s
+                ORDER BY s.business_id, s.position DESC
+                ON CONFLICT (business_id) DO UPDATE SET {assignments}
+                WHERE {line_table}.fingerprint IS DISTINCT FROM EXCLUDED.fingerprint
+                   OR {line_table}.purchase_order_id <> EXCLUDED.purchase_order_id
+                RETURNING business_id, purchase_order_id, {quantities}, (xmax = 0) AS inserted
+            ),
+            snapshots AS (
+                -- Comme PurchaseOrderBulkWriter : ligne créée ou quantités modifiées
+                INSERT INTO {snapshot_table} (
+                    business_id, purchase_order_id, supplier_id, imported_file_id, recorded_at,
+                    {quantities}, received_delta
+                )
+                SELECT merged.business_id, merged.purchase_order_id, po.supplier_id, %s, %s,
+                       {', '.join('merged.' + f for f in SNAPSHOT_QUANTITY_FIELDS)},
+                       COALESCE(merged.received_quantity, 0) - COALESCE(previous.received_quantity, 0)
+                FROM merged
+                JOIN {po_table} po ON po.id = merged.purchase_order_id
+                LEFT JOIN previous ON previous.business_id = merged.business_id
+                WHERE previous.business_id IS NULL
+                   OR ({', '.join('merged.' + f for f in SNAPSHOT_QUANTITY_FIELDS)})
+                      IS DISTINCT FROM ({', '.join('previous.' + f for f in SNAPSHOT_QUANTITY_FIELDS)})
+                RETURNING 1
+            )
+            SELECT merged.business_id, merged.purchase_order_id, previous.purchase_order_id, merged.inserted,
+                   (SELECT count(*) FROM snapshots)
+            FROM merged LEFT JOIN previous ON previous.business_id = merged.business_id
+            """,
+            [self.session_key, self.session_key, self.imported_file_id, self.recorded_at],
+        )
+        rows = cursor.fetchall()
+
+        created = 0
+        self.snapshots_created += rows[0][4] if rows else 0
+        for _business_id, po_id, previous_po_id, inserted, _snapshots in rows:
+            created += 1 if inserted else 0
+            # Si la ligne change de PO, l'ancien PO doit aussi être recalculé
+            self.affected_po_ids.add(po_id)
+            if previous_po_id is not None:
+                self.affected_po_ids.add(previous_po_id)
+        self.lines_created += created
+        self.lines_updated += len(rows) - created
+        self.lines_unchanged += staged_count - len(rows)
@@ -6,5 +6,7 @@ app_name = "orders"
 
 urlpatterns = [
     path("", views.purchase_order_list, name="purchase_order_list"),
+    path("search/", views.purchase_order_search, name="purchase_order_search"),
+    path("spend/", views.spend_overview, name="spend_overview"),
     path("<str:number>/", views.purchase_order_detail, name="purchase_order_detail"),
 ]
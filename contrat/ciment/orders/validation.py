@@ -0,0 +1,309 @@
+"""Validation à blanc des fichiers d'import PO (aucune écriture en base).
+
+Le fichier passe par les mêmes étapes de lecture et de nettoyage que l'import
+(``iter_import_chunks``, ``resolve_columns``, ``clean_text_columns``), puis
+chaque morceau est contrôlé colonne par colonne :
+
+- clé manquante (Purchasing Document / Item) : la ligne serait ignorée
+- valeur numérique illisible ou hors capacité du champ
+- texte plus long que le champ du modèle
+- business_id en double dans le fichier (la dernière ligne l'emporterait)
+- en-tête de PO incohérent entre les lignes d'un même PO (seule la première
+  valeur renseignée serait retenue)
+
+Les numéros de ligne sont ceux du fichier (l'index des morceaux lus, voir
+``orders.readers``), lignes vides comprises.
+
+Le rapport est écrit en xlsx par ``write_validation_report`` (xlsxwriter en
+mode ``constant_memory``) pour être corrigé par les acheteurs avant l'import.
+Seuls les ``MAX_REPORTED_ISSUES`` premiers problèmes sont détaillés ; les
+compteurs du résumé portent sur tous.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import pandas as pd
+import xlsxwriter
+
+from .models import PurchaseOrder, PurchaseOrderLine
+from .readers import READ_CHUNK_SIZE, iter_import_chunks
+from .services import (
+    LINE_DECIMAL_FIELDS,
+    LINE_TEXT_FIELDS,
+    PO_HEADER_FIELDS,
+    ColumnMapping,
+    clean_text_columns,
+    resolve_columns,
+)
+from suppliers.models import Supplier
+
+# Problèmes détaillés au plus dans le rapport (une ligne de la feuille « Problèmes » chacun)
+MAX_REPORTED_ISSUES = 100_000
+
+KIND_MISSING_KEY = "missing_key"
+KIND_BAD_NUMBER = "bad_number"
+KIND_TOO_LONG = "too_long"
+KIND_DUPLICATE = "duplicate"
+KIND_HEADER_CONFLICT = "header_conflict"
+KIND_MISSING_COLUMN = "missing_column"
+
+KIND_LABELS = {
+    KIND_MISSING_COLUMN: "Colonne absente",
+    KIND_MISSING_KEY: "Clé manquante",
+    KIND_BAD_NUMBER: "Nombre invalide",
+    KIND_TOO_LONG: "Texte trop long",
+    KIND_DUPLICATE: "Ligne en double",
+    KIND_HEADER_CONFLICT: "En-tête PO incohérent",
+}
+
+KEY_FIELDS = ("purchasing_document", "item")
+# Champs d'en-tête de PO : une seule valeur par PO (supplier_name compris)
+PO_CONSISTENT_FIELDS = ("supplier_name",) + PO_HEADER_FIELDS
+
+# DecimalField(max_digits=20, decimal_places=2) : 18 chiffres avant la virgule
+MAX_DECIMAL_VALUE = 10.0**18
+
+
+def _max_lengths() -> Dict[str, int]:
+    """Longueur maximale en base de chaque champ texte importé."""
+    lengths = {"supplier_name": Supplier._meta.get_field("nom_complet_organisation").max_length}
+    for field in KEY_FIELDS + LINE_TEXT_FIELDS:
+        lengths[field] = PurchaseOrderLine._meta.get_field(field).max_length
+    for field in PO_HEADER_FIELDS:
+        lengths[field] = PurchaseOrder._meta.get_field(field).max_length
+    return {field: length for field, length in lengths.items() if length}
+
+
+class ValidationIssue(NamedTuple):
+    row: Optional[int]
+    column: str
+    field: str
+    value: str
+    kind: str
+    message: str
+
+
+class ValidationReport:
+    """Problèmes relevés dans un fichier, dans l'ordre des lignes.
+
+    ``add`` compte chaque problème et le met en attente ; ``flush`` (après
+    chaque morceau) les trie et les ajoute à ``issues``, dans la limite de
+    ``max_issues`` : la mémoire reste bornée quel que soit le fichier.
+    """
+
+    def __init__(self, file_name: str = "", max_issues: int = MAX_REPORTED_ISSUES):
+        self.file_name = file_name
+        self.rows = 0
+        self.max_issues = max_issues
+        self.issues: List[ValidationIssue] = []
+        self.issue_counts: Dict[str, int] = {kind: 0 for kind in KIND_LABELS}
+        self.mapping: Optional[ColumnMapping] = None
+        self._pending: List[ValidationIssue] = []
+
+    @property
+    def total_issues(self) -> int:
+        return sum(self.issue_counts.values())
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.total_issues
+
+    @property
+    def truncated(self) -> bool:
+        """True si des problèmes ne sont pas détaillés (au-delà de ``max_issues``)."""
+        return self.total_issues > len(self.issues)
+
+    def add(self, row, field, value, kind, message) -> None:
+        self.issue_counts[kind] += 1
+        if len(self.issues) >= self.max_issues:
+            return
+        column = self.mapping.get(field, "") if self.mapping is not None else ""
+        self._pending.append(ValidationIssue(row, str(column), field, "" if value is None else str(value), kind, message))
+
+    def flush(self) -> None:
+        """Ajoute les problèmes en attente, dans l'ordre des lignes (les erreurs de structure en premier)."""
+        self._pending.sort(key=lambda issue: -1 if issue.row is None else issue.row)
+        self.issues.extend(self._pending[:self.max_issues - len(self.issues)])
+        self._pending = []
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.issue_counts)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "file": self.file_name,
+            "rows": self.rows,
+            "issues": self.total_issues,
+            "listed_issues": len(self.issues),
+            "counts": self.counts(),
+            "columns": self.mapping.report() if self.mapping is not None else None,
+        }
+
+
+class _ChunkValidator:
+    """Contrôles d'un fichier, morceau par morceau (état conservé entre morceaux)."""
+
+    def __init__(self, report: ValidationReport):
+        self.report = report
+        self.max_lengths = _max_lengths()
+        # business_id -> première ligne du fichier
+        self.first_rows: Dict[str, int] = {}
+        # champ -> PO -> (valeur de référence, ligne)
+        self.references: Dict[str, Dict[str, Any]] = {field: {} for field in PO_CONSISTENT_FIELDS}
+
+    def check(self, frame: pd.DataFrame) -> None:
+        """Contrôle un morceau ; son index est le numéro de ligne dans le fichier."""
+        report = self.report
+        rows = pd.Series(frame.index, index=frame.index)
+        text_fields = list(KEY_FIELDS + PO_CONSISTENT_FIELDS + LINE_TEXT_FIELDS)
+        texts = clean_text_columns(frame[text_fields])
+
+        # Clés manquantes
+        valid = texts["purchasing_document"].notna() & texts["item"].notna()
+        for field in KEY_FIELDS:
+            for row in rows[texts[field].isna()].tolist():
+                report.add(row, field, None, KIND_MISSING_KEY, "Valeur obligatoire : la ligne sera ignorée")
+
+        # Nombres : valeur renseignée mais illisible, ou trop grande pour le champ
+        raw = clean_text_columns(frame[list(LINE_DECIMAL_FIELDS)])
+        for field in LINE_DECIMAL_FIELDS:
+            present = raw[field].notna()
+            numbers = pd.to_numeric(frame[field].where(present), errors="coerce")
+            unreadable = present & numbers.isna()
+            too_large = present & (numbers.abs() >= MAX_DECIMAL_VALUE)
+            for row, value in zip(rows[unreadable].tolist(), raw[field][unreadable].tolist()):
+                report.add(row, field, value, KIND_BAD_NUMBER, "Nombre illisible : la valeur sera importée à 0")
+            for row, value in zip(rows[too_large].tolist(), raw[field][too_large].tolist()):
+                report.add(row, field, value, KIND_BAD_NUMBER, "Nombre trop grand pour le champ")
+
+        # Textes plus longs que le champ en base
+        for field, length in self.max_lengths.items():
+            too_long = texts[field].str.len() > length
+            for row, value in zip(rows[too_long].tolist(), texts[field][too_long].tolist()):
+                report.add(row, field, value, KIND_TOO_LONG, f"Texte trop long ({len(value)} > {length} caractères)")
+
+        if not valid.any():
+            return
+        texts = texts[valid]
+        rows = rows[valid]
+        documents = texts["purchasing_document"]
+
+        # Doublons de business_id (même format que PurchaseOrderLine.generate_business_id)
+        business_ids = documents + "-" + texts["item"].str.zfill(4)
+        first_rows = self.first_rows
+        for business_id, row in zip(business_ids.tolist(), rows.tolist()):
+            first = first_rows.setdefault(business_id, row)
+            if first != row:
+                report.add(
+                    row, "item", business_id, KIND_DUPLICATE,
+                    f"business_id déjà présent ligne {first} : seule la dernière ligne sera conservée",
+                )
+
+        # En-têtes de PO : toutes les valeurs renseignées doivent être identiques
+        for field in PO_CONSISTENT_FIELDS:
+            values = texts[field]
+            present = values.notna()
+            if not present.any():
+                continue
+            pairs = pd.DataFrame({"po": documents[present], "value": values[present], "row": rows[present]})
+            references = self.references[field]
+            for po, value, row in pairs.drop_duplicates("po").itertuples(index=False):
+                references.setdefault(po, (value, row))
+            expected = pairs["po"].map(lambda po: references[po][0])
+            conflicts = pairs[pairs["value"] != expected]
+            for po, value, row in conflicts.itertuples(index=False):
+                reference, reference_row = references[po]
+                report.add(
+                    row, field, value, KIND_HEADER_CONFLICT,
+                    f"PO {po} : '{reference}' ligne {reference_row}, seule cette valeur sera retenue",
+                )
+
+
+def validate_import_file(
+    uploaded_file,
+    extension: Optional[str] = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+    sheet: int = 0,
+    max_issues: int = MAX_REPORTED_ISSUES,
+) -> ValidationReport:
+    """Contrôle un fichier d'import sans rien écrire en base."""
+    report = ValidationReport(getattr(uploaded_file, "name", "") or "", max_issues=max_issues)
+
+    def select_columns(headers: List[str]) -> List[Any]:
+        report.mapping = resolve_columns(headers)
+        for field in report.mapping.missing:
+            if field in KEY_FIELDS:
+                report.add(None, field, None, KIND_MISSING_COLUMN, "Colonne obligatoire introuvable")
+        return list(report.mapping.columns.values())
+
+    validator = _ChunkValidator(report)
+    for chunk in iter_import_chunks(
+        uploaded_file, chunk_size=chunk_size, select_columns=select_columns, extension=extension, sheet=sheet
+    ):
+        validator.check(report.mapping.extract(chunk))
+        report.rows += len(chunk)
+        # Les morceaux se suivent dans le fichier : trier chacun suffit
+        report.flush()
+    report.flush()
+    return report
+
+
+def write_validation_report(report: ValidationReport, output) -> None:
+    """Écrit le rapport en xlsx dans ``output`` (chemin ou fichier binaire).
+
+    ``constant_memory`` : chaque ligne est écrite sur disque dès que la suivante
+    commence. Le nombre de problèmes détaillés est borné par
+    ``ValidationReport.max_issues`` (sous la limite de lignes d'Excel) ; le
+    résumé indique quand la liste est tronquée.
+    """
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "in_memory": False})
+    try:
+        bold = workbook.add_format({"bold": True})
+
+        summary = workbook.add_worksheet("Résumé")
+        summary.set_column(0, 0, 30)
+        summary.set_column(1, 1, 40)
+        line = 0
+        for label, value in (("Fichier", report.file_name), ("Lignes lues", report.rows), ("Problèmes", report.total_issues)):
+            summary.write(line, 0, label, bold)
+            summary.write(line, 1, value)
+            line += 1
+        if report.truncated:
+            summary.write(line, 0, "Problèmes détaillés", bold)
+            summary.write(line, 1, f"{len(report.issues)} premiers (liste tronquée)")
+            line += 1
+        line += 1
+        for kind, count in report.counts().items():
+            summary.write(line, 0, KIND_LABELS[kind])
+            summary.write_number(line, 1, count)
+            line += 1
+        if report.mapping is not None:
+            line += 1
+            summary.write_row(line, 0, ("Champ", "Colonne du fichier"), bold)
+            line += 1
+            for field, column in report.mapping.columns.items():
+                summary.write_row(line, 0, (field, str(column)))
+                line += 1
+            for field in report.mapping.missing:
+                summary.write_row(line, 0, (field, "(absente)"))
+                line += 1
+
+        sheet = workbook.add_worksheet("Problèmes")
+        sheet.set_column(0, 0, 8)
+        sheet.set_column(1, 2, 25)
+        sheet.set_column(3, 3, 30)
+        sheet.set_column(4, 4, 22)
+        sheet.set_column(5, 5, 70)
+        sheet.write_row(0, 0, ("Ligne", "Colonne", "Champ", "Valeur", "Problème", "Détail"), bold)
+        for index, (row, column, field, value, kind, message) in enumerate(report.issues, start=1):
+            if row is not None:
+                sheet.write_number(index, 0, row)
+            sheet.write_string(index, 1, column)
+            sheet.write_string(index, 2, field)
+            sheet.write_string(index, 3, value)
+            sheet.write_string(index, 4, KIND_LABELS[kind])
+            sheet.write_string(index, 5, message)
+        sheet.freeze_panes(1, 0)
+        sheet.autofilter(0, 0, max(len(report.issues), 1), 5)
+    finally:
+        workbook.close()
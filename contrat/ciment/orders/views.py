@@ -1,33 +1,67 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, render
 
-from .models import PurchaseOrder
+from .models import PurchaseOrder, SpendRollup
+from .pagination import estimate_count, keyset_page
+from .search import MIN_QUERY_LENGTH, search_purchase_orders
 
 # Create your views here.
 
+SUGGESTIONS_CACHE_KEY = "orders:po_suggestions"
+
+
+def get_po_suggestions():
+    """Numéros des derniers PO importés, proposés dans la recherche (mis en cache)."""
+
+    def latest_numbers():
+        # -pk : même ordre que la création, servi par la clé primaire
+        return list(PurchaseOrder.objects.order_by("-pk").values_list("number", flat=True)[:20])
+
+    timeout = getattr(settings, "ORDERS_SUGGESTIONS_CACHE_SECONDS", 300)
+    return cache.get_or_set(SUGGESTIONS_CACHE_KEY, latest_numbers, timeout)
+
+
 def purchase_order_list(request):
-    qs = PurchaseOrder.objects.all().order_by("number")
+    qs = PurchaseOrder.objects.all()
 
-    q = request.GET.get("q")
+    q = (request.GET.get("q") or "").strip()
     if q:
-        qs = qs.filter(number__icontains=q)
-
-    suggestions = PurchaseOrder.objects.all().order_by("-created_at")[:20]
+        # Préfixe : servi par l'index orders_po_number_prefix_idx
+        qs = qs.filter(number__startswith=q)
 
-    paginator = Paginator(qs, 20)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # Pagination par clé sur number : coût constant quelle que soit la page
+    page_obj = keyset_page(
+        qs.with_amounts(),
+        after=request.GET.get("after") or None,
+        before=request.GET.get("before") or None,
+    )
+    total_count, count_kind = estimate_count(qs)
 
     context = {
         "page_obj": page_obj,
-        "query": q or "",
-        "suggestions": suggestions,
+        "total_count": total_count,
+        "count_kind": count_kind,
+        "query": q,
+        "suggestions": get_po_suggestions(),
     }
     return render(request, "orders/purchaseorder_list.html", context)
 
 
+def purchase_order_search(request):
+    """Recherche par numéro, fournisseur, article, texte court ou business_id."""
+    q = (request.GET.get("q") or "").strip()
+    context = {
+        "query": q,
+        "hits": search_purchase_orders(q) if q else [],
+        "min_length": MIN_QUERY_LENGTH,
+    }
+    return render(request, "orders/purchaseorder_search.html", context)
+
+
 def purchase_order_detail(request, number):
-    po = get_object_or_404(PurchaseOrder, number=number)
+    po = get_object_or_404(PurchaseOrder.objects.select_related("supplier"), number=number)
     lines = po.lines.all().order_by("item")
 
     context = {
@@ -39,3 +73,31 @@ def purchase_order_detail(request, number):
         "progress_rate": po.get_progress_rate(),
     }
     return render(request, "orders/purchaseorder_detail.html", context)
+
+
+# Axes proposés sur le tableau des dépenses (voir SpendRollupQuerySet.DIMENSIONS)
+SPEND_AXES = [
+    ("supplier", "Fournisseur"),
+    ("purchasing_group", "Groupe d'achat"),
+    ("material", "Article"),
+    ("currency", "Devise"),
+]
+
+
+def spend_overview(request):
+    """Totaux commandé / reçu / restant par axe, lus dans la table de cumuls."""
+    by = request.GET.get("by")
+    if by not in dict(SPEND_AXES):
+        by = "supplier"
+
+    paginator = Paginator(SpendRollup.objects.summary(by), 50)
+    page_obj = paginator.get_page(request.GET.get("page"))
+
+    context = {
+        "page_obj": page_obj,
+        "by": by,
+        "by_label": dict(SPEND_AXES)[by],
+        "axes": SPEND_AXES,
+        "totals": SpendRollup.objects.summary("currency"),
+    }
+    return render(request, "orders/spend_overview.html", context)
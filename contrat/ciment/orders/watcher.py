@@ -0,0 +1,174 @@
+"""Import automatique des extractions PO déposées dans un dossier.
+
+SAP dépose ses exports dans un dossier partagé ; ``DropFolderWatcher`` le
+scrute par intervalles (pas de dépendance à inotify, fonctionne sur un
+partage réseau) :
+
+- un fichier n'est pris que lorsqu'il est stable : même taille et même date
+  de modification sur deux passages, et non modifié depuis ``settle_seconds``
+- il est enregistré comme ``ImportedFile`` puis importé par ``run_import``
+  dans un pool de ``workers`` threads
+- il est ensuite déplacé dans ``done/`` ou ``failed/`` ; s'il ne peut pas
+  l'être (droits, fichier verrouillé), il reste dans le dossier mais n'est
+  repris que si sa taille ou sa date de modification change
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from django.db import connection
+from django.utils import timezone
+
+from .jobs import register_local_file, run_import
+from .models import ImportedFile
+from .readers import EXTENSION_FORMATS
+
+logger = logging.getLogger(__name__)
+
+DONE_DIRNAME = "done"
+FAILED_DIRNAME = "failed"
+
+# Fichiers en cours de copie / temporaires (Excel, navigateurs, rsync...)
+IGNORED_PREFIXES = (".", "~$")
+IGNORED_SUFFIXES = (".tmp", ".part", ".crdownload")
+
+
+class DropFolderWatcher:
+    """Surveille ``directory`` et importe chaque nouveau fichier stable."""
+
+    def __init__(
+        self,
+        directory: str,
+        workers: int = 2,
+        settle_seconds: float = 2.0,
+        done_dir: Optional[str] = None,
+        failed_dir: Optional[str] = None,
+    ):
+        self.directory = directory
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self.done_dir = done_dir or os.path.join(directory, DONE_DIRNAME)
+        self.failed_dir = failed_dir or os.path.join(directory, FAILED_DIRNAME)
+        # Dernier état vu (taille, mtime) des fichiers pas encore stables
+        self.seen: Dict[str, Tuple[int, float]] = {}
+        self.in_progress: Dict[str, Future] = {}
+        # Fichiers traités mais restés dans le dossier (déplacement impossible) -> (taille, mtime)
+        self.unmovable: Dict[str, Tuple[int, float]] = {}
+        self._unmovable_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers else None
+
+        for path in (self.directory, self.done_dir, self.failed_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def is_candidate(self, name: str) -> bool:
+        if name.startswith(IGNORED_PREFIXES) or name.lower().endswith(IGNORED_SUFFIXES):
+            return False
+        return os.path.splitext(name)[1].lstrip(".").lower() in EXTENSION_FORMATS
+
+    def ready_files(self) -> List[str]:
+        """Fichiers stables du dossier, non encore pris en charge."""
+        ready: List[str] = []
+        now = time.time()
+        present = set()
+        with self._unmovable_lock:
+            unmovable = dict(self.unmovable)
+        for entry in sorted(os.scandir(self.directory), key=lambda entry: entry.name):
+            if not entry.is_file() or not self.is_candidate(entry.name) or entry.path in self.in_progress:
+                continue
+            present.add(entry.path)
+            stat = entry.stat()
+            state = (stat.st_size, stat.st_mtime)
+            # Déjà importé : seulement s'il a été remplacé depuis
+            if entry.path in unmovable:
+                if unmovable[entry.path] == state:
+                    continue
+                self._forget_unmovable(entry.path)
+            previous = self.seen.get(entry.path)
+            self.seen[entry.path] = state
+            if previous == state and stat.st_size > 0 and now - stat.st_mtime >= self.settle_seconds:
+                del self.seen[entry.path]
+                ready.append(entry.path)
+        # Oublier les fichiers disparus avant d'être stables
+        for path in set(self.seen) - present:
+            del self.seen[path]
+        for path in set(unmovable) - present:
+            self._forget_unmovable(path)
+        return ready
+
+    def _forget_unmovable(self, path: str) -> None:
+        with self._unmovable_lock:
+            self.unmovable.pop(path, None)
+
+    def poll(self) -> List[str]:
+        """Un passage : lance l'import des fichiers prêts. Retourne leurs chemins."""
+        for path, future in list(self.in_progress.items()):
+            if future.done():
+                del self.in_progress[path]
+
+        ready = self.ready_files()
+        for path in ready:
+            if self.executor is None:
+                self.process(path)
+            else:
+                self.in_progress[path] = self.executor.submit(self._process_in_thread, path)
+        return ready
+
+    def process(self, path: str) -> Optional[ImportedFile]:
+        """Enregistre, importe puis range un fichier. Retourne son ``ImportedFile``."""
+        imported_file = None
+        target_dir = self.failed_dir
+        try:
+            # En cours dès la création : le worker de file d'attente ne doit pas le prendre
+            imported_file = register_local_file(path, status=ImportedFile.STATUS_RUNNING)
+            run_import(imported_file)
+            target_dir = self.done_dir
+            logger.info("Import de %s terminé (ImportedFile #%s)", path, imported_file.pk)
+        except Exception:
+            # run_import enregistre déjà l'échec sur le fichier
+            logger.exception("Échec de l'import de %s", path)
+        finally:
+            self._move(path, target_dir)
+        return imported_file
+
+    def _process_in_thread(self, path: str) -> Optional[ImportedFile]:
+        try:
+            return self.process(path)
+        finally:
+            # Chaque thread a sa propre connexion : la fermer après chaque fichier
+            connection.close()
+
+    def _move(self, path: str, target_dir: str) -> str:
+        name = os.path.basename(path)
+        target = os.path.join(target_dir, name)
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(name)
+            target = os.path.join(target_dir, f"{stem}-{timezone.now():%Y%m%d%H%M%S%f}{ext}")
+        try:
+            shutil.move(path, target)
+        except OSError:
+            logger.exception("Impossible de déplacer %s vers %s", path, target_dir)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return target
+            with self._unmovable_lock:
+                self.unmovable[path] = (stat.st_size, stat.st_mtime)
+        return target
+
+    def run(self, interval: float = 2.0) -> None:
+        """Boucle de surveillance (jusqu'à interruption)."""
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,74 @@
+"""Exports CSV écrits en flux.
+
+Les vues d'export ne chargent pas les objets : elles lisent seulement les
+colonnes utiles avec ``values_list(...).iterator(chunk_size=EXPORT_CHUNK_SIZE)``
+(curseur côté serveur sur PostgreSQL) et passent les lignes à
+``streaming_csv_response``. Les lignes sont formatées par ``csv.writer`` puis
+envoyées au client par paquets d'environ ``EXPORT_BUFFER_SIZE`` caractères, au
+fur et à mesure de la lecture : le téléchargement commence tout de suite et la
+mémoire ne dépend pas du nombre de lignes.
+
+Si le client accepte gzip, chaque paquet est compressé à la volée
+(``Content-Encoding: gzip``) ; le navigateur enregistre le CSV décompressé.
+"""
+
+import csv
+import re
+from typing import Any, Iterable, Iterator, Sequence
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import content_disposition_header
+from django.utils.text import compress_sequence
+
+# Lignes lues par requête (taille des lots du curseur)
+EXPORT_CHUNK_SIZE = 2000
+# Taille visée (caractères) des paquets envoyés au client
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+_ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+class _Echo:
+    """Pseudo-fichier : ``csv.writer`` renvoie la ligne formatée au lieu de l'écrire."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_chunks(
+    header: Sequence[Any], rows: Iterable[Sequence[Any]], buffer_size: int = EXPORT_BUFFER_SIZE
+) -> Iterator[bytes]:
+    """Lignes CSV (en-tête compris), en paquets UTF-8 d'environ ``buffer_size`` caractères."""
+    writer = csv.writer(_Echo())
+    buffer = [writer.writerow(header)]
+    size = len(buffer[0])
+    for row in rows:
+        line = writer.writerow(row)
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def accepts_gzip(request) -> bool:
+    return bool(_ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", "")))
+
+
+def streaming_csv_response(
+    request, filename: str, header: Sequence[Any], rows: Iterable[Sequence[Any]]
+) -> StreamingHttpResponse:
+    """Réponse CSV en pièce jointe, écrite pendant la lecture de ``rows`` (gzip si le client l'accepte)."""
+    content = csv_chunks(header, rows)
+    gzipped = accepts_gzip(request)
+    if gzipped:
+        content = compress_sequence(content)
+    response = StreamingHttpResponse(content, content_type="text/csv")
+    if gzipped:
+        response.headers["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    response.headers["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
@@ -0,0 +1,227 @@
+import gzip
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from .streaming import csv_chunks, streaming_csv_response
+from contracts.models import Contract
+from evaluations.models import SupplierEvaluation
+from orders.models import SpendRollup
+from orders.services import AUTO_SUPPLIER_DEFAULTS
+from suppliers.models import Supplier
+from suppliers.services import SupplierResolver
+
+
+def make_suppliers(*names):
+    """Fournisseurs créés avec les valeurs par défaut de l'import PO, par nom."""
+    resolver = SupplierResolver(defaults=AUTO_SUPPLIER_DEFAULTS)
+    resolver.preload(names)
+    return {name: Supplier.objects.get(pk=resolver.get(name)) for name in names}
+
+
+def vendor_evaluation(supplier, rating, year, **fields):
+    """Évaluation vendor (tous les critères à ``rating``) datée du 15 juin de ``year``."""
+    evaluated_at = datetime(year, 6, 15, 10, tzinfo=dt_timezone.utc)
+    with mock.patch("django.utils.timezone.now", return_value=evaluated_at):
+        return SupplierEvaluation.objects.create(
+            supplier=supplier,
+            delivery_compliance=rating,
+            delivery_timeline=rating,
+            advising_capability=rating,
+            after_sales_qos=rating,
+            vendor_relationship=rating,
+            **fields,
+        )
+
+
+def content(response):
+    """Contenu CSV d'une réponse en flux, décompressé si elle est en gzip."""
+    body = b"".join(response.streaming_content)
+    if response.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return body.decode("utf-8")
+
+
+class StreamingCsvResponseTest(TestCase):
+    header = ["Nom", "Montant"]
+    rows = [["ACME, Abidjan", Decimal("10.50")], ['Ligne "citée"\nsur deux lignes', None]]
+    expected = 'Nom,Montant\r\n"ACME, Abidjan",10.50\r\n"Ligne ""citée""\nsur deux lignes",\r\n'
+
+    def test_plain_response(self):
+        request = RequestFactory().get("/")
+
+        response = streaming_csv_response(request, "dépenses.csv", self.header, iter(self.rows))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Content-Disposition"], "attachment; filename*=utf-8''d%C3%A9penses.csv")
+        self.assertEqual(content(response), self.expected)
+
+    def test_gzip_response(self):
+        request = RequestFactory().get("/", headers={"accept-encoding": "br;q=1.0, gzip;q=0.8"})
+
+        response = streaming_csv_response(request, "depenses.csv", self.header, iter(self.rows))
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="depenses.csv"')
+        self.assertEqual(content(response), self.expected)
+
+    def test_gzip_needs_the_exact_token(self):
+        request = RequestFactory().get("/", headers={"accept-encoding": "x-gzipped, deflate"})
+
+        response = streaming_csv_response(request, "depenses.csv", self.header, iter(self.rows))
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(content(response), self.expected)
+
+    def test_chunks_are_buffered(self):
+        rows = ([index, "x" * 10] for index in range(100))
+
+        chunks = list(csv_chunks(["N", "Texte"], rows, buffer_size=200))
+
+        self.assertGreater(len(chunks), 5)
+        self.assertTrue(all(len(chunk) < 200 + 20 for chunk in chunks))
+        lines = b"".join(chunks).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 101)
+        self.assertEqual(lines[-1], "99,xxxxxxxxxx")
+
+
+class ExportViewsTest(TestCase):
+    def setUp(self):
+        self.suppliers = make_suppliers("ACME", "Beta")
+        self.admin = get_user_model().objects.create_superuser("admin@example.com", "secret")
+        self.client.force_login(self.admin)
+
+    def test_exports_require_a_superuser(self):
+        self.client.force_login(get_user_model().objects.create_user("buyer@example.com", "secret", is_active=True))
+
+        for name in ("export_contracts_csv", "export_suppliers_csv", "export_evaluations_csv", "export_spend_csv"):
+            self.assertEqual(self.client.get(reverse(f"reports:{name}")).status_code, 403)
+
+    def test_contracts_export(self):
+        Contract.objects.create(
+            numero="CTR-001", objet="Fourniture de clinker", type="opex", montant=Decimal("1500000"),
+            supplier=self.suppliers["ACME"], status="active", date_signature=date(2024, 1, 10),
+            date_effet=date(2024, 2, 1), date_expiry=date(2026, 1, 31),
+        )
+
+        response = self.client.get(reverse("reports:export_contracts_csv"), headers={"accept-encoding": "gzip"})
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(
+            content(response),
+            "Numéro,Objet,Type,Montant,Devise,Fournisseur,Statut,Date Échéance\r\n"
+            "CTR-001,Fourniture de clinker,opex,1500000.00,XOF,ACME,active,2026-01-31\r\n",
+        )
+
+    def test_suppliers_export(self):
+        Supplier.objects.filter(nom_complet_organisation="Beta").update(actif=False, email="achats@beta.ci")
+
+        response = self.client.get(reverse("reports:export_suppliers_csv"))
+
+        self.assertEqual(
+            content(response),
+            "Nom,Catégorie,Type fournisseur,Email,Téléphone,Actif\r\n"
+            "ACME,Autres,Local,,,Oui\r\n"
+            "Beta,Autres,Local,achats@beta.ci,,Non\r\n",
+        )
+
+    def test_evaluations_export(self):
+        vendor_evaluation(self.suppliers["ACME"], 7, 2023, evaluator=self.admin)
+        vendor_evaluation(self.suppliers["Beta"], 9, 2024)
+
+        response = self.client.get(reverse("reports:export_evaluations_csv"))
+
+        self.assertEqual(
+            content(response),
+            "Fournisseur,Delivery Compliance,Delivery Timeline,Advising Capability,After Sales QOS,"
+            "Vendor Relationship,Final Rating,Évaluateur,Date\r\n"
+            "Beta,9,9,9,9,9,9.00,,2024-06-15 10:00:00+00:00\r\n"
+            "ACME,7,7,7,7,7,7.00,admin@example.com,2023-06-15 10:00:00+00:00\r\n",
+        )
+
+    def test_spend_export_streams_csv(self):
+        SpendRollup.objects.create(supplier=self.suppliers["Beta"], material="MAT-2", currency="EUR", lines_count=1, ordered_amount=Decimal("200"))
+        SpendRollup.objects.create(supplier=self.suppliers["ACME"], material="MAT-1", currency="XOF", lines_count=2, ordered_amount=Decimal("1100"), received_amount=Decimal("500"), remaining_amount=Decimal("600"))
+        expected = (
+            "Fournisseur,Purchasing Group,Material,Currency,Lignes,Montant commandé,Montant reçu,Montant restant\r\n"
+            "ACME,,MAT-1,XOF,2,1100.00,500.00,600.00\r\n"
+            "Beta,,MAT-2,EUR,1,200.00,0.00,0.00\r\n"
+        )
+
+        response = self.client.get(reverse("reports:export_spend_csv"))
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(content(response), expected)
+
+        response = self.client.get(reverse("reports:export_spend_csv"), headers={"accept-encoding": "gzip, deflate"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(content(response), expected)
+
+
+class RankingCsvExportTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("buyer@example.com", "secret", is_active=True)
+        self.client.force_login(self.user)
+        self.suppliers = make_suppliers(*(f"Fournisseur {index:02d}" for index in range(12)), "Cimaf SA")
+        # Fournisseur 00 : 1/10 ... Fournisseur 09 : 10/10, puis 10 : 1/10 et 11 : 2/10
+        for index in range(12):
+            vendor_evaluation(self.suppliers[f"Fournisseur {index:02d}"], 1 + index % 10, 2024)
+        self.cimaf = self.suppliers["Cimaf SA"]
+        vendor_evaluation(self.cimaf, 8, 2024, evaluator=self.user, comments="Bonne réactivité,\nmême en saison haute")
+        vendor_evaluation(self.cimaf, 6, 2023)
+
+    def rows(self, response):
+        return content(response).splitlines()
+
+    def test_top_csv(self):
+        response = self.client.get(reverse("evaluations:export_ranking_top_csv"), headers={"accept-encoding": "gzip"})
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="ranking_top10.csv"')
+        rows = self.rows(response)
+        self.assertEqual(rows[:4], [
+            "Rank,Supplier,Average,#Evaluations",
+            "1,Fournisseur 09,10.00,1",
+            "2,Fournisseur 08,9.00,1",
+            "3,Fournisseur 07,8.00,1",
+        ])
+        self.assertEqual(len(rows), 11)
+        self.assertIn("4,Cimaf SA,7.00,2", rows)
+
+    def test_bottom_csv(self):
+        response = self.client.get(reverse("evaluations:export_ranking_bottom_csv"))
+
+        rows = self.rows(response)
+        # À moyenne égale, ordre alphabétique
+        self.assertEqual(rows[:4], [
+            "Rank,Supplier,Average,#Evaluations",
+            "1,Fournisseur 00,1.00,1",
+            "2,Fournisseur 10,1.00,1",
+            "3,Fournisseur 01,2.00,1",
+        ])
+        self.assertEqual(len(rows), 11)
+
+    def test_supplier_csv(self):
+        response = self.client.get(reverse("evaluations:export_supplier_ranking_csv"), {"supplier": self.cimaf.pk})
+
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="supplier_ranking_Cimaf_SA.csv"')
+        self.assertEqual(
+            content(response),
+            "Date,Final Rating,Delivery Compliance,Timeline,Advising,After Sales,Relationship,Evaluator,Comments\r\n"
+            "2023-06-15,6.00,6,6,6,6,6,,\r\n"
+            '2024-06-15,8.00,8,8,8,8,8,buyer@example.com,"Bonne réactivité, même en saison haute"\r\n',
+        )
+
+    def test_supplier_csv_unknown_supplier(self):
+        response = self.client.get(reverse("evaluations:export_supplier_ranking_csv"), {"supplier": 999999})
+
+        self.assertEqual(response.status_code, 404)
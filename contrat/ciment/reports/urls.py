@@ -9,4 +9,5 @@ urlpatterns = [
     path('export/contracts/', views.export_contracts_csv, name='export_contracts_csv'),
     path('export/suppliers/', views.export_suppliers_csv, name='export_suppliers_csv'),
     path('export/evaluations/', views.export_evaluations_csv, name='export_evaluations_csv'),
+    path('export/spend/', views.export_spend_csv, name='export_spend_csv'),
 ]
@@ -2,10 +2,11 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse
 from django.views.decorators.http import require_http_methods
-import csv
 from contracts.models import Contract
 from suppliers.models import Supplier
 from evaluations.models import SupplierEvaluation
+from orders.models import SpendRollup
+from .streaming import EXPORT_CHUNK_SIZE, streaming_csv_response
 
 
 @login_required
@@ -14,26 +15,16 @@ def export_contracts_csv(request):
     """Exporter les contrats en CSV"""
     if not request.user.is_superuser:
         return HttpResponse("Accès refusé", status=403)
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="contrats.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Numéro', 'Objet', 'Type', 'Montant', 'Devise', 'Fournisseur', 'Statut', 'Date Échéance'])
-    
-    for contract in Contract.objects.all():
-        writer.writerow([
-            getattr(contract, 'numero', ''),
-            getattr(contract, 'objet', ''),
-            getattr(contract, 'type', ''),
-            getattr(contract, 'montant', ''),
-            getattr(contract, 'devise', ''),
-            getattr(getattr(contract, 'supplier', None), 'nom_complet_organisation', ''),
-            getattr(contract, 'status', ''),
-            getattr(contract, 'date_expiry', ''),
-        ])
-    
-    return response
+
+    contracts = Contract.objects.values_list(
+        'numero', 'objet', 'type', 'montant', 'devise', 'supplier__nom_complet_organisation', 'status', 'date_expiry',
+    )
+    return streaming_csv_response(
+        request,
+        'contrats.csv',
+        ['Numéro', 'Objet', 'Type', 'Montant', 'Devise', 'Fournisseur', 'Statut', 'Date Échéance'],
+        contracts.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+    )
 
 
 @login_required
@@ -42,24 +33,19 @@ def export_suppliers_csv(request):
     """Exporter les fournisseurs en CSV"""
     if not request.user.is_superuser:
         return HttpResponse("Accès refusé", status=403)
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="fournisseurs.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Nom', 'Catégorie', 'Type fournisseur', 'Email', 'Téléphone', 'Actif'])
-    
-    for supplier in Supplier.objects.all():
-        writer.writerow([
-            getattr(supplier, 'nom_complet_organisation', ''),
-            getattr(supplier, 'type_categorie', ''),
-            getattr(supplier, 'type_fournisseur', ''),
-            getattr(supplier, 'email', ''),
-            getattr(supplier, 'telephone', ''),
-            'Oui' if getattr(supplier, 'actif', False) else 'Non',
-        ])
-    
-    return response
+
+    suppliers = Supplier.objects.values_list(
+        'nom_complet_organisation', 'type_categorie', 'type_fournisseur', 'email', 'telephone', 'actif',
+    )
+    return streaming_csv_response(
+        request,
+        'fournisseurs.csv',
+        ['Nom', 'Catégorie', 'Type fournisseur', 'Email', 'Téléphone', 'Actif'],
+        (
+            [*columns, 'Oui' if actif else 'Non']
+            for *columns, actif in suppliers.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        ),
+    )
 
 
 @login_required
@@ -68,37 +54,71 @@ def export_evaluations_csv(request):
     """Exporter les évaluations en CSV"""
     if not request.user.is_superuser:
         return HttpResponse("Accès refusé", status=403)
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="evaluations.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Fournisseur',
-        'Delivery Compliance',
-        'Delivery Timeline',
-        'Advising Capability',
-        'After Sales QOS',
-        'Vendor Relationship',
-        'Final Rating',
-        'Évaluateur',
-        'Date'
-    ])
-    
-    for evaluation in SupplierEvaluation.objects.select_related('supplier', 'evaluator').all():
-        writer.writerow([
-            getattr(getattr(evaluation, 'supplier', None), 'nom_complet_organisation', ''),
-            evaluation.delivery_compliance,
-            evaluation.delivery_timeline,
-            evaluation.advising_capability,
-            evaluation.after_sales_qos,
-            evaluation.vendor_relationship,
-            evaluation.vendor_final_rating,
-            getattr(getattr(evaluation, 'evaluator', None), 'email', ''),
-            getattr(evaluation, 'date_evaluation', ''),
-        ])
-    
-    return response
+
+    evaluations = SupplierEvaluation.objects.values_list(
+        'supplier__nom_complet_organisation',
+        'delivery_compliance',
+        'delivery_timeline',
+        'advising_capability',
+        'after_sales_qos',
+        'vendor_relationship',
+        'vendor_final_rating',
+        'evaluator__email',
+        'date_evaluation',
+    )
+    return streaming_csv_response(
+        request,
+        'evaluations.csv',
+        [
+            'Fournisseur',
+            'Delivery Compliance',
+            'Delivery Timeline',
+            'Advising Capability',
+            'After Sales QOS',
+            'Vendor Relationship',
+            'Final Rating',
+            'Évaluateur',
+            'Date'
+        ],
+        evaluations.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+    )
+
+
+@login_required
+@require_http_methods(["GET"])
+def export_spend_csv(request):
+    """Exporter les dépenses PO (cumuls par fournisseur, groupe d'achat, article et devise) en CSV"""
+    if not request.user.is_superuser:
+        return HttpResponse("Accès refusé", status=403)
+
+    # Table de cumuls : pas d'agrégat sur les lignes de PO
+    rollups = SpendRollup.objects.order_by(
+        'supplier__nom_complet_organisation', 'purchasing_group', 'material', 'currency'
+    ).values_list(
+        'supplier__nom_complet_organisation',
+        'purchasing_group',
+        'material',
+        'currency',
+        'lines_count',
+        'ordered_amount',
+        'received_amount',
+        'remaining_amount',
+    )
+    return streaming_csv_response(
+        request,
+        'depenses.csv',
+        [
+            'Fournisseur',
+            'Purchasing Group',
+            'Material',
+            'Currency',
+            'Lignes',
+            'Montant commandé',
+            'Montant reçu',
+            'Montant restant',
+        ],
+        rollups.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+    )
 
 
 @login_required
@@ -109,6 +129,7 @@ def reports_list(request):
             {'name': 'Contrats', 'url': 'export_contracts_csv', 'icon': 'file-contract'},
             {'name': 'Fournisseurs', 'url': 'export_suppliers_csv', 'icon': 'building'},
             {'name': 'Évaluations', 'url': 'export_evaluations_csv', 'icon': 'chart-bar'},
+            {'name': 'Dépenses PO', 'url': 'export_spend_csv', 'icon': 'coins'},
         ]
     }
     return render(request, 'reports/list.html', context)
@@ -1,5 +1,5 @@
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models import Avg
 from decimal import Decimal
 
 class Banque(models.Model):
@@ -145,39 +145,41 @@ class Supplier(models.Model):
     def est_etranger(self):
         return self.type_fournisseur == 'Foreign'
     
+    def get_score(self):
+        """Notes pré-calculées (evaluations.SupplierScore), None sans évaluation"""
+        try:
+            return self.score
+        except ObjectDoesNotExist:
+            return None
+
     def get_vendor_avg_rating(self):
         """Retourne la moyenne des évaluations vendor (60% du total)"""
-        avg = self.evaluations.aggregate(avg=Avg('vendor_final_rating'))['avg']
-        return Decimal(str(avg)) if avg else Decimal('0.00')
+        score = self.get_score()
+        return score.vendor_final_average() if score else Decimal('0.00')
     
     def get_buyer_avg_rating(self):
         """Retourne la moyenne des évaluations acheteur (40% du total)"""
-        avg = self.buyer_evaluations.aggregate(avg=Avg('buyer_final_rating'))['avg']
-        return Decimal(str(avg)) if avg else Decimal('0.00')
+        score = self.get_score()
+        return score.buyer_final_average() if score else Decimal('0.00')
     
     def get_weighted_rating(self):
         """
-        Calcule la note globale pondérée:
+        Retourne la note globale pondérée (pré-calculée à chaque évaluation):
         - Évaluation Vendor: 60%
         - Évaluation Acheteur: 40%
         """
-        vendor_avg = self.get_vendor_avg_rating()
-        buyer_avg = self.get_buyer_avg_rating()
-        
-        # Si aucune évaluation n'existe, retourner 0
-        if vendor_avg == 0 and buyer_avg == 0:
-            return Decimal('0.00')
-        
-        # Calcul pondéré: 60% vendor + 40% buyer
-        weighted = (vendor_avg * Decimal('0.60')) + (buyer_avg * Decimal('0.40'))
-        return weighted.quantize(Decimal('0.01'))
+        score = self.get_score()
+        return score.weighted_rating if score else Decimal('0.00')
     
     def get_evaluation_counts(self):
         """Retourne le nombre d'évaluations de chaque type"""
+        score = self.get_score()
+        vendor = score.vendor_count if score else 0
+        buyer = score.buyer_count if score else 0
         return {
-            'vendor': self.evaluations.count(),
-            'buyer': self.buyer_evaluations.count(),
-            'total': self.evaluations.count() + self.buyer_evaluations.count()
+            'vendor': vendor,
+            'buyer': buyer,
+            'total': vendor + buyer
         }
     
     def get_weighted_rating_badge(self):
@@ -0,0 +1,72 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from .models import Supplier
+
+
+# Valeurs texte considérées comme vides dans les fichiers importés
+NULL_TOKENS = {"nan", "nat", "none", "null"}
+
+
+def distinct_supplier_names(values: Iterable[Any]) -> List[str]:
+    """Retourne les noms de fournisseurs distincts et nettoyés d'une colonne.
+
+    Traitement vectorisé (pandas) : suppression des NaN, trim, et exclusion
+    des chaînes vides ou 'nan'/'nat'/'null'/'none'.
+    """
+    series = pd.Series(values, dtype="object").dropna()
+    if series.empty:
+        return []
+    series = series.astype(str).str.strip()
+    series = series[(series != "") & ~series.str.lower().isin(NULL_TOKENS)]
+    return series.unique().tolist()
+
+
+class SupplierResolver:
+    """Résout des noms de fournisseurs en ``supplier_id`` pour un import.
+
+    - ``preload`` collecte les noms distincts, charge les fournisseurs
+      existants en une requête et crée les manquants en un ``bulk_create``
+    - ``get`` renvoie ensuite l'identifiant depuis un dict, sans requête
+
+    Les fournisseurs sont rapprochés sur ``nom_complet_organisation`` ; en cas
+    de doublons en base, le plus ancien est retenu.
+    """
+
+    def __init__(self, defaults: Optional[Dict[str, Any]] = None, create_missing: bool = True):
+        self.defaults: Dict[str, Any] = dict(defaults or {})
+        self.create_missing = create_missing
+        self.ids: Dict[str, int] = {}
+        self.created = 0
+
+    def preload(self, values: Iterable[Any]) -> None:
+        names = [name for name in distinct_supplier_names(values) if name not in self.ids]
+        if not names:
+            return
+
+        self._load(names)
+
+        missing = [name for name in names if name not in self.ids]
+        if missing and self.create_missing:
+            Supplier.objects.bulk_create(
+                [Supplier(nom_complet_organisation=name, **self.defaults) for name in missing]
+            )
+            self.created += len(missing)
+            self._load(missing)
+
+    def _load(self, names: List[str]) -> None:
+        rows = (
+            Supplier.objects.filter(nom_complet_organisation__in=names)
+            .order_by("-pk")
+            .values_list("nom_complet_organisation", "pk")
+        )
+        # Tri décroissant : le plus ancien écrase les plus récents
+        self.ids.update(rows)
+
+    def get(self, name: Optional[str]) -> Optional[int]:
+        if not name:
+            return None
+        if name not in self.ids:
+            self.preload([name])
+        return self.ids.get(name)